@@ -0,0 +1,134 @@
+"""Checks that masking stays linear in the input on inputs built to make it slow.
+
+Anyone who can write to a log that gets masked controls the input, so the cost per byte must not grow with the input
+however the patterns overlap. Each scenario pairs a set of patterns with an input generator that maximizes something
+the masking path does per match or per byte:
+
+- `nested`: `a...` against `aa`, `aaa`, ... up to 64 bytes - a match at every byte, each overlapping the previous 63;
+- `deep`: the same up to 1024 bytes, so streaming also holds back a 1 KiB reminder on every call;
+- `near-miss`: `a` x 1023 + `b` repeated against `a` x 1024 - a long chain that fails on its last byte every time;
+- `binary`: random `a`/`b` bytes against every `a`/`b` string up to 8 bytes - overlapping matches of every shape;
+- `periodic`: `abab...` against `aba`, `ababa`, ... up to 127 bytes;
+- `uncapped`: `nested` with no star cap, so every match extends the masked run instead of trimming it.
+
+Every scenario runs on each input size through `Masker.mask` (one call) and through `StreamWrapper` (64 KiB reads),
+the best of `--rounds` runs counting. `growth` is the time per byte on the largest size over the smallest: about 1
+for linear work, about the size ratio for quadratic work.
+
+Usage:
+    uv run python benchmarks/adversarial.py [--sizes-mib 1,4,16] [--rounds N] [--max-growth X]
+Exits with status 1 if any scenario's growth exceeds `--max-growth`. Writes benchmarks/data/adversarial.json.
+"""
+
+import argparse
+import io
+import itertools
+import json
+import pathlib
+import random
+import sys
+import time
+import typing
+
+import gen_corpus
+
+REPO_ROOT = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+DATA_DIR = pathlib.Path(__file__).parent / "data"
+LIMIT = 15  # secretsweeper.MAX_NUMBER_OF_STARS
+READ_SIZE = 1 << 16
+
+
+def _repeat(unit: bytes) -> typing.Callable[[int], bytes]:
+    return lambda size: (unit * (size // len(unit) + 1))[:size]
+
+
+def _random_ab(size: int) -> bytes:
+    return random.Random(gen_corpus.SEED).randbytes(size).translate(bytes(b"ab"[i & 1] for i in range(256)))
+
+
+SCENARIOS: dict[str, tuple[list[bytes], int, typing.Callable[[int], bytes]]] = {
+    "nested": ([b"a" * n for n in range(2, 65)], LIMIT, _repeat(b"a")),
+    "deep": ([b"a" * n for n in range(2, 1025)], LIMIT, _repeat(b"a")),
+    "near-miss": ([b"a" * 1024], LIMIT, _repeat(b"a" * 1023 + b"b")),
+    "binary": (
+        [bytes(p) for n in range(1, 9) for p in itertools.product(b"ab", repeat=n)],
+        LIMIT,
+        _random_ab,
+    ),
+    "periodic": ([b"ab" * n + b"a" for n in range(1, 64)], LIMIT, _repeat(b"ab")),
+    "uncapped": ([b"a" * n for n in range(2, 65)], 1 << 40, _repeat(b"a")),
+}
+
+
+def _best_ns(run: typing.Callable[[], object], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter_ns()
+        run()
+        best = min(best, time.perf_counter_ns() - t0)
+    return best
+
+
+def _stream(data: bytes, masker: typing.Any) -> None:
+    import secretsweeper
+
+    stream = secretsweeper.StreamWrapper(io.BytesIO(data), masker)
+    while stream.read(READ_SIZE):
+        pass
+
+
+def _ints(text: str) -> list[int]:
+    return [int(x) for x in text.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mib", type=_ints, default=[1, 4, 16], help="comma-separated input sizes in MiB")
+    parser.add_argument("--rounds", type=int, default=3, help="runs per cell, best one counts (default: 3)")
+    parser.add_argument(
+        "--max-growth", type=float, default=2.0, help="fail above this ratio of ns/byte, largest to smallest size"
+    )
+    args = parser.parse_args()
+    import secretsweeper
+
+    sizes = sorted(size_mib * 1024 * 1024 for size_mib in args.sizes_mib)
+
+    results = []
+    for name, (patterns, limit, make_input) in SCENARIOS.items():
+        masker = secretsweeper.Masker(patterns, limit=limit)
+        for mode in ("mask", "stream"):
+            ns_per_byte = []
+            for size in sizes:
+                data = make_input(size)
+                if mode == "mask":
+                    elapsed = _best_ns(lambda: masker.mask(data), args.rounds)
+                else:
+                    elapsed = _best_ns(lambda: _stream(data, masker), args.rounds)
+                ns_per_byte.append(elapsed / size)
+            growth = ns_per_byte[-1] / ns_per_byte[0]
+            results.append(
+                {"scenario": name, "mode": mode, "sizes_bytes": sizes, "ns_per_byte": ns_per_byte, "growth": growth}
+            )
+            cells = "  ".join(f"{size >> 20:>4} MiB {ns:6.2f} ns/B" for size, ns in zip(sizes, ns_per_byte))
+            print(f"{name:<10} {mode:<6} {cells}  growth {growth:5.2f}", flush=True)
+
+    DATA_DIR.mkdir(exist_ok=True)
+    out_path = DATA_DIR / "adversarial.json"
+    with out_path.open("w") as f:
+        json.dump({"rounds": args.rounds, "seed": gen_corpus.SEED, "results": results}, f, indent=2)
+    print(f"Saved {out_path}")
+
+    failures = [r for r in results if r["growth"] > args.max_growth]
+    for r in failures:
+        print(
+            f"FAIL: {r['scenario']} ({r['mode']}) grows {r['growth']:.2f}x per byte > {args.max_growth}x",
+            file=sys.stderr,
+        )
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,24 +15,38 @@ MAX_NUMBER_OF_STARS), and that reconstruction time is counted as part of its
 total. secretsweeper's Zig core fuses search+replace natively, so its total is
 just the one `secretsweeper.mask()` call.
 
+The `streaming` suite measures the production path instead: `StreamWrapper`
+over the first lines of the same corpus. It records the per-call latency of
+`masking_read` and `consume_reminder` through both the `_native` extension and
+the ctypes fallback, `StreamWrapper` line and block throughput, and the
+construction latency with a pattern list and with a shared `Masker`. Every
+metric is one full pass per round, in rotating order like the engines above,
+reported as the time per operation.
+
 Usage: run `gen_corpus.py` first (or pass --generate here), then:
-    uv run --group benchmark python benchmarks/bench.py [--rounds N]
+    uv run --group benchmark python benchmarks/bench.py [--rounds N] [--suite mask|streaming|all]
 Writes benchmarks/data/results.json, consumed by `report.py`.
 """
 
 import argparse
+import contextlib
 import importlib.metadata
+import io
 import json
 import pathlib
 import pickle
+import statistics
 import sys
 import time
+from collections.abc import Iterator
 
 REPO_ROOT = pathlib.Path(__file__).parent.parent
 sys.path.insert(0, str(REPO_ROOT))
 
 DATA_DIR = pathlib.Path(__file__).parent / "data"
 LIMIT = 15  # secretsweeper.MAX_NUMBER_OF_STARS
+STREAM_SAMPLE_BYTES = 16 * 1024 * 1024
+STREAM_BLOCK_SIZE = 64 * 1024
 
 
 def _lib_version(dist_name: str) -> str | None:
@@ -238,10 +252,160 @@ def run_benchmark(n_rounds: int) -> dict:
     }
 
 
+@contextlib.contextmanager
+def _api_path(path: str) -> Iterator[None]:
+    """Routes secretsweeper through the `_native` extension or, for "ctypes", its ctypes fallback."""
+    from secretsweeper import _core
+
+    native = _core._native
+    if path == "ctypes":
+        _core._native = None  # ty: ignore[invalid-assignment]
+    try:
+        yield
+    finally:
+        _core._native = native
+
+
+def register_streaming_metrics(corpus: bytes, patterns: list[bytes]) -> dict[str, dict]:
+    """
+    Each entry is a run() that makes one full pass of `ops` operations over
+    `nbytes` bytes of input (None where throughput means nothing), so its
+    wall-clock time divided by `ops` is the cost of one call.
+    """
+    import secretsweeper
+    from secretsweeper import _core
+
+    lines = corpus.splitlines(keepends=True)
+    metrics: dict[str, dict] = {}
+
+    def register(name, run, ops, nbytes=None, path="native", available=True, note=""):
+        metrics[name] = dict(run=run, ops=ops, nbytes=nbytes, path=path, available=available, note=note)
+
+    for path in ("native", "ctypes"):
+        try:
+            with _api_path(path):
+                masker = secretsweeper.Masker(patterns, limit=LIMIT)
+        except ImportError as e:
+            for name in ("masking_read", "consume_reminder"):
+                register(f"{name} ({path})", None, 0, path=path, available=False, note=str(e))
+            continue
+
+        def masking_read(masker=masker, path=path) -> None:
+            with _api_path(path):
+                read = _core._StreamWrapper(masker).masking_read
+                for line in lines:
+                    read(line)
+
+        def consume_reminder(masker=masker, path=path) -> None:
+            with _api_path(path):
+                consume = _core._StreamWrapper(masker).consume_reminder
+                for _ in range(len(lines)):
+                    consume()
+
+        register(f"masking_read ({path})", masking_read, len(lines), len(corpus), path=path)
+        register(f"consume_reminder ({path})", consume_reminder, len(lines), path=path)
+
+    masker = secretsweeper.Masker(patterns, limit=LIMIT)
+
+    def iterate() -> None:
+        for _ in secretsweeper.StreamWrapper(io.BytesIO(corpus), masker):
+            pass
+
+    def iter_lines() -> None:
+        for _ in secretsweeper.StreamWrapper(io.BytesIO(corpus), masker).iter_lines():
+            pass
+
+    def read_blocks() -> None:
+        stream = secretsweeper.StreamWrapper(io.BytesIO(corpus), masker)
+        while stream.read(STREAM_BLOCK_SIZE):
+            pass
+
+    n_blocks = -(-len(corpus) // STREAM_BLOCK_SIZE)
+    register("StreamWrapper lines (iteration)", iterate, len(lines), len(corpus))
+    register("StreamWrapper lines (iter_lines)", iter_lines, len(lines), len(corpus))
+    register(f"StreamWrapper read({STREAM_BLOCK_SIZE // 1024} KiB)", read_blocks, n_blocks, len(corpus))
+
+    empty = io.BytesIO()
+    n_build, n_share = 200, 10_000
+
+    def construct_from_patterns() -> None:
+        for _ in range(n_build):
+            secretsweeper.StreamWrapper(empty, patterns, limit=LIMIT)
+
+    def construct_from_masker() -> None:
+        for _ in range(n_share):
+            secretsweeper.StreamWrapper(empty, masker)
+
+    register("StreamWrapper(patterns) construction", construct_from_patterns, n_build)
+    register("StreamWrapper(masker) construction", construct_from_masker, n_share)
+    return metrics
+
+
+def run_streaming(n_rounds: int) -> dict:
+    corpus = (DATA_DIR / "corpus.bin").read_bytes()[:STREAM_SAMPLE_BYTES]
+    corpus = corpus[: corpus.rfind(b"\n") + 1]
+    with (DATA_DIR / "patterns.pkl").open("rb") as f:
+        patterns: list[bytes] = pickle.load(f)
+
+    metrics = register_streaming_metrics(corpus, patterns)
+    available_names = [n for n, cfg in metrics.items() if cfg["available"]]
+    n_lines = corpus.count(b"\n")
+    print(f"\nStreaming: {len(corpus) / 1024 / 1024:.2f} MiB, {n_lines} lines, {n_rounds} interleaved rounds")
+
+    results: dict[str, dict] = {
+        name: {
+            "available": cfg["available"],
+            "note": cfg["note"],
+            "path": cfg["path"],
+            "ops": cfg["ops"],
+            "bytes": cfg["nbytes"],
+            "runs_ns": [],
+        }
+        for name, cfg in metrics.items()
+    }
+    for r in range(n_rounds):
+        order = available_names[r % len(available_names) :] + available_names[: r % len(available_names)]
+        print(f"\n--- streaming round {r + 1}/{n_rounds} ---")
+        for name in order:
+            cfg = metrics[name]
+            t0 = time.perf_counter()
+            cfg["run"]()
+            elapsed = time.perf_counter() - t0
+            per_op_ns = elapsed * 1e9 / cfg["ops"]
+            results[name]["runs_ns"].append(per_op_ns)
+            print(f"  {name}: {per_op_ns:,.0f} ns/op")
+
+    print(f"\n=== Streaming summary ({n_rounds} interleaved rounds) ===")
+    for name in available_names:
+        res = results[name]
+        runs: list[float] = res["runs_ns"]
+        res["min_ns"] = min(runs)
+        res["median_ns"] = statistics.median(runs)
+        if res["bytes"]:
+            res["min_mb_s"] = res["bytes"] / (res["min_ns"] * res["ops"] / 1e9) / 1e6
+        throughput = f"  ({res['min_mb_s']:.1f} MB/s)" if res["bytes"] else ""
+        print(f"  {name}: min={res['min_ns']:,.0f} ns/op  median={res['median_ns']:,.0f} ns/op{throughput}")
+
+    return {
+        "sample_bytes": len(corpus),
+        "n_lines": n_lines,
+        "n_patterns": len(patterns),
+        "n_rounds": n_rounds,
+        "results": results,
+    }
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument("--rounds", type=int, default=5, help="interleaved A/B rounds per engine (default: 5)")
     parser.add_argument("--generate", action="store_true", help="regenerate the corpus first")
+    parser.add_argument(
+        "--suite",
+        choices=("mask", "streaming", "all"),
+        default="mask",
+        help="mask: whole-corpus mask() against other engines; streaming: StreamWrapper and per-call latency "
+        "(default: mask)",
+    )
     args = parser.parse_args()
 
     if args.generate or not (DATA_DIR / "corpus.bin").exists():
@@ -249,7 +413,9 @@ def main() -> None:
 
         gen_corpus.main()
 
-    data = run_benchmark(args.rounds)
+    data = run_benchmark(args.rounds) if args.suite in ("mask", "all") else {}
+    if args.suite in ("streaming", "all"):
+        data["streaming"] = run_streaming(args.rounds)
 
     out_path = DATA_DIR / "results.json"
     with out_path.open("w") as f:
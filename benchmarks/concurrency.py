@@ -0,0 +1,219 @@
+"""Measures how masking throughput scales across threads and processes.
+
+`bench.py` and `scaling.py` time one caller at a time. This runs the same work on 1, 2, 4, ... workers of a
+`ThreadPoolExecutor` and of a `ProcessPoolExecutor`, through the `_native` extension and through the ctypes
+fallback, in three scenarios over a `gen_corpus.generate_scenario` input:
+
+- `streams`: every worker masks its own `StreamWrapper` stream over the whole input (64 KiB reads), all threads
+  sharing one `Masker`;
+- `shared`: the input is split into one slice per worker, each masked with one `Masker.mask` call;
+- `one-stream` (threads only): the workers feed 64 KiB chunks of the input into a single `_StreamWrapper`, whose
+  lock serializes them - the cost of sharing one stream.
+
+Both APIs release the GIL while they walk the input (`_native` for `mask` and for stream chunks of 4 KiB or
+more), so threads can scale until the Python-level work between the native calls dominates. Each process builds
+its own `Masker` when the pool starts, which is not timed. Per cell it records the best of `--rounds` timed runs
+after an untimed warm-up, and:
+
+- `mb_s`: the aggregate throughput, every worker's input bytes over the wall-clock time;
+- `speedup`: `mb_s` over the same scenario, pool and API on one worker;
+- `efficiency`: `speedup` per core the workers can run on, `min(workers, cpus)`: 1.0 is linear scaling.
+
+Usage:
+    uv run python benchmarks/concurrency.py [--workers 1,2,4,8] [--size-mib 16] [--patterns 1000] [--rounds N]
+Writes benchmarks/data/concurrency.json, rendered by `report.py`.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import pathlib
+import sys
+import time
+import typing
+
+import gen_corpus
+
+REPO_ROOT = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+DATA_DIR = pathlib.Path(__file__).parent / "data"
+READ_SIZE = 1 << 16
+DENSITY = "sparse"
+SCENARIOS = ("streams", "shared", "one-stream")
+POOLS = ("thread", "process")
+APIS = ("native", "ctypes")
+
+# What the tasks work on: set in the parent for the thread pool and by `_init_process` in each worker process.
+_state: dict[str, typing.Any] = {}
+
+
+@contextlib.contextmanager
+def _api_path(api: str) -> typing.Iterator[None]:
+    """Routes secretsweeper through the `_native` extension or, for "ctypes", its ctypes fallback."""
+    from secretsweeper import _core
+
+    native = _core._native
+    if api == "ctypes":
+        _core._native = None  # ty: ignore[invalid-assignment]
+    try:
+        yield
+    finally:
+        _core._native = native
+
+
+def _load(corpus: bytes, patterns: list[bytes]) -> None:
+    import secretsweeper
+
+    _state["corpus"] = corpus
+    _state["masker"] = secretsweeper.Masker(patterns)
+
+
+def _init_process(corpus: bytes, patterns: list[bytes], api: str) -> None:
+    if api == "ctypes":
+        from secretsweeper import _core
+
+        _core._native = None  # ty: ignore[invalid-assignment]
+    _load(corpus, patterns)
+
+
+def _task(scenario: str, index: int, workers: int) -> int:
+    """One worker's share of a scenario. Returns the number of input bytes it masked."""
+    import secretsweeper
+
+    corpus: bytes = _state["corpus"]
+    if scenario == "streams":
+        stream = secretsweeper.StreamWrapper(io.BytesIO(corpus), _state["masker"])
+        while stream.read(READ_SIZE):
+            pass
+        return len(corpus)
+    if scenario == "shared":
+        view = memoryview(corpus)[index * len(corpus) // workers : (index + 1) * len(corpus) // workers]
+        _state["masker"].mask(view)
+        return len(view)
+    wrapper = _state["wrapper"]
+    view = memoryview(corpus)
+    nbytes = 0
+    for start in range(index * READ_SIZE, len(corpus), workers * READ_SIZE):
+        chunk = view[start : start + READ_SIZE]
+        wrapper.masking_read(chunk)
+        nbytes += len(chunk)
+    return nbytes
+
+
+def _timed_round(pool: concurrent.futures.Executor, scenario: str, workers: int) -> tuple[float, int]:
+    if scenario == "one-stream":
+        from secretsweeper import _core
+
+        _state["wrapper"] = _core._StreamWrapper(_state["masker"])
+    t0 = time.perf_counter()
+    futures = [pool.submit(_task, scenario, i, workers) for i in range(workers)]
+    nbytes = sum(future.result() for future in futures)
+    if scenario == "one-stream":
+        _state.pop("wrapper").consume_reminder()
+    return time.perf_counter() - t0, nbytes
+
+
+def run_cell(
+    scenario: str, pool_kind: str, api: str, workers: int, corpus: bytes, patterns: list[bytes], rounds: int
+) -> dict:
+    if pool_kind == "thread":
+        pool: concurrent.futures.Executor = concurrent.futures.ThreadPoolExecutor(workers)
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_init_process, initargs=(corpus, patterns, api)
+        )
+    with pool, _api_path(api):
+        _timed_round(pool, scenario, workers)
+        best, nbytes = min(_timed_round(pool, scenario, workers) for _ in range(rounds))
+    return {
+        "scenario": scenario,
+        "pool": pool_kind,
+        "api": api,
+        "workers": workers,
+        "min_ms": best * 1000,
+        "mb_s": nbytes / best / 1e6,
+    }
+
+
+def _api_available(api: str) -> str | None:
+    """None if secretsweeper can be used through `api`, else why not."""
+    from secretsweeper import _core
+
+    try:
+        with _api_path(api):
+            _core._api()
+    except ImportError as e:
+        return str(e)
+    if api == "native" and _core._native is None:
+        return "the _native extension is not built"
+    return None
+
+
+def _ints(text: str) -> list[int]:
+    return [int(x) for x in text.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=_ints, default=[1, 2, 4, 8], help="comma-separated worker counts")
+    parser.add_argument("--size-mib", type=int, default=16, help="input size in MiB (default: 16)")
+    parser.add_argument("--patterns", type=int, default=1000, help="number of patterns (default: 1000)")
+    parser.add_argument("--rounds", type=int, default=3, help="timed runs per cell, best one counts (default: 3)")
+    args = parser.parse_args()
+    workers = sorted(set(args.workers) | {1})
+    cpus = os.cpu_count() or 1
+
+    corpus, patterns = gen_corpus.generate_scenario(args.size_mib * 1024 * 1024, args.patterns, DENSITY)
+    cells = []
+    unavailable = {}
+    for api in APIS:
+        if note := _api_available(api):
+            unavailable[api] = note
+            print(f"{api}: unavailable ({note})")
+            continue
+        with _api_path(api):
+            _load(corpus, patterns)
+        for pool_kind in POOLS:
+            for scenario in SCENARIOS:
+                if scenario == "one-stream" and pool_kind == "process":
+                    continue
+                base = None
+                for n in workers:
+                    cell = run_cell(scenario, pool_kind, api, n, corpus, patterns, args.rounds)
+                    base = base or cell["mb_s"]
+                    cell["speedup"] = cell["mb_s"] / base
+                    cell["efficiency"] = cell["speedup"] / min(n, cpus)
+                    cells.append(cell)
+                    print(
+                        f"{api:<6} {pool_kind:<7} {scenario:<10} {n:>3} workers  {cell['mb_s']:8.1f} MB/s  "
+                        f"speedup {cell['speedup']:5.2f}  efficiency {cell['efficiency']:5.2f}",
+                        flush=True,
+                    )
+        _state.clear()
+
+    DATA_DIR.mkdir(exist_ok=True)
+    out_path = DATA_DIR / "concurrency.json"
+    with out_path.open("w") as f:
+        json.dump(
+            {
+                "rounds": args.rounds,
+                "seed": gen_corpus.SEED,
+                "size_bytes": len(corpus),
+                "n_patterns": len(patterns),
+                "density": DENSITY,
+                "cpus": cpus,
+                "unavailable": unavailable,
+                "cells": cells,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Saved {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,10 @@ Output goes to `benchmarks/data/` (gitignored - regenerate it instead of
 committing a 100 MiB binary): `corpus.bin`, `patterns.pkl` (a pickled
 `list[bytes]`), and `manifest.json` (human-readable summary of what got
 embedded, consumed by `report.py`).
+
+`generate_scenario()` builds the parameterized scenarios `scaling.py` sweeps
+instead: any input size, pattern count and match density, generated in bulk
+rather than character by character.
 """
 
 import base64
@@ -151,6 +155,81 @@ def generate() -> dict:
     return manifest
 
 
+# Parameterized scenarios for the scaling matrix (`scaling.py`). Unlike the
+# fixed corpus above, these are generated a buffer at a time: random bytes from
+# `randbytes` are mapped onto an alphabet with one `bytes.translate`, so a
+# 64 MiB corpus or a million patterns take well under a second instead of a
+# `rng.choice` call per character. Each alphabet's size divides 256, so the
+# mapping stays uniform.
+
+PATTERN_ALPHABET = (string.ascii_letters + string.digits + "_-").encode()
+# Lowercase words and line breaks: a long pattern prefix can occur in it, but a
+# whole pattern (which mixes in uppercase and digits) practically never does.
+FILLER_ALPHABET = (string.ascii_lowercase + " " * 5 + "\n").encode()
+PATTERN_LENGTHS = (12, 40)
+
+# The average spacing between inserted matches, in bytes (None: no matches).
+# "overlapping" inserts pairs whose second pattern starts inside the first.
+DENSITIES: dict[str, int | None] = {"none": None, "sparse": 64 * 1024, "moderate": 1024, "dense": 64, "overlapping": 64}
+
+
+def random_text(rand: random.Random, size: int, alphabet: bytes) -> bytes:
+    """Returns `size` random bytes drawn uniformly from `alphabet`, whose size must divide 256."""
+    assert 256 % len(alphabet) == 0, "the alphabet size must divide 256"
+    table = bytes(alphabet[i % len(alphabet)] for i in range(256))
+    return rand.randbytes(size).translate(table)
+
+
+def generate_patterns(rand: random.Random, count: int, overlapping: bool = False) -> list[bytes]:
+    """
+    Returns `count` distinct random patterns of `PATTERN_LENGTHS` bytes. With `overlapping`, every second pattern
+    starts with the second half of the one before it, so inserting `first + second[overlap:]` yields two
+    overlapping matches.
+    """
+    lo, hi = PATTERN_LENGTHS
+    lengths = [lo + b % (hi - lo + 1) for b in rand.randbytes(count)]
+    pool = random_text(rand, sum(lengths), PATTERN_ALPHABET)
+    patterns: list[bytes] = []
+    pos = 0
+    for length in lengths:
+        patterns.append(pool[pos : pos + length])
+        pos += length
+    if overlapping:
+        for i in range(1, count, 2):
+            head = patterns[i - 1][len(patterns[i - 1]) // 2 :]
+            patterns[i] = head + patterns[i][len(head) :] if len(patterns[i]) > len(head) else head + patterns[i]
+    return list(dict.fromkeys(patterns))
+
+
+def generate_scenario(size: int, n_patterns: int, density: str, seed: int = SEED) -> tuple[bytes, list[bytes]]:
+    """
+    Returns a `size`-byte corpus (give or take one inserted match) and `n_patterns` patterns, with one inserted
+    occurrence of a randomly chosen pattern (or overlapping pair) every `DENSITIES[density]` bytes on average.
+    Deterministic for a given seed.
+    """
+    spacing = DENSITIES[density]
+    overlapping = density == "overlapping"
+    rand = random.Random(f"{seed}:{size}:{n_patterns}:{density}")
+    patterns = generate_patterns(rand, n_patterns, overlapping=overlapping)
+    filler = random_text(rand, size, FILLER_ALPHABET)
+    if spacing is None:
+        return filler, patterns
+
+    if overlapping:
+        pairs = [(patterns[i - 1], patterns[i]) for i in range(1, len(patterns), 2)]
+        overlap = [len(first) - len(first) // 2 for first, _ in pairs]
+        tokens = [first + second[k:] for (first, second), k in zip(pairs, overlap)] or patterns
+    else:
+        tokens = patterns
+    inserts = rand.choices(tokens, k=max(1, size // spacing))
+    gap = max(0, (size - sum(map(len, inserts))) // len(inserts))
+    parts: list[bytes] = []
+    for i, token in enumerate(inserts):
+        parts += [filler[i * gap : (i + 1) * gap], token]
+    parts.append(filler[len(inserts) * gap : len(inserts) * gap + gap])
+    return b"".join(parts), patterns
+
+
 def main() -> None:
     print("Generating filler text and embedding secrets/PEM blocks...")
     manifest = generate()
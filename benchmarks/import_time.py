@@ -0,0 +1,143 @@
+"""Measures the cold-start cost of secretsweeper: `import secretsweeper` and the first calls after it.
+
+Short-lived CLI tools and serverless handlers pay this on every invocation, so it has to stay small: the import
+must not load `ctypes` or the ctypes shared library while the `_native` extension is available, and the first
+`StreamWrapper` construction and reminder calls must not go through ctypes either. Nor may the import load the
+standard modules only some features need (`HEAVY_MODULES`): the plan loader, `follow`, `sweep_tree` and the
+`prefetch` and `max_hold` paths of `StreamWrapper` import theirs on first use.
+
+Each round runs a fresh interpreter (the import is cached after the first time, so in-process loops measure
+nothing), timing inside the child to leave interpreter startup out:
+
+- `import_ms`: `import secretsweeper`;
+- `first_use_ms`: building a `StreamWrapper` over a few patterns, reading a short stream and consuming the
+  reminder, right after the import;
+- `reference_ms`: `import typing`, which secretsweeper needs anyway, in its own fresh interpreter interleaved
+  with the rounds above. The time budget is relative to it, so it holds on slow and fast machines alike.
+
+Usage:
+    uv run python benchmarks/import_time.py [--rounds N] [--max-import-ratio R] [--max-import-ms MS]
+Exits with status 1 if the import loads `ctypes` although the extension is available, loads any of
+`HEAVY_MODULES`, takes more than `--max-import-ratio` times the reference import at the median (default:
+`MAX_IMPORT_RATIO`, 0 to disable), or, if given, takes longer than `--max-import-ms` at the median. Writes
+benchmarks/data/import_time.json.
+"""
+
+import argparse
+import json
+import pathlib
+import statistics
+import subprocess
+import sys
+import typing
+
+REPO_ROOT = pathlib.Path(__file__).parent.parent
+DATA_DIR = pathlib.Path(__file__).parent / "data"
+
+MAX_IMPORT_RATIO = 1.5
+"""
+The default budget for the median import, as a multiple of the median `import typing`: the import measures
+1.1-1.2 times it, and was 2.6 times it while it still loaded its optional submodules eagerly.
+"""
+
+HEAVY_MODULES = ("ctypes", "json", "mmap", "multiprocessing", "queue", "select", "tempfile", "threading") + (
+    # `typing` itself imports `re` before 3.13.
+    ("re",) if sys.version_info >= (3, 13) else ()
+)
+"""Standard modules `import secretsweeper` must not load: only some features need them."""
+
+CHILD = """
+import sys, time
+before = set(sys.modules)
+t0 = time.perf_counter()
+import secretsweeper
+t1 = time.perf_counter()
+loaded_on_import = sorted({name.partition(".")[0] for name in set(sys.modules) - before})
+ctypes_on_import = "ctypes" in sys.modules
+import io
+stream = secretsweeper.StreamWrapper(io.BytesIO(b"user=admin password=hunter2\\n" * 4), (b"hunter2", b"admin"))
+stream.readall()
+stream._wrapper.consume_reminder()
+t2 = time.perf_counter()
+import json
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_use_ms": (t2 - t1) * 1000,
+    "native": secretsweeper._core._native is not None,
+    "loaded_on_import": loaded_on_import,
+    "ctypes_on_import": ctypes_on_import,
+    "ctypes_after_use": "ctypes" in sys.modules,
+}))
+"""
+
+
+REFERENCE_CHILD = """
+import time
+t0 = time.perf_counter()
+import typing
+print((time.perf_counter() - t0) * 1000)
+"""
+
+
+def run_child(code: str = CHILD) -> typing.Any:
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=REPO_ROOT).stdout
+    return json.loads(out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20, help="fresh interpreters to time (default: 20)")
+    parser.add_argument(
+        "--max-import-ratio",
+        type=float,
+        default=MAX_IMPORT_RATIO,
+        help="fail if the median import takes more than this many times the median `import typing`, "
+        f"0 to disable (default: {MAX_IMPORT_RATIO})",
+    )
+    parser.add_argument("--max-import-ms", type=float, help="fail if the median import time exceeds this")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.rounds):
+        runs.append(run_child())
+        runs[-1]["reference_ms"] = run_child(REFERENCE_CHILD)
+    native = runs[0]["native"]
+    summary: dict = {"rounds": args.rounds, "native": native}
+    for key in ("import_ms", "first_use_ms", "reference_ms"):
+        values = [r[key] for r in runs]
+        summary[key] = {"min": min(values), "median": statistics.median(values), "runs": values}
+        print(f"{key}: min={min(values):.2f}ms  median={statistics.median(values):.2f}ms")
+    summary["import_ratio"] = summary["import_ms"]["median"] / summary["reference_ms"]["median"]
+    print(f"import_ratio: {summary['import_ratio']:.2f} (import secretsweeper / import typing, medians)")
+    summary["heavy_on_import"] = sorted({m for r in runs for m in r["loaded_on_import"]} & set(HEAVY_MODULES))
+    summary["ctypes_on_import"] = any(r["ctypes_on_import"] for r in runs)
+    summary["ctypes_after_use"] = any(r["ctypes_after_use"] for r in runs)
+    print(
+        f"native extension: {native}, ctypes imported: on import={summary['ctypes_on_import']}, "
+        f"after first use={summary['ctypes_after_use']}"
+    )
+    print(f"heavy modules imported: {', '.join(summary['heavy_on_import']) or 'none'}")
+
+    DATA_DIR.mkdir(exist_ok=True)
+    out_path = DATA_DIR / "import_time.json"
+    with out_path.open("w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"Saved {out_path}")
+
+    failures = []
+    if native and (summary["ctypes_on_import"] or summary["ctypes_after_use"]):
+        failures.append("ctypes is imported although the native extension is available")
+    if summary["heavy_on_import"]:
+        failures.append(f"the import loads {', '.join(summary['heavy_on_import'])}")
+    if args.max_import_ratio and summary["import_ratio"] > args.max_import_ratio:
+        failures.append(f"median import takes {summary['import_ratio']:.2f}x import typing > {args.max_import_ratio}x")
+    if args.max_import_ms is not None and summary["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"median import time {summary['import_ms']['median']:.2f}ms > {args.max_import_ms}ms")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,38 @@
-"""Renders benchmarks/data/results.json (from bench.py) into a GitHub-flavored
-Markdown report at benchmarks/RESULTS.md, stamped with the machine/CPU/software
-versions the run used - numbers move between machines, so a report without
-that context can't be trusted or reproduced.
+"""Renders benchmarks/data/results.json (from bench.py), plus scaling.json
+(from scaling.py) and concurrency.json (from concurrency.py) when present, into a GitHub-flavored Markdown report at
+benchmarks/RESULTS.md, stamped with the machine/CPU/software versions the run
+used - numbers move between machines, so a report without that context can't
+be trusted or reproduced.
+
+With --compare, instead diffs two results.json files (e.g. one saved before a
+change to `Aho.mask` and one after) engine by engine and streaming metric by
+metric. Each row compares the interleaved per-round samples bench.py records
+(`runs_ms`, `runs_ns`): the delta of the medians, a noise estimate from the
+spread of both samples, and a one-sided Mann-Whitney U test - exact for the
+handful of rounds a run has, and free of any normality assumption. A row is
+flagged as a regression when the current run is slower with p < --alpha, by
+more than --threshold percent and by more than the noise estimate; the exit
+status is then 1, so CI can gate on it. The test only sees the noise within
+each run - rounds of one run share the machine's state - so drift between two
+invocations can still show up as significant; the threshold and noise gates
+are there to absorb it. With 5 rounds per side, p < 0.05 takes at least 21 of the 25 (baseline,
+current) pairs ordered the same way, so use more rounds to resolve small changes.
 
 Usage: uv run --group benchmark python benchmarks/report.py
+       uv run python benchmarks/report.py --compare baseline.json current.json
 """
 
+import argparse
+import functools
 import importlib.metadata
 import json
 import os
 import pathlib
 import platform
 import re
+import statistics
 import subprocess
+import sys
 
 REPO_ROOT = pathlib.Path(__file__).parent.parent
 DATA_DIR = pathlib.Path(__file__).parent / "data"
@@ -157,16 +177,110 @@ def render_bar_chart(available: list[tuple[str, dict]]) -> list[str]:
     ]
 
 
-def render_markdown(data: dict, sysinfo: dict) -> str:
-    manifest = data["manifest"]
-    results = data["results"]
-    corpus_mib = data["corpus_bytes"] / 1024 / 1024
+def _format_ns(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} µs"
+    return f"{ns:.0f} ns"
 
-    available = [(name, r) for name, r in results.items() if r["available"]]
-    available.sort(key=lambda kv: kv[1]["min_ms"])
 
-    fastest_min = available[0][1]["min_ms"] if available else None
+def render_streaming(streaming: dict) -> list[str]:
+    """Renders the `--suite streaming` results: the per-operation cost of the
+    `StreamWrapper` path, which is what a log pipeline pays per line, rather
+    than the one whole-corpus `mask()` call the engine comparison measures."""
+    sample_mib = streaming["sample_bytes"] / 1024 / 1024
+    available = [(name, r) for name, r in streaming["results"].items() if r["available"]]
+    lines: list[str] = []
+    a = lines.append
+    a("## Streaming")
+    a("")
+    a(
+        f"`StreamWrapper` over the first {sample_mib:.2f} MiB of the corpus ({streaming['n_lines']} lines, "
+        f"{streaming['n_patterns']} patterns), {streaming['n_rounds']} interleaved "
+        f"round{'s' if streaming['n_rounds'] != 1 else ''}. Each metric is one full pass per round, "
+        f"reported per operation: one call, one line, one block or one construction. The `ctypes` rows go "
+        f"through the fallback used where the `_native` extension is not built."
+    )
+    a("")
+    a("| Metric | min | median | throughput |")
+    a("|---|---:|---:|---:|")
+    for name, r in available:
+        throughput = f"{r['min_mb_s']:.1f} MB/s" if r.get("min_mb_s") else "-"
+        a(f"| {name} | {_format_ns(r['min_ns'])} | {_format_ns(r['median_ns'])} | {throughput} |")
+    a("")
+    unavailable = [(name, r) for name, r in streaming["results"].items() if not r["available"]]
+    for name, r in unavailable:
+        a(f"- **{name}** unavailable: {r['note']}")
+    if unavailable:
+        a("")
+    return lines
+
 
+def render_scaling(scaling: dict) -> list[str]:
+    """Renders `scaling.py`'s matrix, one row per cell, so the point where the
+    engine column flips to `trie` (the DFA no longer fits its memory cap) and
+    the RSS columns start to climb can be read straight off the table."""
+    lines: list[str] = []
+    a = lines.append
+    a("## Scaling")
+    a("")
+    a(
+        f"Synthetic scenarios from `gen_corpus.generate_scenario` (seed {scaling['seed']}), each cell in a fresh "
+        f"interpreter; throughput is the best of {scaling['rounds']} `Masker.mask` calls. `engine` is what "
+        f"`ss_build` selected: `dfa`, or `trie` once the DFA exceeds `Aho.DFA_MEMORY_CAP` "
+        f"({_dfa_memory_cap_mib()}). `RSS growth` is the peak RSS beyond the loaded corpus and patterns. "
+        f"Re-run with `uv run python benchmarks/scaling.py`."
+    )
+    a("")
+    a("| Patterns | Density | Input | Engine | Build | Throughput | Peak RSS | RSS growth |")
+    a("|---:|---|---:|---|---:|---:|---:|---:|")
+    for cell in scaling["cells"]:
+        peak, growth = cell["peak_rss_mib"], cell["build_rss_mib"]
+        a(
+            f"| {cell['n_patterns']:,} | {cell['density']} | {cell['size_bytes'] / 1024 / 1024:.0f} MiB | "
+            f"{cell['engine']} | {cell['build_ms']:.1f} ms | {cell['min_mb_s']:.1f} MB/s | "
+            f"{'-' if peak is None else f'{peak:.0f} MiB'} | {'-' if growth is None else f'{growth:.0f} MiB'} |"
+        )
+    a("")
+    return lines
+
+
+def render_concurrency(concurrency: dict) -> list[str]:
+    """Renders `concurrency.py`'s cells, one row per worker count, so how far
+    each scenario scales with threads or processes - and where the GIL or the
+    shared stream's lock stops it - reads down the efficiency column."""
+    lines: list[str] = []
+    a = lines.append
+    a("## Concurrency")
+    a("")
+    a(
+        f"{concurrency['size_bytes'] / 1024 / 1024:.0f} MiB from `gen_corpus.generate_scenario` (seed "
+        f"{concurrency['seed']}, {concurrency['n_patterns']:,} patterns, {concurrency['density']} matches) on "
+        f"{concurrency['cpus']} CPU{'s' if concurrency['cpus'] != 1 else ''}, best of {concurrency['rounds']} "
+        f"runs per cell. `streams`: every worker masks the whole input through its own `StreamWrapper`; `shared`: "
+        f"one `Masker.mask` call per worker on its slice of the input; `one-stream`: the worker threads feed "
+        f"chunks into one `_StreamWrapper`. Throughput is aggregate over all workers; efficiency is the speedup "
+        f"over one worker per core the workers can run on, so 1.00 is linear scaling. "
+        f"Re-run with `uv run python benchmarks/concurrency.py`."
+    )
+    a("")
+    a("| Scenario | Pool | API | Workers | Throughput | Speedup | Efficiency |")
+    a("|---|---|---|---:|---:|---:|---:|")
+    for cell in concurrency["cells"]:
+        a(
+            f"| {cell['scenario']} | {cell['pool']} | {cell['api']} | {cell['workers']} | "
+            f"{cell['mb_s']:.1f} MB/s | {cell['speedup']:.2f}x | {cell['efficiency']:.2f} |"
+        )
+    a("")
+    for api, note in concurrency["unavailable"].items():
+        a(f"- **{api}** unavailable: {note}")
+    if concurrency["unavailable"]:
+        a("")
+    return lines
+
+
+def render_markdown(data: dict, sysinfo: dict, scaling: dict | None = None, concurrency: dict | None = None) -> str:
     lines: list[str] = []
     a = lines.append
 
@@ -174,14 +288,15 @@ def render_markdown(data: dict, sysinfo: dict) -> str:
     a("")
     a(
         "Compares `secretsweeper.mask()` against stdlib `re` and several Aho-Corasick "
-        "libraries on a synthetic corpus containing sparse, realistic secrets. "
+        "libraries on a synthetic corpus containing sparse, realistic secrets, and "
+        "measures the per-call cost of the streaming path. "
         "Generated by [`bench.py`](bench.py) + [`report.py`](report.py) - "
         "re-run with:"
     )
     a("")
     a("```bash")
     a("uv run --group benchmark python benchmarks/gen_corpus.py")
-    a("uv run --group benchmark python benchmarks/bench.py --rounds 5")
+    a("uv run --group benchmark python benchmarks/bench.py --rounds 5 --suite all")
     a("uv run --group benchmark python benchmarks/report.py")
     a("```")
     a("")
@@ -205,6 +320,41 @@ def render_markdown(data: dict, sysinfo: dict) -> str:
         a(f"| secretsweeper | {sysinfo['secretsweeper_version']} |")
     a("")
 
+    if "results" in data:
+        lines.extend(render_mask_comparison(data))
+    if "streaming" in data:
+        lines.extend(render_streaming(data["streaming"]))
+    if scaling is not None:
+        lines.extend(render_scaling(scaling))
+    if concurrency is not None:
+        lines.extend(render_concurrency(concurrency))
+    lines.extend(render_notes(data))
+
+    unavailable = [(name, r) for name, r in data.get("results", {}).items() if not r["available"]]
+    if unavailable:
+        a("<details><summary>Unavailable on this run</summary>")
+        a("")
+        for name, r in unavailable:
+            a(f"- **{name}**: {r['note']}")
+        a("")
+        a("</details>")
+        a("")
+
+    return "\n".join(lines) + "\n"
+
+
+def render_mask_comparison(data: dict) -> list[str]:
+    manifest = data["manifest"]
+    results = data["results"]
+    corpus_mib = data["corpus_bytes"] / 1024 / 1024
+
+    available = [(name, r) for name, r in results.items() if r["available"]]
+    available.sort(key=lambda kv: kv[1]["min_ms"])
+
+    fastest_min = available[0][1]["min_ms"] if available else None
+
+    lines: list[str] = []
+    a = lines.append
     a("## Corpus")
     a("")
     a(
@@ -243,25 +393,32 @@ def render_markdown(data: dict, sysinfo: dict) -> str:
             f"{r['min_mb_s']:.1f} MB/s | {vs_fastest} | {correct_mark} |"
         )
     a("")
+    return lines
+
 
-    total_pattern_bytes = sum(manifest["secret_lengths"]) + sum(manifest["pem_lengths"])
+def render_notes(data: dict) -> list[str]:
+    lines: list[str] = []
+    a = lines.append
     dfa_cap = _dfa_memory_cap_mib()
     a("## Notes")
     a("")
-    a(
-        f"- **Pattern set size vs. the DFA path.** secretsweeper dispatches through a "
-        f"byte-class-compressed DFA when the pattern set fits `Aho.DFA_MEMORY_CAP` "
-        f"(currently **{dfa_cap}**, `src/aho.zig`), falling back to a classic "
-        f"trie/fail-link walk otherwise - both are correct, but the DFA is usually "
-        f"faster for small-to-moderate pattern sets. This run's {data['n_patterns']} "
-        f"patterns (~{total_pattern_bytes / 1024:.1f} KiB total) comfortably fit under "
-        f"the cap, so this benchmark exercises the DFA path specifically. A much larger "
-        f"or more numerous pattern set can exceed the cap and fall back - re-run against "
-        f"your own patterns if that distinction matters for your use case."
-    )
+    if "manifest" in data:
+        manifest = data["manifest"]
+        total_pattern_bytes = sum(manifest["secret_lengths"]) + sum(manifest["pem_lengths"])
+        a(
+            f"- **Pattern set size vs. the DFA path.** secretsweeper dispatches through a "
+            f"byte-class-compressed DFA when the pattern set fits `Aho.DFA_MEMORY_CAP` "
+            f"(currently **{dfa_cap}**, `src/aho.zig`), falling back to a classic "
+            f"trie/fail-link walk otherwise - both are correct, but the DFA is usually "
+            f"faster for small-to-moderate pattern sets. This run's {data['n_patterns']} "
+            f"patterns (~{total_pattern_bytes / 1024:.1f} KiB total) comfortably fit under "
+            f"the cap, so this benchmark exercises the DFA path specifically. A much larger "
+            f"or more numerous pattern set can exceed the cap and fall back - re-run against "
+            f"your own patterns if that distinction matters for your use case."
+        )
     a(
         "- **This corpus is a best case for the bigram gate.** The DFA dispatch skips a "
-        "byte entirely (no `dfa_table`/`dfa_match` lookup at all) whenever it's at the "
+        "byte entirely (no DFA table lookup at all) whenever it's at the "
         "root and the next two bytes provably can't start any pattern - a large win when "
         "matches are sparse (this corpus: real matches roughly every ~370 bytes), since "
         "most of the file never leaves the root state. Corpora with frequent or "
@@ -285,25 +442,146 @@ def render_markdown(data: dict, sysinfo: dict) -> str:
         "multiple separate invocations."
     )
     a("")
+    return lines
+
+
+@functools.cache
+def _u_counts(n1: int, n2: int) -> tuple[int, ...]:
+    """`counts[u]` is how many of the C(n1 + n2, n1) orderings of two samples
+    of sizes n1 and n2 rank exactly `u` (second sample, first sample) pairs
+    with the second one larger - the null distribution of the U statistic.
+    The largest element either comes from the second sample, beating all n1
+    of the first, or from the first sample, beating nothing."""
+    if n1 == 0 or n2 == 0:
+        return (1,)
+    counts = [0] * (n1 * n2 + 1)
+    for u, c in enumerate(_u_counts(n1, n2 - 1)):
+        counts[u + n1] += c
+    for u, c in enumerate(_u_counts(n1 - 1, n2)):
+        counts[u] += c
+    return tuple(counts)
+
+
+EXACT_U_MAX_PAIRS = 2500
+
+
+def mann_whitney_greater(baseline: list[float], current: list[float]) -> float:
+    """One-sided Mann-Whitney U p-value for `current` tending to be larger than
+    `baseline`: exact when the samples are small and tie-free, otherwise the
+    normal approximation with a continuity correction."""
+    n1, n2 = len(baseline), len(current)
+    u = sum((c > b) + 0.5 * (c == b) for c in current for b in baseline)
+    ties = len(set(baseline) | set(current)) < n1 + n2
+    if n1 * n2 <= EXACT_U_MAX_PAIRS and not ties:
+        counts = _u_counts(n1, n2)
+        return sum(counts[int(u) :]) / sum(counts)
+    mean = n1 * n2 / 2
+    sd = (n1 * n2 * (n1 + n2 + 1) / 12) ** 0.5
+    return 1 - statistics.NormalDist().cdf((u - 0.5 - mean) / sd)
+
+
+def _mad(runs: list[float]) -> float:
+    median = statistics.median(runs)
+    return statistics.median(abs(x - median) for x in runs)
+
+
+def compare_runs(baseline: list[float], current: list[float], alpha: float, threshold: float) -> dict:
+    """Compares two samples of per-round times (lower is better)."""
+    base, cur = statistics.median(baseline), statistics.median(current)
+    delta = (cur - base) / base * 100
+    # The scaled MAD of each sample estimates its standard deviation robustly
+    # (one slow round barely moves it); their combination is the noise on the delta.
+    noise = 1.4826 * (_mad(baseline) ** 2 + _mad(current) ** 2) ** 0.5 / base * 100
+    slower = delta > 0
+    p = mann_whitney_greater(baseline, current) if slower else mann_whitney_greater(current, baseline)
+    verdict = "~"
+    if p < alpha and abs(delta) > max(threshold, noise):
+        verdict = "regression" if slower else "improvement"
+    return {"baseline": base, "current": cur, "delta_pct": delta, "noise_pct": noise, "p": p, "verdict": verdict}
+
+
+def _pairs(baseline: dict, current: dict, section: str | None, runs_key: str) -> list[tuple[str, list, list]]:
+    base = (baseline.get(section) or {}).get("results", {}) if section else baseline.get("results", {})
+    cur = (current.get(section) or {}).get("results", {}) if section else current.get("results", {})
+    return [
+        (name, base[name][runs_key], r[runs_key])
+        for name, r in cur.items()
+        if r.get("available") and base.get(name, {}).get("available") and base[name].get(runs_key)
+        if r.get(runs_key)
+    ]
 
-    unavailable = [(name, r) for name, r in results.items() if not r["available"]]
-    if unavailable:
-        a("<details><summary>Unavailable on this run</summary>")
+
+def render_comparison(baseline: dict, current: dict, alpha: float, threshold: float) -> tuple[str, int]:
+    """Returns the Markdown comparison and the number of flagged regressions."""
+    lines: list[str] = []
+    a = lines.append
+    a("# Benchmark comparison")
+    a("")
+    a(
+        f"Medians of the interleaved rounds, baseline vs. current. `noise` is the combined spread of both "
+        f"samples (scaled MAD, as a percentage of the baseline); `p` is the one-sided Mann-Whitney U test in "
+        f"the direction of the change. Flagged when p < {alpha} and the change exceeds both {threshold}% and "
+        f"the noise."
+    )
+    a("")
+    regressions = 0
+    sections = [
+        ("Engines (`mask()`, whole corpus)", None, "runs_ms", "ms"),
+        ("Streaming", "streaming", "runs_ns", "ns"),
+    ]
+    for title, section, runs_key, unit in sections:
+        pairs = _pairs(baseline, current, section, runs_key)
+        if not pairs:
+            continue
+        a(f"## {title}")
         a("")
-        for name, r in unavailable:
-            a(f"- **{name}**: {r['note']}")
+        a("| | baseline | current | delta | noise | p | |")
+        a("|---|---:|---:|---:|---:|---:|:---:|")
+        for name, base_runs, cur_runs in pairs:
+            c = compare_runs(base_runs, cur_runs, alpha, threshold)
+            mark = {"regression": "🔴 regression", "improvement": "🟢 improvement"}.get(c["verdict"], "")
+            regressions += c["verdict"] == "regression"
+            a(
+                f"| {name} | {c['baseline']:,.1f} {unit} | {c['current']:,.1f} {unit} | {c['delta_pct']:+.1f}% | "
+                f"±{c['noise_pct']:.1f}% | {c['p']:.3f} | {mark} |"
+            )
         a("")
-        a("</details>")
+    if len(lines) == 4:
+        a("No engine or metric has per-round samples in both files.")
         a("")
-
-    return "\n".join(lines) + "\n"
+    return "\n".join(lines) + "\n", regressions
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        type=pathlib.Path,
+        metavar=("BASELINE", "CURRENT"),
+        help="compare two results.json files instead of rendering RESULTS.md",
+    )
+    parser.add_argument("--alpha", type=float, default=0.05, help="significance level (default: 0.05)")
+    parser.add_argument("--threshold", type=float, default=10.0, help="minimum flagged change in %% (default: 10)")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (json.loads(path.read_text()) for path in args.compare)
+        markdown, regressions = render_comparison(baseline, current, args.alpha, args.threshold)
+        print(markdown, end="")
+        if regressions:
+            print(f"{regressions} significant regression{'s' if regressions != 1 else ''}", file=sys.stderr)
+            sys.exit(1)
+        return
+
     with (DATA_DIR / "results.json").open() as f:
         data = json.load(f)
+    scaling_path = DATA_DIR / "scaling.json"
+    scaling = json.loads(scaling_path.read_text()) if scaling_path.exists() else None
+    concurrency_path = DATA_DIR / "concurrency.json"
+    concurrency = json.loads(concurrency_path.read_text()) if concurrency_path.exists() else None
     sysinfo = collect_system_info()
-    markdown = render_markdown(data, sysinfo)
+    markdown = render_markdown(data, sysinfo, scaling, concurrency)
     OUT_PATH.write_text(markdown)
     print(f"Wrote {OUT_PATH}")
 
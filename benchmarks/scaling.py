@@ -0,0 +1,149 @@
+"""Sweeps secretsweeper across pattern count, match density and input size.
+
+`bench.py` measures one fixed scenario. This runs a matrix of the synthetic
+scenarios `gen_corpus.generate_scenario` builds - every combination of
+pattern count (10 to 1M), match density (`none`, `sparse`, `moderate`,
+`dense`, `overlapping`) and input size - to show where the DFA stops fitting
+`Aho.DFA_MEMORY_CAP` and falls back to the goto/fail-link walk, and where
+memory grows.
+
+Each cell runs in a fresh interpreter, so peak RSS is that cell's own. The
+parent writes the corpus and patterns to `data/scaling/`, and the child loads
+them before it records its baseline RSS. Per cell it records:
+
+- `build_ms`: compiling the patterns (`Masker(patterns)`);
+- `engine`: `dfa` or `trie`, whichever `ss_build` selected;
+- `min_mb_s`: the best `Masker.mask` throughput over `--rounds` calls;
+- `peak_rss_mib` and `build_rss_mib`: the child's peak RSS, and how far it
+  grew past the loaded inputs while building and masking.
+
+Usage:
+    uv run python benchmarks/scaling.py [--patterns 10,1000,...] [--densities none,dense,...] [--sizes-mib 1,16]
+Writes benchmarks/data/scaling.json, rendered by `report.py`.
+"""
+
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+
+import gen_corpus
+
+REPO_ROOT = pathlib.Path(__file__).parent.parent
+DATA_DIR = pathlib.Path(__file__).parent / "data"
+SCRATCH_DIR = DATA_DIR / "scaling"
+
+CHILD = """
+import json, pathlib, sys, time
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mib():
+    # Linux carries ru_maxrss over from the parent across fork and exec, so read this process's own peak.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+import secretsweeper
+from secretsweeper import _core
+
+scratch = pathlib.Path(sys.argv[1])
+rounds = int(sys.argv[2])
+corpus = (scratch / "corpus.bin").read_bytes()
+patterns = (scratch / "patterns.txt").read_bytes().split(b"\\n")
+baseline = peak_rss_mib()
+
+t0 = time.perf_counter()
+masker = secretsweeper.Masker(patterns)
+build_ms = (time.perf_counter() - t0) * 1000
+best = float("inf")
+for _ in range(rounds):
+    t0 = time.perf_counter()
+    masker.mask(corpus)
+    best = min(best, time.perf_counter() - t0)
+peak = peak_rss_mib()
+print(json.dumps({
+    "build_ms": build_ms,
+    "engine": "dfa" if _core._api().uses_dfa(masker._automaton) else "trie",
+    "min_ms": best * 1000,
+    "min_mb_s": len(corpus) / best / 1e6,
+    "peak_rss_mib": peak,
+    "build_rss_mib": None if peak is None else peak - baseline,
+}))
+"""
+
+
+def run_cell(n_patterns: int, density: str, size: int, rounds: int) -> dict:
+    corpus, patterns = gen_corpus.generate_scenario(size, n_patterns, density)
+    SCRATCH_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        (SCRATCH_DIR / "corpus.bin").write_bytes(corpus)
+        (SCRATCH_DIR / "patterns.txt").write_bytes(b"\n".join(patterns))
+        del corpus
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, str(SCRATCH_DIR), str(rounds)],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=REPO_ROOT,
+        ).stdout
+    finally:
+        for name in ("corpus.bin", "patterns.txt"):
+            (SCRATCH_DIR / name).unlink(missing_ok=True)
+    return {"n_patterns": len(patterns), "density": density, "size_bytes": size, **json.loads(out)}
+
+
+def _ints(text: str) -> list[int]:
+    return [int(x) for x in text.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--patterns", type=_ints, default=[10, 1_000, 100_000, 1_000_000], help="comma-separated pattern counts"
+    )
+    parser.add_argument(
+        "--densities",
+        type=lambda text: text.split(","),
+        default=list(gen_corpus.DENSITIES),
+        help=f"comma-separated match densities, from: {', '.join(gen_corpus.DENSITIES)}",
+    )
+    parser.add_argument("--sizes-mib", type=_ints, default=[1, 16, 64], help="comma-separated input sizes in MiB")
+    parser.add_argument("--rounds", type=int, default=3, help="mask calls per cell, best one counts (default: 3)")
+    args = parser.parse_args()
+    unknown = set(args.densities) - set(gen_corpus.DENSITIES)
+    if unknown:
+        parser.error(f"unknown densities: {', '.join(sorted(unknown))}")
+
+    cells = []
+    for n_patterns in args.patterns:
+        for density in args.densities:
+            for size_mib in args.sizes_mib:
+                cell = run_cell(n_patterns, density, size_mib * 1024 * 1024, args.rounds)
+                cells.append(cell)
+                rss = f"{cell['peak_rss_mib']:.0f} MiB" if cell["peak_rss_mib"] is not None else "n/a"
+                print(
+                    f"{n_patterns:>9} patterns  {density:<11} {size_mib:>4} MiB  {cell['engine']:<4}  "
+                    f"build {cell['build_ms']:9.1f} ms  {cell['min_mb_s']:7.1f} MB/s  peak RSS {rss}"
+                )
+
+    DATA_DIR.mkdir(exist_ok=True)
+    out_path = DATA_DIR / "scaling.json"
+    with out_path.open("w") as f:
+        json.dump({"rounds": args.rounds, "seed": gen_corpus.SEED, "cells": cells}, f, indent=2)
+    print(f"Saved {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,21 +20,39 @@ pub fn build(b: *std.Build) void {
     // symbols stay undefined and resolve against the hosting interpreter at import
     // time; Windows cannot do that (extensions must link python3.lib there), so the
     // extension is skipped and secretsweeper falls back to the ctypes path.
+    //
+    // Free-threaded CPython has no stable ABI, so for it the extension is built
+    // against that interpreter's own ABI and installed under its EXT_SUFFIX
+    // (e.g. `.cpython-313t-x86_64-linux-gnu.so`), which the hatch hook passes in.
+    const free_threaded = b.option(
+        bool,
+        "free-threaded",
+        "Build the extension for free-threaded CPython (3.13t+) instead of the stable ABI",
+    ) orelse false;
+    const ext_suffix = b.option(
+        []const u8,
+        "ext-suffix",
+        "File name suffix of the extension module (sysconfig EXT_SUFFIX)",
+    ) orelse ".abi3.so";
     if (target.result.os.tag != .windows) {
+        const ext_options = b.addOptions();
+        ext_options.addOption(bool, "free_threaded", free_threaded);
+        const ext_module = b.createModule(.{
+            .root_source_file = b.path("src/python.zig"),
+            .target = target,
+            .optimize = optimize,
+            .link_libc = true,
+        });
+        ext_module.addOptions("build_options", ext_options);
         const ext = b.addLibrary(.{
             .name = "_native",
             .linkage = .dynamic,
-            .root_module = b.createModule(.{
-                .root_source_file = b.path("src/python.zig"),
-                .target = target,
-                .optimize = optimize,
-                .link_libc = true,
-            }),
+            .root_module = ext_module,
         });
         ext.linker_allow_shlib_undefined = true;
         const ext_install = b.addInstallArtifact(
             ext,
-            .{ .dest_dir = .{ .override = .lib }, .dest_sub_path = "_native.abi3.so" },
+            .{ .dest_dir = .{ .override = .lib }, .dest_sub_path = b.fmt("_native{s}", .{ext_suffix}) },
         );
         b.getInstallStep().dependOn(&ext_install.step);
     }
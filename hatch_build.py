@@ -12,17 +12,28 @@ from hatchling.builders.hooks.plugin.interface import BuildHookInterface
 
 LIBRARY_NAMES = ("libsecretsweeper.so", "libsecretsweeper.dylib", "secretsweeper.dll")
 # CPython extension for the hot calls; the ctypes fallback applies where it is absent.
-# Not shipped on Windows (extensions must link python3.lib there) or in free-threaded
-# wheels (no stable ABI: the object header layout differs and importing it segfaults).
+# Not shipped on Windows (extensions must link python3.lib there). Free-threaded CPython
+# has no stable ABI, so its wheels ship a variant built for the interpreter's own ABI.
 EXTENSION_NAMES = ("_native.abi3.so",)
 
 
+def free_threaded() -> bool:
+    return bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+
+
 def extension_names() -> tuple[str, ...]:
-    if sysconfig.get_config_var("Py_GIL_DISABLED"):
-        return ()
+    if free_threaded():
+        return (f"_native{sysconfig.get_config_var('EXT_SUFFIX')}",)
     return EXTENSION_NAMES
 
 
+def extension_options() -> list[str]:
+    """Build options selecting the free-threaded variant of the extension, if needed."""
+    if not free_threaded():
+        return []
+    return ["-Dfree-threaded=true", f"-Dext-suffix={sysconfig.get_config_var('EXT_SUFFIX')}"]
+
+
 def zig_command() -> list[str]:
     """Use the zig binary from SECRET_SWEEPER_ZIG if set, otherwise prefer the `ziglang`
     wheel from build requirements, and fall back to a system zig."""
@@ -90,7 +101,10 @@ class ZigBuildHook(BuildHookInterface):
         target = windows or macos_target()
         try:
             target_options = [f"-Dtarget={target}"] if target else []
-            run_zig(["build", "-Doptimize=ReleaseFast", *target_options, *linux_cpu()], cwd=self.root)
+            run_zig(
+                ["build", "-Doptimize=ReleaseFast", *target_options, *linux_cpu(), *extension_options()],
+                cwd=self.root,
+            )
         except RuntimeError:
             # On any host other than Windows a build failure is fatal: the `build-lib`
             # fallback is a workaround for the Windows ARM64 crash below and would
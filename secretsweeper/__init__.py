@@ -2,33 +2,212 @@ import io
 import typing
 
 from . import _core
-from ._core import MAX_NUMBER_OF_STARS, mask
+from ._core import MAX_NUMBER_OF_STARS, MAX_SHARDS, Masker, contains_secret, find_spans, first_match, mask, mask_text
+from ._trace import enable_tracing, reset_tracing, trace_histograms
 
-__all__ = ["MAX_NUMBER_OF_STARS", "StreamWrapper", "mask"]
+if typing.TYPE_CHECKING:
+    import queue
+    import threading
+
+    from ._follow import FOLLOW_BLOCK_SIZE, FOLLOW_POLL_INTERVAL, follow
+    from ._plan import PLAN_BLOCK_SIZE, patterns_from_plan
+    from ._sweep import sweep_tree
+
+LINE_BLOCK_SIZE = 1 << 16
+"""The default number of bytes `StreamWrapper.iter_lines` reads and masks at a time."""
+
+__all__ = [
+    "FOLLOW_BLOCK_SIZE",
+    "FOLLOW_POLL_INTERVAL",
+    "MAX_NUMBER_OF_STARS",
+    "MAX_SHARDS",
+    "Masker",
+    "PLAN_BLOCK_SIZE",
+    "StreamWrapper",
+    "contains_secret",
+    "enable_tracing",
+    "find_spans",
+    "first_match",
+    "follow",
+    "mask",
+    "mask_text",
+    "patterns_from_plan",
+    "reset_tracing",
+    "sweep_tree",
+    "trace_histograms",
+]
+
+
+def __getattr__(name: str) -> typing.Any:
+    """Load the submodules that only some callers need on first use, to keep `import secretsweeper` lean."""
+    if name in ("FOLLOW_BLOCK_SIZE", "FOLLOW_POLL_INTERVAL", "follow"):
+        from . import _follow as module
+    elif name in ("PLAN_BLOCK_SIZE", "patterns_from_plan"):
+        from . import _plan as module
+    elif name == "sweep_tree":
+        from . import _sweep as module
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = getattr(module, name)
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
 
 
 class StreamWrapper(io.RawIOBase):
     """The StreamWrapper wraps an io.BytesIO stream to mask or remove secrets while reading from it."""
 
     def __init__(
-        self, stream: typing.IO[bytes], patterns: typing.Iterable[bytes], /, *, limit: int = MAX_NUMBER_OF_STARS
+        self,
+        stream: typing.IO[bytes],
+        patterns: typing.Iterable[bytes] | Masker,
+        /,
+        *,
+        limit: int | None = None,
+        encodings: typing.Iterable[str] = (),
+        max_hold: float | None = None,
+        max_hold_bytes: int | None = None,
+        prefetch: int = 0,
     ):
         """
         The StreamWrapper class constructor.
 
         :param stream: An I/O stream (a file-like object) that works with binary data (sequences of bytes).
-        :param patterns: Any iterable of patterns that have to be masked with the `*` asterisk character.
-        :param limit: The max number of consecutive stars.
+        :param patterns: Any iterable of patterns that have to be masked with the `*` asterisk character, or a
+        `Masker` to share its compiled patterns: many concurrent streams then hold one copy of the automaton.
+        :param limit: The max number of consecutive stars. Defaults to the Masker's limit, or `MAX_NUMBER_OF_STARS`.
+        :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+        are masked as well. Must be empty with a Masker, which has its encodings compiled in.
+        :param max_hold: The max number of seconds to hold back the start of a possible multiline secret while
+        waiting for more input, e.g. the first line of a PEM block in interactive output. When it runs out, the
+        held bytes are emitted masked as a whole instead, so a possible secret prefix is never leaked and the
+        rest of the secret is still masked if it follows. Waiting uses the stream's file descriptor, so bytes
+        already sitting in a Python-level buffer only arrive after the wait; prefer an unbuffered stream, e.g.
+        `Popen(..., bufsize=0).stdout`. Defaults to holding until more input or EOF arrives.
+        :param max_hold_bytes: The max number of bytes to hold back; more are emitted masked right away.
+        :param prefetch: The number of chunks a background thread reads ahead of the masking, so reading the next
+        chunk overlaps with masking the current one, e.g. on slow pipes or network streams. The thread starts at
+        the first read and reads chunks the way that read does (`read(size)`, `readline()` or `iter_lines`);
+        chunks of 4 KiB or more are masked with the GIL released. `max_hold` then waits on the read-ahead instead
+        of the file descriptor, so it works for any stream. Close the wrapper to stop the thread early. Defaults
+        to 0: no thread, every chunk is read right before it is masked.
         """
+        # Set first: `close`, which `__del__` calls even when a check below raises, reads them.
+        self._chunks: queue.Queue[bytes | BaseException] | None = None
+        self._stop_prefetch: threading.Event | None = None
+        if max_hold is not None and max_hold < 0:
+            raise ValueError("max_hold must be non-negative")
+        if max_hold_bytes is not None and max_hold_bytes < 0:
+            raise ValueError("max_hold_bytes must be non-negative")
+        if prefetch < 0:
+            raise ValueError("prefetch must be non-negative")
         self._stream = stream
-        self._wrapper = _core._StreamWrapper(patterns, limit=limit)  # noqa: F405
+        self._wrapper = _core._StreamWrapper(patterns, limit=limit, encodings=encodings)  # noqa: F405
+        self._max_hold = max_hold
+        self._max_hold_bytes = max_hold_bytes
+        self._held_since: float | None = None
+        self._prefetch = prefetch
+        if prefetch:
+            self._stop_prefetch = _new_stop_event()
+        self._next_chunk: bytes | BaseException | None = None
+        self._prefetch_eof = False
+
+    def _masking_read(self, read: typing.Callable[[int], bytes], size: int) -> bytes:
+        """Mask the chunks `read` returns until there is output, applying the hold limits, or EOF."""
+        if self._max_hold is None and self._max_hold_bytes is None:
+            while carry := read(size):
+                if res := self._wrapper.masking_read(carry):
+                    return res
+            return self._wrapper.consume_reminder()
+        import time  # imported here to keep `import secretsweeper` lean
+
+        while True:
+            if self._held_since is not None and not self._wait_for_input():
+                if res := self._flush_held():
+                    return res
+            if not (carry := read(size)):
+                self._held_since = None
+                return self._wrapper.consume_reminder()
+            res = self._wrapper.masking_read(carry)
+            held = len(self._wrapper.get_reminder())
+            if self._max_hold_bytes is not None and held > self._max_hold_bytes:
+                res += self._flush_held()
+            elif not held:
+                self._held_since = None
+            elif self._held_since is None:
+                self._held_since = time.monotonic()
+            if res:
+                return res
+
+    def _reader(self, read: typing.Callable[[int], bytes], size: int) -> typing.Callable[[int], bytes]:
+        """The function to read the chunks to mask with: `read`, or the read-ahead thread's with `prefetch`."""
+        if not self._prefetch:
+            return read
+        if self._chunks is None:
+            import queue  # imported here to keep `import secretsweeper` lean
+            import threading
+
+            assert self._stop_prefetch is not None
+            self._chunks = queue.Queue(self._prefetch)
+            threading.Thread(
+                target=_read_ahead,
+                args=(read, size, self._chunks, self._stop_prefetch),
+                name="secretsweeper-prefetch",
+                daemon=True,
+            ).start()
+        return self._read_prefetched
+
+    def _read_prefetched(self, _size: int) -> bytes:
+        """Take the next chunk the read-ahead thread has read, waiting for it if needed."""
+        if self._prefetch_eof:
+            return b""
+        chunk = self._next_chunk
+        self._next_chunk = None
+        if chunk is None:
+            assert self._chunks is not None
+            chunk = self._chunks.get()
+        if isinstance(chunk, BaseException):
+            self._prefetch_eof = True
+            raise chunk
+        self._prefetch_eof = not chunk
+        return chunk
+
+    def _wait_for_input(self) -> bool:
+        """Wait until the stream has input or the held bytes run out of `max_hold`; False if they did."""
+        if self._max_hold is None or self._held_since is None:
+            return True
+        import queue  # imported here to keep `import secretsweeper` lean
+        import select
+        import time
+
+        timeout = self._held_since + self._max_hold - time.monotonic()
+        if timeout <= 0:
+            return False
+        if self._chunks is not None:
+            if self._next_chunk is None and not self._prefetch_eof:
+                try:
+                    self._next_chunk = self._chunks.get(timeout=timeout)
+                except queue.Empty:
+                    return False
+            return True
+        try:
+            return bool(select.select((self._stream.fileno(),), (), (), timeout)[0])
+        except (OSError, ValueError):
+            # Not backed by a selectable file descriptor (e.g. BytesIO): a read is all there is to wait with.
+            return True
+
+    def _flush_held(self) -> bytes:
+        self._held_since = None
+        return self._wrapper.flush_reminder()
 
     def read(self, size: int = -1) -> bytes:
         """
         Read up to size bytes from the object and return them.
 
         All found patterns are masked. If a starting part of some multiline pattern appears at the end of line
-        the method may move it to the beginning of the next line.
+        the method may move it to the beginning of the next line, or emit it masked once `max_hold` runs out.
 
         :param size: A number of bytes to read. As a convenience, if size is unspecified or -1,
         all bytes until EOF are returned. Otherwise, only one system call is ever made.
@@ -36,27 +215,95 @@ class StreamWrapper(io.RawIOBase):
         :return: If 0 bytes are returned, and size was not 0, this indicates end of file.
         If the object is in non-blocking mode and no bytes are available, None is returned.
         """
-        while carry := self._stream.read(size):
-            if res := self._wrapper.masking_read(carry):
-                return res
-        return self._wrapper.consume_reminder()
+        return self._masking_read(self._reader(self._stream.read, size), size)
 
     def readline(self, size: int | None = -1, /) -> bytes:
         """
         Read and return one line from the stream.
 
         All found patterns are masked. If a starting part of some multiline pattern appears at the end of line
-        the method may move it to the beginning of the next line.
+        the method may move it to the beginning of the next line, or emit it masked once `max_hold` runs out.
 
         :param size: If size is specified, at most size bytes will be read.
         :return: The line with masked patterns. The line terminator is always b'\n' for binary files.
         """
-        if size is None:
-            size = -1
-        while carry := self._stream.readline(size):
-            if res := self._wrapper.masking_read(carry):
-                return res
-        return self._wrapper.consume_reminder()
+        size = -1 if size is None else size
+        return self._masking_read(self._reader(self._stream.readline, size), size)
+
+    def iter_lines(self, block_size: int = LINE_BLOCK_SIZE) -> typing.Iterator[bytes]:
+        """
+        Iterate over the masked lines of the stream, reading and masking it in blocks.
+
+        Iterating the wrapper itself masks one line per call, and the per-call overhead dominates logs of many
+        short lines. This reads `block_size` bytes at a time and masks and splits each block into lines in one
+        native call instead. Every yielded line is a complete line of the masked output ending with b'\n',
+        except possibly the last one; text held back as a possible partial match is yielded as part of the line
+        it ends up in, not moved to the next one. Joined together, the lines equal `readall()`.
+
+        The stream is consumed in whole blocks, so do not mix this with the other read methods. `max_hold` and
+        `max_hold_bytes` do not apply, since only complete lines are yielded.
+
+        :param block_size: The number of bytes to read from the stream at a time.
+        :return: An iterator over the masked lines.
+        """
+        if block_size <= 0:
+            raise ValueError("block_size must be positive")
+        read = self._reader(self._stream.read, block_size)
+        pending = b""
+        while block := read(block_size):
+            lines = self._wrapper.masking_read_lines(block)
+            if len(lines) == 1:
+                pending += lines[0]
+                continue
+            if pending:
+                lines[0] = pending + lines[0]
+            pending = lines.pop()
+            yield from lines
+        # The reminder may hold the start of a multiline pattern that never completed.
+        yield from (pending + self._wrapper.consume_reminder()).splitlines(keepends=True)
+
+    def checkpoint(self) -> bytes:
+        """
+        Save the masking state of the stream, to continue it in another wrapper, e.g. after a restart.
+
+        The state covers exactly the input the wrapper has read from the stream: a partial match held back at the
+        end travels with it, so nothing is reprocessed or emitted twice. Together with the stream offset at this
+        point, it lets a log shipper resume masking a file where it stopped. Take it between `read` or `readline`
+        calls; `iter_lines` and `prefetch` read ahead of what they have returned.
+
+        :return: A compact blob for `restore`, with a fingerprint of the patterns (and their encodings).
+        """
+        if self._chunks is not None:
+            raise ValueError("cannot checkpoint a stream that is read ahead with prefetch")
+        return self._wrapper.checkpoint()
+
+    def restore(self, checkpoint: bytes | bytearray | memoryview, /) -> None:
+        """
+        Continue the stream from a `checkpoint`: the wrapped stream must be positioned where the checkpointed
+        wrapper had read up to, and the next read carries on masking from there.
+
+        :param checkpoint: A blob returned by `checkpoint`. It raises ValueError if it was taken over different
+        patterns, in a different order, or is malformed.
+        """
+        if self._chunks is not None:
+            raise ValueError("cannot restore a stream that is read ahead with prefetch")
+        self._wrapper.restore(checkpoint)
+        self._held_since = None
+
+    def close(self) -> None:
+        """Close the wrapper and stop the read-ahead thread of `prefetch`; the wrapped stream stays open."""
+        if self._stop_prefetch is not None:
+            self._stop_prefetch.set()
+        if self._chunks is not None:
+            import queue  # imported here to keep `import secretsweeper` lean
+
+            # Unblock a read-ahead waiting for room in the queue, so it sees the stop event.
+            while True:
+                try:
+                    self._chunks.get_nowait()
+                except queue.Empty:
+                    break
+        super().close()
 
     def seekable(self):
         """This stream does not support seek operations."""
@@ -69,3 +316,30 @@ class StreamWrapper(io.RawIOBase):
     def writable(self) -> bool:
         """This stream does not support writing."""
         return False
+
+
+def _new_stop_event() -> "threading.Event":
+    import threading  # imported here to keep `import secretsweeper` lean
+
+    return threading.Event()
+
+
+def _read_ahead(
+    read: typing.Callable[[int], bytes],
+    size: int,
+    chunks: "queue.Queue[bytes | BaseException]",
+    stop: "threading.Event",
+) -> None:
+    """
+    The `prefetch` read-ahead thread: read chunks into the bounded queue until EOF, an error or the stop event.
+
+    It holds no reference to the wrapper, so an abandoned wrapper is still collected, and closing it stops this.
+    """
+    try:
+        while not stop.is_set():
+            chunk = read(size)
+            chunks.put(chunk)
+            if not chunk:
+                return
+    except BaseException as ex:
+        chunks.put(ex)
@@ -1,71 +1,44 @@
-"""ctypes bindings for the Aho-Corasick automaton shared library written in Zig."""
+"""Python API over the Aho-Corasick automaton written in Zig."""
 
-import ctypes
+import array
 import io
 import os
-import pathlib
-import sys
-import sysconfig
-import threading
 import typing
+from types import ModuleType
 
-if sysconfig.get_config_var("Py_GIL_DISABLED"):
-    # Free-threaded CPython does not support the stable ABI: its object header layout
-    # differs from the one the extension declares, and importing it segfaults.
-    _native = None
-else:
-    try:
-        from secretsweeper import _native
-    except ImportError:  # platforms where the extension is not built (e.g. Windows)
-        _native = None  # ty: ignore[invalid-assignment]
+try:
+    # Free-threaded CPython never imports the stable-ABI `_native.abi3.so`, only the
+    # variant built for its own EXT_SUFFIX (see build.zig).
+    from secretsweeper import _native
+except ImportError:  # platforms where the extension is not built (e.g. Windows)
+    _native = None  # ty: ignore[invalid-assignment]
 
 MAX_NUMBER_OF_STARS = 15
 
-_LIBRARY_NAMES = {
-    "win32": ("secretsweeper.dll",),
-    "cygwin": ("secretsweeper.dll",),
-    "darwin": ("libsecretsweeper.dylib",),
-}
-
-
-def _load_library() -> ctypes.CDLL:
-    package_dir = pathlib.Path(__file__).parent
-    names = _LIBRARY_NAMES.get(sys.platform, ("libsecretsweeper.so",))
-    for name in names:
-        path = package_dir / name
-        if path.exists():
-            return ctypes.CDLL(str(path))
-    raise ImportError(f"cannot find the secretsweeper shared library in {package_dir}")
-
-
-_lib = _load_library()
-
-_lib.ss_new.argtypes = ()
-_lib.ss_new.restype = ctypes.c_void_p
-_lib.ss_destroy.argtypes = (ctypes.c_void_p,)
-_lib.ss_destroy.restype = None
-_lib.ss_insert.argtypes = (ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t)
-_lib.ss_insert.restype = ctypes.c_int32
-_lib.ss_build.argtypes = (ctypes.c_void_p,)
-_lib.ss_build.restype = ctypes.c_int32
-_lib.ss_build_fallback.argtypes = (ctypes.c_void_p,)
-_lib.ss_build_fallback.restype = ctypes.c_int32
-_lib.ss_mask.argtypes = (
-    ctypes.c_void_p,
-    ctypes.c_char_p,
-    ctypes.c_size_t,
-    ctypes.c_uint64,
-    ctypes.c_bool,
-    ctypes.POINTER(ctypes.c_void_p),
-    ctypes.POINTER(ctypes.c_size_t),
-)
-_lib.ss_mask.restype = ctypes.c_int32
-_lib.ss_free.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
-_lib.ss_free.restype = None
-_lib.ss_get_reminder.argtypes = (ctypes.c_void_p, ctypes.POINTER(ctypes.c_size_t))
-_lib.ss_get_reminder.restype = ctypes.c_void_p
-_lib.ss_reset_reminder.argtypes = (ctypes.c_void_p,)
-_lib.ss_reset_reminder.restype = None
+MAX_SHARDS = 64
+"""The most automatons `Masker(..., shards=N)` splits the patterns into (`Aho.MAX_SHARDS` in src/aho.zig)."""
+
+
+def _api() -> ModuleType:
+    """
+    The automaton API: the `_native` extension, or its ctypes mirror `_ctypes_lib` where the extension is not
+    built. The ctypes library is only imported (and `ctypes` with it) the first time it is needed.
+    """
+    if _native is not None:
+        return _native
+    from secretsweeper import _ctypes_lib
+
+    return _ctypes_lib
+
+
+def _destroy_automaton(automaton: int) -> None:
+    """Destroy an automaton handle."""
+    _api().destroy(automaton)
+
+
+def _destroy_cursor(cursor: int) -> None:
+    """Destroy a cursor handle."""
+    _api().cursor_destroy(cursor)
 
 
 _FORCE_NO_DFA_AUTOMATON_ENV = "SECRET_SWEEPER_NO_DFA_AUTOMATON"
@@ -91,79 +64,249 @@ def _is_env_flag_set(name: str) -> bool:
     return os.environ.get(name, "").strip().lower() in _TRUTHY_ENV_VALUES
 
 
-def _build_automaton(patterns: typing.Iterable[bytes]) -> int:
-    """Create an automaton, insert all patterns and build it. Returns the handle."""
-    automaton = _lib.ss_new()
-    if not automaton:
-        raise MemoryError("failed to create the automaton")
+_ENCODING_FLAGS = {"base64": 1 << 0, "base64url": 1 << 1, "url": 1 << 2, "json": 1 << 3}
+"""
+Bit positions of the `Encodings` packed struct in src/encodings.zig: each
+selected encoding makes the automaton also match the patterns in that form.
+"""
+
+
+def _encoding_flags(encodings: typing.Iterable[str]) -> int:
+    """Convert encoding names to the `Encodings` bit set passed to `ss_insert_encoded`."""
+    if isinstance(encodings, str):
+        raise TypeError("encodings must be an iterable of encoding names, not a str")
+    flags = 0
+    for name in encodings:
+        try:
+            flags |= _ENCODING_FLAGS[name]
+        except (KeyError, TypeError):
+            raise ValueError(f"unknown encoding {name!r}, expected one of: {', '.join(_ENCODING_FLAGS)}") from None
+    return flags
+
+
+def _build_automaton(patterns: typing.Iterable[bytes], encodings: typing.Iterable[str] = (), shards: int = 1) -> int:
+    """Create an automaton, insert all patterns and build it, split into up to `shards`. Returns the handle."""
+    if not 1 <= shards <= MAX_SHARDS:
+        raise ValueError(f"shards must be between 1 and {MAX_SHARDS}")
+    flags = _encoding_flags(encodings)
+    api = _api()
+    automaton = api.new()
     try:
         for pattern in patterns:
             if not isinstance(pattern, bytes):
                 raise TypeError(f"expected bytes, found {type(pattern)}")
-            if _lib.ss_insert(automaton, pattern, len(pattern)) != 0:
-                raise MemoryError("failed to insert a pattern")
-        build_fn = _lib.ss_build_fallback if _is_env_flag_set(_FORCE_NO_DFA_AUTOMATON_ENV) else _lib.ss_build
-        if build_fn(automaton) != 0:
-            raise MemoryError("failed to build the automaton")
+            api.insert(automaton, pattern, flags)
+        if shards > 1:
+            api.build_sharded(automaton, _is_env_flag_set(_FORCE_NO_DFA_AUTOMATON_ENV), shards)
+        else:
+            api.build(automaton, _is_env_flag_set(_FORCE_NO_DFA_AUTOMATON_ENV))
     except BaseException:
-        _lib.ss_destroy(automaton)
+        api.destroy(automaton)
         raise
     return automaton
 
 
-def _mask(automaton: int, text: bytes, limit: int, *, is_streaming: bool) -> bytes:
-    """Mask all patterns in the text using the given automaton handle."""
+def _mask(automaton: int, input: bytes | bytearray | memoryview, limit: int) -> bytes:
+    """Mask all patterns in the input using the given automaton handle."""
+    if limit < 0:
+        raise ValueError("limit must be non-negative")
+    return _api().mask(automaton, input, limit)
+
+
+def _mask_text(automaton: int, input: str, limit: int) -> str:
+    """Mask all patterns in the UTF-8 form of the text using the given automaton handle."""
     if limit < 0:
         raise ValueError("limit must be non-negative")
-    out_ptr = ctypes.c_void_p()
-    out_len = ctypes.c_size_t()
-    status = _lib.ss_mask(automaton, text, len(text), limit, is_streaming, ctypes.byref(out_ptr), ctypes.byref(out_len))
-    if status != 0:
-        raise MemoryError("failed to mask the input")
-    ptr = out_ptr.value
-    if not ptr:
-        return b""
     try:
-        return ctypes.string_at(ptr, out_len.value)
-    finally:
-        _lib.ss_free(ptr, out_len.value)
+        return _api().mask_text(automaton, input, limit)
+    except UnicodeEncodeError:
+        # Lone surrogates have no UTF-8 form to scan in place; mask their "surrogatepass" form instead.
+        data = input.encode("utf-8", "surrogatepass")
+        masked = _api().mask(automaton, data, limit)
+        return input if masked == data else masked.decode("utf-8", "surrogatepass")
 
 
-class _StreamWrapper:
-    """
-    An internal _StreamWrapper class that owns a persistent automaton handle.
+def _find_spans(automaton: int, input: bytes | bytearray | memoryview) -> array.array:
+    """Find all match spans in the input using the given automaton handle."""
+    spans = array.array("Q")
+    spans.frombytes(_api().find_spans(automaton, input))
+    return spans
 
-    The automaton state is mutated by the native code with the GIL released, so all
-    calls into it are serialized with a lock to keep concurrent use memory-safe.
 
-    This is also gevent-safe: `threading.Lock` is resolved when the wrapper is created,
-    honoring monkey-patching, and even an unpatched lock is only ever held around
-    native calls that contain no greenlet switch points.
+def _first_match(automaton: int, input: bytes | bytearray | memoryview) -> tuple[int, int, int] | None:
+    """Find the first match in the input using the given automaton handle."""
+    return _api().first_match(automaton, input)
+
+
+def _text_patterns(patterns: typing.Iterable[str]) -> typing.Iterator[bytes]:
+    """Encode text patterns to the UTF-8 form `mask_text` scans."""
+    for pattern in patterns:
+        if not isinstance(pattern, str):
+            raise TypeError(f"expected str, found {type(pattern)}")
+        yield pattern.encode("utf-8", "surrogatepass")
+
+
+def _check_text(input: object) -> None:
+    """Reject inputs that are not str with a hint for bytes-like objects."""
+    if not isinstance(input, str):
+        help_note = ". You can use mask() for bytes." if isinstance(input, (bytes, bytearray, memoryview)) else ""
+        raise TypeError(f"expected str, found {type(input)}{help_note}")
+
+
+def _check_input(input: object) -> None:
+    """Reject inputs that are not bytes-like with a hint for file-like objects."""
+    if not isinstance(input, (bytes, bytearray, memoryview)):
+        help_note = ". You can use the StreamWrapper class for such purposes." if isinstance(input, io.BytesIO) else ""
+        raise TypeError(f"expected bytes, memoryview or bytearray, found {type(input)}{help_note}")
+
+
+class Masker:
+    """
+    A compiled set of patterns that can be reused across many inputs.
+
+    The module-level functions build and destroy an automaton on every call; a Masker builds it once.
+    The built automaton is immutable and only read, so a Masker can be used from any number of threads at once
+    without locking, and any number of `StreamWrapper`s can share it: each stream keeps only its own small
+    matching state, instead of its own copy of the automaton.
     """
 
-    def __init__(self, patterns: typing.Iterable[bytes], /, *, limit: int = MAX_NUMBER_OF_STARS):
+    def __init__(
+        self,
+        patterns: typing.Iterable[bytes],
+        /,
+        *,
+        limit: int = MAX_NUMBER_OF_STARS,
+        encodings: typing.Iterable[str] = (),
+        shards: int = 1,
+    ):
         """
-        The _StreamWrapper class constructor.
+        The Masker class constructor.
 
         :param patterns: Any iterable of patterns that have to be masked with the `*` asterisk character.
         :param limit: The max number of consecutive stars.
+        :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+        are masked as well.
+        :param shards: Split the patterns into up to this many automatons (at most `MAX_SHARDS`) that every input
+        is scanned through side by side, on a native thread each for inputs of 64 KiB or more. The output is the
+        same; it pays off for very large pattern sets, which one automaton scans slowly or cannot fit a DFA for.
+        Patterns occurring inside other patterns always share a shard with them, so fewer shards may be used.
         """
         if limit < 0:
             raise ValueError("limit must be non-negative")
         self._limit = limit
-        self._lock = threading.Lock()
-        self._automaton = _build_automaton(patterns)
+        self._automaton = _build_automaton(patterns, encodings, shards)
 
-    def __del__(self, _destroy=_lib.ss_destroy):
+    def __del__(self, _destroy=_destroy_automaton):
         if automaton := getattr(self, "_automaton", 0):
             self._automaton = 0
             _destroy(automaton)
 
+    def mask(self, input: bytes | bytearray | memoryview, /) -> bytes:
+        """
+        Masks the patterns in the input.
+
+        :param input: An input bytes, bytearray or memoryview.
+        :return: Returns the input string with masked patterns.
+        """
+        _check_input(input)
+        return _mask(self._automaton, input, self._limit)
+
+    def mask_text(self, input: str, /) -> str:
+        """
+        Masks the patterns in the UTF-8 form of a str. See `mask_text`.
+
+        :param input: An input str.
+        :return: Returns the input str with masked patterns, or the input itself if nothing was masked.
+        """
+        _check_text(input)
+        return _mask_text(self._automaton, input, self._limit)
+
+    def find_spans(self, input: bytes | bytearray | memoryview, /) -> array.array:
+        """
+        Finds where the patterns occur in the input without masking it. See `find_spans`.
+
+        :param input: An input bytes, bytearray or memoryview.
+        :return: A flat `array.array("Q")` of `(start, end, pattern_id)` triples.
+        """
+        _check_input(input)
+        return _find_spans(self._automaton, input)
+
+    def first_match(self, input: bytes | bytearray | memoryview, /) -> tuple[int, int, int] | None:
+        """
+        Finds the first pattern occurrence in the input. See `first_match`.
+
+        :param input: An input bytes, bytearray or memoryview.
+        :return: A `(start, end, pattern_id)` tuple, or None if no pattern occurs in the input.
+        """
+        _check_input(input)
+        return _first_match(self._automaton, input)
+
+    def contains_secret(self, input: bytes | bytearray | memoryview, /) -> bool:
+        """
+        Checks whether any pattern occurs in the input. See `contains_secret`.
+
+        :param input: An input bytes, bytearray or memoryview.
+        :return: True if the input contains any of the patterns.
+        """
+        return self.first_match(input) is not None
+
+
+class _StreamWrapper:
+    """
+    An internal _StreamWrapper class that owns a streaming cursor over a `Masker`'s automaton.
+
+    The cursor state is mutated by the native code, so all calls into it are serialized with a lock to keep
+    concurrent use of one wrapper memory-safe. The automaton itself is only read, so wrappers sharing a Masker
+    never wait on each other.
+
+    This is also gevent-safe: `threading.Lock` is resolved when the wrapper is created,
+    honoring monkey-patching, and even an unpatched lock is only ever held around
+    native calls that contain no greenlet switch points.
+    """
+
+    def __init__(
+        self,
+        patterns_or_masker: typing.Iterable[bytes] | Masker,
+        /,
+        *,
+        limit: int | None = None,
+        encodings: typing.Iterable[str] = (),
+    ):
+        """
+        The _StreamWrapper class constructor.
+
+        :param patterns_or_masker: Any iterable of patterns that have to be masked with the `*` asterisk character,
+        or a `Masker` to share its compiled patterns.
+        :param limit: The max number of consecutive stars. Defaults to the Masker's limit, or `MAX_NUMBER_OF_STARS`.
+        :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+        are masked as well. Must be empty with a Masker, which has its encodings compiled in.
+        """
+        if limit is not None and limit < 0:
+            raise ValueError("limit must be non-negative")
+        if isinstance(patterns_or_masker, Masker):
+            if tuple(encodings):
+                raise ValueError("encodings are compiled into the Masker, pass them to Masker() instead")
+            self._masker = patterns_or_masker
+        else:
+            self._masker = Masker(
+                patterns_or_masker, limit=MAX_NUMBER_OF_STARS if limit is None else limit, encodings=encodings
+            )
+        self._limit = self._masker._limit if limit is None else limit
+        import threading  # imported here to keep `import secretsweeper` lean
+
+        self._lock = threading.Lock()
+        self._cursor = _api().cursor_new()
+
+    def __del__(self, _destroy=_destroy_cursor):
+        if cursor := getattr(self, "_cursor", 0):
+            self._cursor = 0
+            _destroy(cursor)
+
     def _id(self) -> int:
         """Return the identity of this object."""
         return id(self)
 
-    def masking_read(self, carry: bytes) -> bytes:
+    def masking_read(self, carry: bytes | bytearray | memoryview) -> bytes:
         """
         Read data from the carry buffer and apply pattern masking.
 
@@ -171,33 +314,70 @@ class _StreamWrapper:
         :return: Returns the input string with masked patterns.
         """
         with self._lock:
-            if _native is not None:
-                return _native.masking_read(self._automaton, carry, self._limit)
-            return _mask(self._automaton, carry, self._limit, is_streaming=True)
+            return _api().masking_read(self._masker._automaton, self._cursor, carry, self._limit)
+
+    def masking_read_lines(self, block: bytes) -> list[bytes]:
+        """
+        Apply pattern masking to a block of the stream and split the result into lines in the same native call.
+
+        :param block: A chunk buffer that needs to be masked with the `*` asterisk character.
+        :return: The complete masked lines, each with its trailing newline, followed by the unterminated rest of
+        the masked output (possibly empty).
+        """
+        with self._lock:
+            return _api().masking_read_lines(self._masker._automaton, self._cursor, block, self._limit)
 
     def consume_reminder(self) -> bytes:
         """
         :return: Consumes the reminder or return empty bytes if there is no reminder. Then reset its value.
         """
         with self._lock:
-            try:
-                return self._get_reminder()
-            finally:
-                _lib.ss_reset_reminder(self._automaton)
+            return _api().consume_reminder(self._cursor)
 
     def get_reminder(self) -> bytes:
         """
         :return: Get the reminder or return empty bytes if it's empty.
         """
         with self._lock:
-            return self._get_reminder()
+            return _api().get_reminder(self._cursor)
+
+    def match_count(self) -> int:
+        """
+        :return: The number of pattern occurrences masked so far, counted as `find_spans` reports them over the
+        whole stream.
+        """
+        with self._lock:
+            return _api().cursor_matches(self._cursor)
+
+    def flush_reminder(self) -> bytes:
+        """
+        Give up holding back the reminder: consume it masked as a whole, with one `*` per held byte up to the limit.
+
+        The cursor keeps its automaton state, so if the held bytes turn out to start a secret after all, the rest
+        of it is still masked when it arrives.
+
+        :return: The masked reminder, or empty bytes if there is no reminder.
+        """
+        with self._lock:
+            held = _api().consume_reminder(self._cursor)
+        return b"*" * min(len(held), self._limit)
 
-    def _get_reminder(self) -> bytes:
-        out_len = ctypes.c_size_t()
-        ptr = _lib.ss_get_reminder(self._automaton, ctypes.byref(out_len))
-        if not ptr:
-            return b""
-        return ctypes.string_at(ptr, out_len.value)
+    def checkpoint(self) -> bytes:
+        """
+        :return: The matching state of the stream (the automaton state, the overlap bookkeeping and the reminder)
+        with a fingerprint of the patterns, as a compact blob for `restore`.
+        """
+        with self._lock:
+            return _api().cursor_checkpoint(self._masker._automaton, self._cursor)
+
+    def restore(self, blob: bytes | bytearray | memoryview) -> None:
+        """
+        Replace the matching state of the stream with one saved by `checkpoint`.
+
+        :param blob: A blob returned by `checkpoint` of a wrapper over the same patterns.
+        """
+        with self._lock:
+            _api().cursor_restore(self._masker._automaton, self._cursor, blob)
 
 
 def mask(
@@ -206,6 +386,7 @@ def mask(
     /,
     *,
     limit: int = MAX_NUMBER_OF_STARS,
+    encodings: typing.Iterable[str] = (),
 ) -> bytes:
     """
     Masks the specific patterns in the input.
@@ -213,13 +394,134 @@ def mask(
     :param input: An input bytes, bytearray or memoryview.
     :param patterns: Any iterable of patterns that have to be masked with the `*` asterisk character.
     :param limit: The max number of consecutive stars.
+    :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+    are masked as well, e.g. `("base64", "json")` also masks a base64-encoded or JSON-escaped secret.
     :return: Returns the input string with masked patterns.
     """
-    if not isinstance(input, (bytes, bytearray, memoryview)):
-        help_note = ". You can use the StreamWrapper class for such purposes." if isinstance(input, io.BytesIO) else ""
-        raise TypeError(f"expected bytes, memoryview or bytearray, found {type(input)}{help_note}")
-    automaton = _build_automaton(patterns)
+    _check_input(input)
+    automaton = _build_automaton(patterns, encodings)
     try:
-        return _mask(automaton, bytes(input), limit, is_streaming=False)
+        return _mask(automaton, input, limit)
     finally:
-        _lib.ss_destroy(automaton)
+        _destroy_automaton(automaton)
+
+
+def mask_text(
+    input: str,
+    patterns: typing.Iterable[str],
+    /,
+    *,
+    limit: int = MAX_NUMBER_OF_STARS,
+    encodings: typing.Iterable[str] = (),
+) -> str:
+    """
+    Masks the specific patterns in a str.
+
+    Equivalent to `mask(input.encode(), [p.encode() for p in patterns]).decode()`, without the two copies and
+    the UTF-8 validation around the scan: the native code scans the UTF-8 form CPython keeps inside the str (for
+    ASCII text, its data as is) and builds the result str directly.
+
+    :param input: An input str.
+    :param patterns: Any iterable of str patterns that have to be masked with the `*` asterisk character.
+    :param limit: The max number of consecutive stars.
+    :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+    are masked as well.
+    :return: Returns the input str with masked patterns, or the input itself if nothing was masked.
+    """
+    _check_text(input)
+    automaton = _build_automaton(_text_patterns(patterns), encodings)
+    try:
+        return _mask_text(automaton, input, limit)
+    finally:
+        _destroy_automaton(automaton)
+
+
+def find_spans(
+    input: bytes | bytearray | memoryview,
+    patterns_or_masker: typing.Iterable[bytes] | Masker,
+    /,
+    *,
+    encodings: typing.Iterable[str] = (),
+) -> array.array:
+    """
+    Finds where the patterns occur in the input without masking it.
+
+    One native scan with the same matching as `mask`, without building any masked output.
+
+    :param input: An input bytes, bytearray or memoryview.
+    :param patterns_or_masker: Any iterable of patterns, or a `Masker` to reuse its compiled patterns.
+    :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+    are found as well, as `mask` with the same encodings masks them. Must be empty with a Masker, which has its
+    encodings compiled in.
+    :return: A flat `array.array("Q")` of `(start, end, pattern_id)` triples, one per match in the order the scan
+    meets them (by end position): `input[start:end]` is the matched pattern or an encoded form of it, and
+    `pattern_id` numbers the distinct non-empty patterns from 0 in the order they were given. At most one match is
+    reported per end position: the pattern spelled by the longest suffix of the input so far that starts some
+    pattern, if that suffix is a whole pattern. A pattern that ends at the same byte as a longer match is therefore
+    not reported on its own (`bc` in `xabc` with `abc` and `bc`), and neither is one that ends inside a longer
+    pattern's prefix the scan is still following (`bc` in `abcx` with `abcd` and `bc`, which `mask` leaves unmasked
+    as well). Other overlapping matches are reported individually (`ash` and `her` in `asher`); `mask` merges them
+    into one masked run.
+    """
+    if isinstance(patterns_or_masker, Masker):
+        if tuple(encodings):
+            raise ValueError("encodings are compiled into the Masker, pass them to Masker() instead")
+        return patterns_or_masker.find_spans(input)
+    _check_input(input)
+    automaton = _build_automaton(patterns_or_masker, encodings)
+    try:
+        return _find_spans(automaton, input)
+    finally:
+        _destroy_automaton(automaton)
+
+
+def first_match(
+    input: bytes | bytearray | memoryview,
+    patterns_or_masker: typing.Iterable[bytes] | Masker,
+    /,
+    *,
+    encodings: typing.Iterable[str] = (),
+) -> tuple[int, int, int] | None:
+    """
+    Finds the first pattern occurrence in the input.
+
+    The native scan stops at the first match and builds neither a span list nor masked output, so it is the
+    cheapest way to check a payload before deciding to mask, copy or quarantine it.
+
+    :param input: An input bytes, bytearray or memoryview.
+    :param patterns_or_masker: Any iterable of patterns, or a `Masker` to reuse its compiled patterns.
+    :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+    are found as well. Must be empty with a Masker, which has its encodings compiled in.
+    :return: The `(start, end, pattern_id)` triple of the match `find_spans` would report first, or None if no
+    pattern occurs in the input.
+    """
+    if isinstance(patterns_or_masker, Masker):
+        if tuple(encodings):
+            raise ValueError("encodings are compiled into the Masker, pass them to Masker() instead")
+        return patterns_or_masker.first_match(input)
+    _check_input(input)
+    automaton = _build_automaton(patterns_or_masker, encodings)
+    try:
+        return _first_match(automaton, input)
+    finally:
+        _destroy_automaton(automaton)
+
+
+def contains_secret(
+    input: bytes | bytearray | memoryview,
+    patterns_or_masker: typing.Iterable[bytes] | Masker,
+    /,
+    *,
+    encodings: typing.Iterable[str] = (),
+) -> bool:
+    """
+    Checks whether any pattern occurs in the input, stopping the scan at the first match. See `first_match`.
+
+    :param input: An input bytes, bytearray or memoryview.
+    :param patterns_or_masker: Any iterable of patterns, or a `Masker` to reuse its compiled patterns.
+    :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+    count as well, so this is True whenever `mask` with the same encodings would change the input. Must be empty
+    with a Masker, which has its encodings compiled in.
+    :return: True if the input contains any of the patterns.
+    """
+    return first_match(input, patterns_or_masker, encodings=encodings) is not None
@@ -0,0 +1,282 @@
+"""
+ctypes bindings for the Aho-Corasick automaton shared library written in Zig.
+
+A drop-in for the `secretsweeper._native` extension, with the same functions and signatures, for platforms where
+the extension is not built (e.g. Windows). `secretsweeper._core` imports it only when it is needed, so the common
+case never pays for importing ctypes and loading the library.
+"""
+
+import ctypes
+import pathlib
+import sys
+
+_LIBRARY_NAMES = {
+    "win32": ("secretsweeper.dll",),
+    "cygwin": ("secretsweeper.dll",),
+    "darwin": ("libsecretsweeper.dylib",),
+}
+
+
+def _load_library() -> ctypes.CDLL:
+    package_dir = pathlib.Path(__file__).parent
+    names = _LIBRARY_NAMES.get(sys.platform, ("libsecretsweeper.so",))
+    for name in names:
+        path = package_dir / name
+        if path.exists():
+            return ctypes.CDLL(str(path))
+    raise ImportError(f"cannot find the secretsweeper shared library in {package_dir}")
+
+
+_lib = _load_library()
+
+_lib.ss_new.argtypes = ()
+_lib.ss_new.restype = ctypes.c_void_p
+_lib.ss_destroy.argtypes = (ctypes.c_void_p,)
+_lib.ss_destroy.restype = None
+_lib.ss_insert.argtypes = (ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t)
+_lib.ss_insert.restype = ctypes.c_int32
+_lib.ss_insert_encoded.argtypes = (ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t, ctypes.c_uint32)
+_lib.ss_insert_encoded.restype = ctypes.c_int32
+_lib.ss_build.argtypes = (ctypes.c_void_p,)
+_lib.ss_build.restype = ctypes.c_int32
+_lib.ss_uses_dfa.argtypes = (ctypes.c_void_p,)
+_lib.ss_uses_dfa.restype = ctypes.c_int32
+_lib.ss_build_fallback.argtypes = (ctypes.c_void_p,)
+_lib.ss_build_fallback.restype = ctypes.c_int32
+_lib.ss_build_sharded.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int32)
+_lib.ss_build_sharded.restype = ctypes.c_int32
+_lib.ss_mask.argtypes = (
+    ctypes.c_void_p,
+    ctypes.c_void_p,
+    ctypes.c_char_p,
+    ctypes.c_size_t,
+    ctypes.c_uint64,
+    ctypes.POINTER(ctypes.c_void_p),
+    ctypes.POINTER(ctypes.c_size_t),
+)
+_lib.ss_mask.restype = ctypes.c_int32
+_lib.ss_find_spans.argtypes = (
+    ctypes.c_void_p,
+    ctypes.c_char_p,
+    ctypes.c_size_t,
+    ctypes.POINTER(ctypes.c_void_p),
+    ctypes.POINTER(ctypes.c_size_t),
+)
+_lib.ss_find_spans.restype = ctypes.c_int32
+_lib.ss_first_match.argtypes = (ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_uint64))
+_lib.ss_first_match.restype = ctypes.c_int32
+_lib.ss_free_spans.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+_lib.ss_free_spans.restype = None
+_lib.ss_free.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+_lib.ss_free.restype = None
+_lib.ss_cursor_new.argtypes = ()
+_lib.ss_cursor_new.restype = ctypes.c_void_p
+_lib.ss_cursor_destroy.argtypes = (ctypes.c_void_p,)
+_lib.ss_cursor_destroy.restype = None
+_lib.ss_get_reminder.argtypes = (ctypes.c_void_p, ctypes.POINTER(ctypes.c_size_t))
+_lib.ss_get_reminder.restype = ctypes.c_void_p
+_lib.ss_reset_reminder.argtypes = (ctypes.c_void_p,)
+_lib.ss_reset_reminder.restype = None
+_lib.ss_cursor_matches.argtypes = (ctypes.c_void_p,)
+_lib.ss_cursor_matches.restype = ctypes.c_uint64
+_lib.ss_cursor_checkpoint.argtypes = (
+    ctypes.c_void_p,
+    ctypes.c_void_p,
+    ctypes.POINTER(ctypes.c_void_p),
+    ctypes.POINTER(ctypes.c_size_t),
+)
+_lib.ss_cursor_checkpoint.restype = ctypes.c_int32
+_lib.ss_cursor_restore.argtypes = (ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t)
+_lib.ss_cursor_restore.restype = ctypes.c_int32
+_lib.ss_trace_enable.argtypes = (ctypes.c_int32,)
+_lib.ss_trace_enable.restype = None
+_lib.ss_trace_snapshot.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+_lib.ss_trace_snapshot.restype = ctypes.c_size_t
+_lib.ss_trace_reset.argtypes = ()
+_lib.ss_trace_reset.restype = None
+
+_SPAN_SIZE = 3 * 8
+"""The size of one `Aho.Span` (three u64s) in the buffers returned by `ss_find_spans`."""
+
+
+def new() -> int:
+    """Create an empty automaton. Returns the handle."""
+    automaton = _lib.ss_new()
+    if not automaton:
+        raise MemoryError("failed to create the automaton")
+    return automaton
+
+
+def destroy(handle: int) -> None:
+    """Destroy an automaton."""
+    _lib.ss_destroy(handle)
+
+
+def insert(handle: int, pattern: bytes, encodings: int) -> None:
+    """Insert a pattern and its variants for the `Encodings` bit set."""
+    if encodings:
+        status = _lib.ss_insert_encoded(handle, pattern, len(pattern), encodings)
+    else:
+        status = _lib.ss_insert(handle, pattern, len(pattern))
+    if status != 0:
+        raise MemoryError("failed to insert a pattern")
+
+
+def build(handle: int, fallback: bool) -> None:
+    """Build the automaton after all inserts; `fallback` forces the goto/fail-link build."""
+    if (_lib.ss_build_fallback if fallback else _lib.ss_build)(handle) != 0:
+        raise MemoryError("failed to build the automaton")
+
+
+def build_sharded(handle: int, fallback: bool, shards: int) -> None:
+    """Build the automaton split into up to `shards` automatons; `fallback` forces the goto/fail-link build."""
+    if _lib.ss_build_sharded(handle, shards, fallback) != 0:
+        raise MemoryError("failed to build the automaton")
+
+
+def uses_dfa(handle: int) -> bool:
+    """Whether `build` chose the DFA over the goto/fail-link walk."""
+    return _lib.ss_uses_dfa(handle) == 1
+
+
+def cursor_new() -> int:
+    """Create a streaming cursor. Returns the handle."""
+    cursor = _lib.ss_cursor_new()
+    if not cursor:
+        raise MemoryError("failed to create the cursor")
+    return cursor
+
+
+def cursor_destroy(cursor: int) -> None:
+    """Destroy a cursor."""
+    _lib.ss_cursor_destroy(cursor)
+
+
+def _mask(handle: int, cursor: int | None, data: bytes | bytearray | memoryview, limit: int) -> bytes:
+    out_ptr = ctypes.c_void_p()
+    out_len = ctypes.c_size_t()
+    text = bytes(data)
+    status = _lib.ss_mask(handle, cursor, text, len(text), limit, ctypes.byref(out_ptr), ctypes.byref(out_len))
+    if status != 0:
+        raise MemoryError("failed to mask the input")
+    ptr = out_ptr.value
+    if not ptr:
+        return b""
+    try:
+        return ctypes.string_at(ptr, out_len.value)
+    finally:
+        _lib.ss_free(ptr, out_len.value)
+
+
+def mask(handle: int, data: bytes | bytearray | memoryview, limit: int) -> bytes:
+    """Mask all patterns in the whole input."""
+    return _mask(handle, None, data, limit)
+
+
+def mask_text(handle: int, text: str, limit: int) -> str:
+    """Mask all patterns in the UTF-8 form of the text. Returns `text` itself when nothing was masked."""
+    data = text.encode()
+    masked = _mask(handle, None, data, limit)
+    return text if masked == data else masked.decode()
+
+
+def masking_read(handle: int, cursor: int, data: bytes | bytearray | memoryview, limit: int) -> bytes:
+    """Mask the next chunk of the cursor's stream, holding back a possible partial match as the reminder."""
+    return _mask(handle, cursor, data, limit)
+
+
+def masking_read_lines(handle: int, cursor: int, data: bytes | bytearray | memoryview, limit: int) -> list[bytes]:
+    """`masking_read`, with the output split after every newline; the last item is the unterminated rest."""
+    *lines, rest = masking_read(handle, cursor, data, limit).split(b"\n")
+    return [line + b"\n" for line in lines] + [rest]
+
+
+def get_reminder(cursor: int) -> bytes:
+    """Get a copy of the cursor's streaming-mode reminder."""
+    out_len = ctypes.c_size_t()
+    ptr = _lib.ss_get_reminder(cursor, ctypes.byref(out_len))
+    if not ptr:
+        return b""
+    return ctypes.string_at(ptr, out_len.value)
+
+
+def consume_reminder(cursor: int) -> bytes:
+    """Get a copy of the cursor's streaming-mode reminder, then reset it."""
+    try:
+        return get_reminder(cursor)
+    finally:
+        _lib.ss_reset_reminder(cursor)
+
+
+def cursor_matches(cursor: int) -> int:
+    """The number of matches masked on the cursor's stream since it was created."""
+    return _lib.ss_cursor_matches(cursor)
+
+
+def cursor_checkpoint(handle: int, cursor: int) -> bytes:
+    """The cursor's stream state over the automaton as a blob."""
+    out_ptr = ctypes.c_void_p()
+    out_len = ctypes.c_size_t()
+    if _lib.ss_cursor_checkpoint(handle, cursor, ctypes.byref(out_ptr), ctypes.byref(out_len)) != 0:
+        raise MemoryError("failed to checkpoint the cursor")
+    ptr = out_ptr.value
+    if not ptr:
+        return b""
+    try:
+        return ctypes.string_at(ptr, out_len.value)
+    finally:
+        _lib.ss_free(ptr, out_len.value)
+
+
+def cursor_restore(handle: int, cursor: int, blob: bytes | bytearray | memoryview) -> None:
+    """Replace the cursor's stream state with a `cursor_checkpoint` blob."""
+    data = bytes(blob)
+    status = _lib.ss_cursor_restore(handle, cursor, data, len(data))
+    if status == 1:
+        raise ValueError("invalid checkpoint")
+    if status == 2:
+        raise ValueError("the checkpoint was taken over different patterns")
+    if status != 0:
+        raise MemoryError("failed to restore the cursor")
+
+
+def find_spans(handle: int, data: bytes | bytearray | memoryview) -> bytes:
+    """Find all match spans, as native-endian u64 (start, end, pattern id) triples."""
+    out_ptr = ctypes.c_void_p()
+    out_count = ctypes.c_size_t()
+    text = bytes(data)
+    if _lib.ss_find_spans(handle, text, len(text), ctypes.byref(out_ptr), ctypes.byref(out_count)) != 0:
+        raise MemoryError("failed to find the spans")
+    ptr = out_ptr.value
+    if not ptr:
+        return b""
+    try:
+        return ctypes.string_at(ptr, out_count.value * _SPAN_SIZE)
+    finally:
+        _lib.ss_free_spans(ptr, out_count.value)
+
+
+def first_match(handle: int, data: bytes | bytearray | memoryview) -> tuple[int, int, int] | None:
+    """Find the first match, stopping the scan there."""
+    span = (ctypes.c_uint64 * 3)()
+    text = bytes(data)
+    if _lib.ss_first_match(handle, text, len(text), span) == 0:
+        return None
+    return span[0], span[1], span[2]
+
+
+def trace_enable(on: bool) -> None:
+    """Turn the latency histograms on or off."""
+    _lib.ss_trace_enable(1 if on else 0)
+
+
+def trace_snapshot() -> bytes:
+    """The latency histograms as native-endian u64s."""
+    words = (ctypes.c_uint64 * _lib.ss_trace_snapshot(None, 0))()
+    _lib.ss_trace_snapshot(words, len(words))
+    return bytes(words)
+
+
+def trace_reset() -> None:
+    """Zero the latency histograms."""
+    _lib.ss_trace_reset()
@@ -0,0 +1,224 @@
+"""Masking a growing file as it is appended to, like `tail -F`."""
+
+import math
+import os
+import select
+import sys
+import time
+import typing
+
+from ._core import Masker, _StreamWrapper
+
+FOLLOW_BLOCK_SIZE = 1 << 20
+"""The most bytes `follow` reads and masks at a time."""
+
+FOLLOW_POLL_INTERVAL = 0.25
+"""The default number of seconds `follow` sleeps between checks of the file where inotify is not available."""
+
+# From <sys/inotify.h>.
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+_EVENT_HEADER_SIZE = 16  # struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+_EVENTS_READ_SIZE = 1 << 16
+
+
+class _Inotify:
+    """
+    Wakes on changes to one file through an inotify watch on its directory: appends and truncation, and the
+    file being renamed, deleted or created again, which a watch on the file itself would lose track of.
+    """
+
+    def __init__(self, path: str):
+        import ctypes  # imported here to keep `import secretsweeper` lean
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._name = os.fsencode(os.path.basename(path))
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        mask = _IN_MODIFY | _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+        if libc.inotify_add_watch(self._fd, os.fsencode(os.path.dirname(path) or "."), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, os.strerror(errno))
+        self._poll = select.poll()
+        self._poll.register(self._fd, select.POLLIN)
+
+    def wait(self, timeout: float | None) -> None:
+        """Wait until the file may have changed, or up to `timeout` seconds."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else math.ceil(max(0.0, deadline - time.monotonic()) * 1000)
+            if not self._poll.poll(remaining) or self._drain_events():
+                return
+
+    def _drain_events(self) -> bool:
+        """Read the pending events. Returns whether any of them concerns the file or the whole directory."""
+        relevant = False
+        while True:
+            try:
+                events = os.read(self._fd, _EVENTS_READ_SIZE)
+            except BlockingIOError:
+                return relevant
+            pos = 0
+            while pos < len(events):
+                name_len = int.from_bytes(events[pos + 12 : pos + 16], sys.byteorder)
+                name = events[pos + _EVENT_HEADER_SIZE : pos + _EVENT_HEADER_SIZE + name_len].rstrip(b"\0")
+                # Events without a name (queue overflow, the directory itself going away) may hide ours.
+                relevant = relevant or not name or name == self._name
+                pos += _EVENT_HEADER_SIZE + name_len
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _Poller:
+    """Sleeps `poll_interval` between checks of the file, where inotify is not available or not wanted."""
+
+    def __init__(self, poll_interval: float):
+        self._poll_interval = poll_interval
+
+    def wait(self, timeout: float | None) -> None:
+        time.sleep(self._poll_interval if timeout is None else min(timeout, self._poll_interval))
+
+    def close(self) -> None:
+        pass
+
+
+def _watch(path: str, use_inotify: bool, poll_interval: float) -> _Inotify | _Poller:
+    if use_inotify and sys.platform == "linux":
+        try:
+            return _Inotify(path)
+        except (OSError, AttributeError):
+            # No inotify in this libc, or out of instances or watches (fs.inotify.max_user_*): poll instead.
+            pass
+    return _Poller(poll_interval)
+
+
+def _stat(path: str) -> os.stat_result | None:
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def follow(
+    path: str | os.PathLike[str],
+    patterns: typing.Iterable[bytes] | Masker,
+    /,
+    *,
+    limit: int | None = None,
+    encodings: typing.Iterable[str] = (),
+    block_size: int = FOLLOW_BLOCK_SIZE,
+    from_end: bool = False,
+    max_hold: float | None = None,
+    idle_timeout: float | None = None,
+    use_inotify: bool = True,
+    poll_interval: float = FOLLOW_POLL_INTERVAL,
+) -> typing.Iterator[bytes]:
+    """
+    Yields the masked contents of a file as it grows, following it across rotation and truncation like `tail -F`.
+
+    Everything in the file is read and masked in blocks of up to `block_size` bytes; at its end, this waits for
+    more to be appended. On Linux it sleeps on an inotify watch of the file's directory and wakes only when the
+    file changes; elsewhere, or where inotify is out of watches, it checks the file every `poll_interval`
+    seconds. The masking state is kept between appends, so a secret split across two writes is still masked and
+    nothing is scanned twice. When the path is renamed away and created again (log rotation), the rest of the
+    old file is masked first and the new one is followed from its start; when the file shrinks (`copytruncate`),
+    it is followed from its start again. Either way, what was held back as a possible partial secret is emitted
+    as is, since the input it would have to continue in is gone.
+
+    :param path: The file to follow. It must exist when the iteration starts; after rotation, this waits for it
+    to be created again.
+    :param patterns: Any iterable of patterns that have to be masked with the `*` asterisk character, or a
+    `Masker` to share its compiled patterns.
+    :param limit: The max number of consecutive stars. Defaults to the Masker's limit, or `MAX_NUMBER_OF_STARS`.
+    :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+    are masked as well. Must be empty with a Masker, which has its encodings compiled in.
+    :param block_size: The most bytes read from the file and masked at a time.
+    :param from_end: Start at the end of the file as the iteration starts, masking only what is appended later.
+    :param max_hold: The max number of seconds to hold back the start of a possible secret while nothing is
+    appended, as with `StreamWrapper`: the held bytes are then emitted masked as a whole. Defaults to holding
+    until more is appended or the file is rotated or truncated.
+    :param idle_timeout: Stop after this many seconds without anything appended. Defaults to following the file
+    until the iteration is stopped, e.g. by closing the iterator.
+    :param use_inotify: Set False to always poll, e.g. for a file written from another machine over a network
+    file system, whose writes inotify does not see.
+    :param poll_interval: The number of seconds between checks of the file when polling.
+    :return: An iterator over chunks of the masked output. Joined together, they are the masked file.
+    """
+    if block_size <= 0:
+        raise ValueError("block_size must be positive")
+    if poll_interval <= 0:
+        raise ValueError("poll_interval must be positive")
+    if max_hold is not None and max_hold < 0:
+        raise ValueError("max_hold must be non-negative")
+    if idle_timeout is not None and idle_timeout < 0:
+        raise ValueError("idle_timeout must be non-negative")
+    path = os.fspath(path)
+    wrapper = _StreamWrapper(patterns, limit=limit, encodings=encodings)
+    masker = wrapper._masker
+    watcher = _watch(path, use_inotify, poll_interval)
+    try:
+        file = open(path, "rb", buffering=0)
+    except BaseException:
+        watcher.close()
+        raise
+    try:
+        if from_end:
+            file.seek(0, os.SEEK_END)
+        last_input = time.monotonic()
+        held_since: float | None = None
+        while True:
+            # Taken before reading to the end, so a rotation found here can only have happened after what was read.
+            stat = _stat(path)
+            read_any = False
+            while block := file.read(block_size):
+                read_any = True
+                if masked := wrapper.masking_read(block):
+                    yield masked
+            now = time.monotonic()
+            if read_any:
+                last_input = now
+                held_since = (held_since or now) if wrapper.get_reminder() else None
+            restart = None
+            if stat is not None and not os.path.samestat(stat, os.fstat(file.fileno())):
+                try:
+                    restart = open(path, "rb", buffering=0)
+                except FileNotFoundError:
+                    pass  # Rotated again already; the next check picks up the newest file.
+            elif os.fstat(file.fileno()).st_size < file.tell():
+                file.seek(0)
+                restart = file
+            if restart is not None:
+                if restart is not file:
+                    file.close()
+                    file = restart
+                held = wrapper.consume_reminder()
+                wrapper = _StreamWrapper(masker, limit=limit)
+                held_since = None
+                if held:
+                    yield held
+                continue
+            if held_since is not None and max_hold is not None and now - held_since >= max_hold:
+                held_since = None
+                if masked := wrapper.flush_reminder():
+                    yield masked
+            if idle_timeout is not None and now - last_input >= idle_timeout:
+                break
+            deadlines = [last_input + idle_timeout] if idle_timeout is not None else []
+            if held_since is not None and max_hold is not None:
+                deadlines.append(held_since + max_hold)
+            watcher.wait(max(0.0, min(deadlines) - now) if deadlines else None)
+        if held := wrapper.consume_reminder():
+            yield held
+    finally:
+        file.close()
+        watcher.close()
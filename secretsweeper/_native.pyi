@@ -1,3 +1,26 @@
 """Type stubs for the `secretsweeper._native` CPython extension (src/python.zig)."""
 
-def masking_read(handle: int, data: bytes, limit: int) -> bytes: ...
+from typing_extensions import Buffer
+
+def new() -> int: ...
+def destroy(handle: int) -> None: ...
+def insert(handle: int, pattern: bytes, encodings: int) -> None: ...
+def build(handle: int, fallback: bool) -> None: ...
+def build_sharded(handle: int, fallback: bool, shards: int) -> None: ...
+def uses_dfa(handle: int) -> bool: ...
+def cursor_new() -> int: ...
+def cursor_destroy(cursor: int) -> None: ...
+def mask(handle: int, data: Buffer, limit: int) -> bytes: ...
+def mask_text(handle: int, text: str, limit: int) -> str: ...
+def masking_read(handle: int, cursor: int, data: Buffer, limit: int) -> bytes: ...
+def masking_read_lines(handle: int, cursor: int, data: Buffer, limit: int) -> list[bytes]: ...
+def get_reminder(cursor: int) -> bytes: ...
+def consume_reminder(cursor: int) -> bytes: ...
+def cursor_matches(cursor: int) -> int: ...
+def cursor_checkpoint(handle: int, cursor: int) -> bytes: ...
+def cursor_restore(handle: int, cursor: int, blob: Buffer) -> None: ...
+def find_spans(handle: int, data: Buffer) -> bytes: ...
+def first_match(handle: int, data: Buffer) -> tuple[int, int, int] | None: ...
+def trace_enable(on: bool) -> None: ...
+def trace_snapshot() -> bytes: ...
+def trace_reset() -> None: ...
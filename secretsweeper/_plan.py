@@ -0,0 +1,243 @@
+"""Streaming extraction of the sensitive values in OpenTofu/Terraform plan JSON."""
+
+import codecs
+import itertools
+import json
+import re
+import typing
+
+PLAN_BLOCK_SIZE = 1 << 20
+"""The number of bytes `patterns_from_plan` reads from the stream at a time."""
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*+")
+_STRING = re.compile(r'"(?:[^"\\]++|\\.)*+"')
+# Everything before a string that does not end within the buffer yet.
+_COMPLETE = re.compile(r'(?:[^"]++|"(?:[^"\\]++|\\.)*+")*+')
+_NON_BRACKETS = re.compile(r"[^\[\]{}]++")
+# Everything up to the next bracket outside a string.
+_RUN = re.compile(r'(?:[^"\[\]{}]++|"(?:[^"\\]++|\\.)*+")*+')
+_DEPTH_CHANGE = {"{": 1, "[": 1, "}": -1, "]": -1}
+
+
+def _match_end(pattern: re.Pattern[str], text: str, pos: int) -> int:
+    """The end of the match at `pos` of a pattern that matches anywhere, if only the empty string."""
+    match = pattern.match(text, pos)
+    assert match is not None
+    return match.end()
+
+
+class _JsonReader:
+    """Pulls the values of a JSON document from a binary stream, buffering only the value at hand."""
+
+    def __init__(self, stream: typing.IO[bytes], block_size: int):
+        self._stream = stream
+        self._block_size = block_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, keep_from: int) -> int:
+        """
+        Read the next block, dropping the buffer before `keep_from`. Returns the shift of the offsets.
+
+        The block is at least as long as what is kept, so the buffer doubles while one value stays incomplete:
+        the callers scan it again from the value's start after every fill, which then costs a few passes over
+        the value in total instead of one per block.
+        """
+        if self._eof:
+            raise ValueError("invalid plan JSON: unexpected end of input")
+        block = self._stream.read(max(self._block_size, len(self._buf) - keep_from))
+        if not isinstance(block, bytes):
+            raise TypeError(f"expected a binary stream, read {type(block)}")
+        self._eof = not block
+        self._buf = self._buf[keep_from:] + self._decoder.decode(block, final=self._eof)
+        self._pos = max(self._pos - keep_from, 0)
+        return keep_from
+
+    def _peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it."""
+        while True:
+            self._pos = _match_end(_WHITESPACE, self._buf, self._pos)
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            self._fill(self._pos)
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            context = self._buf[self._pos : self._pos + 20]
+            raise ValueError(f"invalid plan JSON: expected {char!r} at {context!r}")
+        self._pos += 1
+
+    def read_value(self) -> object:
+        """Decode the value at the read position, keeping it buffered until it is complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as error:
+                if self._eof:
+                    raise ValueError(f"invalid plan JSON: {error}") from None
+            else:
+                # A number may go on in the next block; every other value ends with a delimiter.
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            self._fill(self._pos)
+
+    def skip_value(self) -> None:
+        """
+        Move the read position past the value there without decoding it, dropping what it scans past: block by
+        block, the regex engine strips out the strings and the bracket nesting is tracked in C, so a skipped
+        subtree costs a few passes over its bytes and Python-level steps only in the block where it ends.
+        """
+        if self._peek() not in "[{":
+            self.read_value()
+            return
+        i = self._pos + 1
+        depth = 1
+        while True:
+            complete = _match_end(_COMPLETE, self._buf, i)
+            brackets = _NON_BRACKETS.sub("", _STRING.sub("", self._buf[i:complete]))
+            nesting = list(itertools.accumulate(map(_DEPTH_CHANGE.__getitem__, brackets), initial=depth))
+            if 0 in nesting:
+                for _ in range(nesting.index(0)):
+                    i = _match_end(_RUN, self._buf, i) + 1
+                self._pos = i
+                return
+            depth = nesting[-1]
+            i = complete - self._fill(complete)
+
+    def _next_item(self, close: str) -> bool:
+        """After an item of an object or array, consume the comma before the next one or the closing bracket."""
+        if self._peek() == close:
+            self._pos += 1
+            return False
+        self._expect(",")
+        return True
+
+    def keys(self) -> typing.Iterator[str]:
+        """Read an object, yielding each key with the read position at its value, which the caller consumes."""
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self._peek() != '"':
+                raise ValueError("invalid plan JSON: expected an object key")
+            key = self.read_value()
+            self._expect(":")
+            yield typing.cast(str, key)
+            if not self._next_item("}"):
+                return
+
+    def items(self) -> typing.Iterator[None]:
+        """Read an array, yielding with the read position at each item, which the caller consumes."""
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield
+            if not self._next_item("]"):
+                return
+
+
+def _leaves(value: typing.Any) -> typing.Iterator[bytes]:
+    """The strings and numbers in a value, as they appear in rendered plan output."""
+    if isinstance(value, str):
+        yield value.encode("utf-8", "surrogatepass")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield json.dumps(value).encode()
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _leaves(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _leaves(item)
+
+
+def _sensitive(value: typing.Any, marker: typing.Any) -> typing.Iterator[bytes]:
+    """The leaves of `value` that `marker`, shaped like it (the plan's `*_sensitive` convention), marks true."""
+    if marker is True:
+        yield from _leaves(value)
+    elif isinstance(marker, dict) and isinstance(value, dict):
+        for key, sub_marker in marker.items():
+            if key in value:
+                yield from _sensitive(value[key], sub_marker)
+    elif isinstance(marker, list) and isinstance(value, list):
+        for item, sub_marker in zip(value, marker):
+            yield from _sensitive(item, sub_marker)
+
+
+def _change_values(change: object) -> typing.Iterator[bytes]:
+    """The sensitive values on either side of a resource or output change."""
+    if isinstance(change, dict):
+        yield from _sensitive(change.get("before"), change.get("before_sensitive"))
+        yield from _sensitive(change.get("after"), change.get("after_sensitive"))
+
+
+def _plan_values(reader: _JsonReader) -> typing.Iterator[bytes]:
+    variables: dict[str, object] = {}
+    sensitive_variables: set[str] = set()
+    for key in reader.keys():
+        if key == "variables":
+            for name in reader.keys():
+                variable = reader.read_value()
+                if isinstance(variable, dict):
+                    variables[name] = variable.get("value")
+                    if variable.get("sensitive"):
+                        sensitive_variables.add(name)
+        elif key == "resource_changes":
+            for _ in reader.items():
+                resource_change = reader.read_value()
+                if isinstance(resource_change, dict):
+                    yield from _change_values(resource_change.get("change"))
+        elif key == "output_changes":
+            for _ in reader.keys():
+                yield from _change_values(reader.read_value())
+        elif key == "configuration":
+            # Plans mark variables sensitive in the root module's configuration, not next to their values.
+            for section in reader.keys():
+                if section != "root_module":
+                    reader.skip_value()
+                    continue
+                for module_key in reader.keys():
+                    if module_key != "variables":
+                        reader.skip_value()
+                        continue
+                    for name in reader.keys():
+                        config = reader.read_value()
+                        if isinstance(config, dict) and config.get("sensitive"):
+                            sensitive_variables.add(name)
+        else:
+            reader.skip_value()
+    for name in sensitive_variables:
+        if name in variables:
+            yield from _leaves(variables[name])
+
+
+def patterns_from_plan(stream: typing.IO[bytes], /, *, block_size: int = PLAN_BLOCK_SIZE) -> typing.Iterator[bytes]:
+    """
+    Yields the values an OpenTofu/Terraform plan marks sensitive, read incrementally from its JSON form.
+
+    Reads the output of `tofu show -json` (or `terraform show -json`) block by block: the root module's
+    sensitive variables, and the values that `before_sensitive`/`after_sensitive` mark in `resource_changes` and
+    `output_changes`, nested in maps, lists and objects included. Every other part of the plan (planned values,
+    prior state, the rest of the configuration) is skipped without being decoded, so memory stays bounded by the
+    largest single resource change rather than the plan. Feed the result straight into `Masker` to compile the
+    patterns as the plan is read.
+
+    :param stream: A binary stream of the plan JSON, e.g. `Popen(["tofu", "show", "-json", "tfplan"], ...).stdout`.
+    :param block_size: The number of bytes read from the stream at a time.
+    :return: An iterator over the distinct sensitive strings and numbers (as they are rendered), each as UTF-8
+    bytes, in the order they are found. Sensitive variables come last.
+    """
+    if block_size < 1:
+        raise ValueError("block_size must be positive")
+    seen = set()
+    for value in _plan_values(_JsonReader(stream, block_size)):
+        if value and value not in seen:
+            seen.add(value)
+            yield value
@@ -0,0 +1,190 @@
+"""Masking whole directory trees with a pool of worker processes."""
+
+import mmap
+import os
+import sys
+import typing
+
+from ._core import MAX_NUMBER_OF_STARS, Masker, _StreamWrapper
+
+SWEEP_BLOCK_SIZE = 1 << 20
+"""The number of bytes `sweep_tree` reads and masks at a time."""
+
+BINARY_SNIFF_SIZE = 8000
+"""A file with a NUL byte within this many leading bytes is binary, the same heuristic git uses."""
+
+_TMP_SUFFIX = ".secretsweeper-tmp"
+
+
+class _Sweeper:
+    """Masks the files of one tree; one instance per worker process, sharing the worker's `Masker`."""
+
+    def __init__(self, masker: Masker, root: str, out_dir: str | None, inplace: bool, skip_binary: bool):
+        self._masker = masker
+        self._root = root
+        self._out_dir = out_dir
+        self._inplace = inplace
+        self._skip_binary = skip_binary
+
+    def __call__(self, rel: str) -> tuple[str, int | None]:
+        """Sweep the file at `rel`, relative to the root. Returns `rel` and its match count, None if skipped."""
+        src = os.path.join(self._root, rel)
+        with open(src, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                found = False
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    if self._skip_binary and mapped.find(b"\0", 0, BINARY_SNIFF_SIZE) != -1:
+                        return rel, None
+                    # A scan that stops at the first match decides whether the file needs masking at all.
+                    found = self._masker.first_match(view) is not None
+                    if found and self._out_dir is None and not self._inplace:
+                        return rel, self._count_matches(view)
+        matches = 0
+        if self._out_dir is not None:
+            dst = os.path.join(self._out_dir, rel)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if found:
+                matches = self._write_masked(src, dst)
+            else:
+                import shutil  # imported here to keep `import secretsweeper` lean
+
+                shutil.copyfile(src, dst)
+                shutil.copymode(src, dst)
+        elif self._inplace and found:
+            matches = self._write_masked(src, src)
+        return rel, matches
+
+    def _count_matches(self, view: memoryview) -> int:
+        """Mask `view` in blocks, discarding the output, for the number of matches the masking meets."""
+        wrapper = _StreamWrapper(self._masker)
+        for start in range(0, len(view), SWEEP_BLOCK_SIZE):
+            wrapper.masking_read(view[start : start + SWEEP_BLOCK_SIZE])
+        return wrapper.match_count()
+
+    def _write_masked(self, src: str, dst: str) -> int:
+        """
+        Stream `src` masked into `dst` through a temporary file next to it, replacing `dst` at the end. Returns the
+        number of matches masked.
+        """
+        import shutil
+
+        tmp = f"{dst}.{os.getpid()}{_TMP_SUFFIX}"
+        wrapper = _StreamWrapper(self._masker)
+        try:
+            with open(src, "rb") as reader, open(tmp, "wb") as writer:
+                while block := reader.read(SWEEP_BLOCK_SIZE):
+                    writer.write(wrapper.masking_read(block))
+                writer.write(wrapper.consume_reminder())
+            shutil.copymode(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return wrapper.match_count()
+
+
+_worker_sweeper: _Sweeper | None = None
+"""The sweeper of a pool worker process, set by `_init_worker`."""
+
+
+def _init_worker(
+    masker: Masker | None,
+    patterns: tuple[bytes, ...],
+    limit: int,
+    encodings: tuple[str, ...],
+    *options: typing.Any,
+) -> None:
+    """Set up a pool worker: reuse the parent's `Masker` if it was forked, build the patterns otherwise."""
+    global _worker_sweeper
+    if masker is None:
+        masker = Masker(patterns, limit=limit, encodings=encodings)
+    _worker_sweeper = _Sweeper(masker, *options)
+
+
+def _sweep_in_worker(rel: str) -> tuple[str, int | None]:
+    assert _worker_sweeper is not None
+    return _worker_sweeper(rel)
+
+
+def _list_files(root: str, skip: str | None) -> list[str]:
+    """The regular files under `root`, relative to it and sorted, not following symlinks and leaving out `skip`."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if skip is not None:
+            dirnames[:] = [d for d in dirnames if os.path.realpath(os.path.join(dirpath, d)) != skip]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if not name.endswith(_TMP_SUFFIX) and os.path.isfile(path) and not os.path.islink(path):
+                files.append(os.path.relpath(path, root))
+    files.sort()
+    return files
+
+
+def sweep_tree(
+    root: str | os.PathLike[str],
+    patterns: typing.Iterable[bytes],
+    /,
+    *,
+    workers: int | None = None,
+    inplace: bool = False,
+    out_dir: str | os.PathLike[str] | None = None,
+    limit: int = MAX_NUMBER_OF_STARS,
+    encodings: typing.Iterable[str] = (),
+    skip_binary: bool = True,
+) -> dict[str, int | None]:
+    """
+    Masks the patterns in every file under a directory, in parallel worker processes.
+
+    The patterns are compiled once: on Linux the workers are forked and share the parent's automaton, elsewhere
+    each worker builds its own copy when it starts. Each file is scanned up to its first match to decide whether it
+    needs masking; files without any are left alone (or copied to `out_dir` as they are), and the others are
+    streamed through the masking in `SWEEP_BLOCK_SIZE` blocks, which counts their matches, so memory stays flat in
+    the file size. Symlinks are not followed.
+
+    :param root: The directory to sweep.
+    :param patterns: Any iterable of patterns that have to be masked with the `*` asterisk character.
+    :param workers: The number of worker processes. Defaults to the number of CPUs; 1 sweeps in this process.
+    :param inplace: Rewrite the files that contain secrets in place, each replaced atomically once it is masked.
+    :param out_dir: Write the masked tree here instead, with the same layout. Skipped binary files are not copied.
+    Without `inplace` or `out_dir`, only the match counts are reported.
+    :param limit: The max number of consecutive stars.
+    :param encodings: Names of encodings (`base64`, `base64url`, `url`, `json`) whose forms of the patterns
+    are masked as well.
+    :param skip_binary: Skip files with a NUL byte in their first `BINARY_SNIFF_SIZE` bytes.
+    :return: The path of every file relative to `root`, mapped to the number of pattern occurrences in it (as
+    many as `find_spans` reports over the whole file), or None for a skipped binary file.
+    """
+    if inplace and out_dir is not None:
+        raise ValueError("inplace and out_dir are mutually exclusive")
+    if workers is not None and workers < 1:
+        raise ValueError("workers must be positive")
+    root = os.fspath(root)
+    if not os.path.isdir(root):
+        raise NotADirectoryError(f"not a directory: {root!r}")
+    out = None if out_dir is None else os.path.abspath(out_dir)
+    patterns = tuple(patterns)
+    encodings = tuple(encodings)
+    masker = Masker(patterns, limit=limit, encodings=encodings)
+    files = _list_files(root, None if out is None else os.path.realpath(out))
+    options = (root, out, inplace, skip_binary)
+
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers <= 1:
+        return dict(map(_Sweeper(masker, *options), files))
+
+    import concurrent.futures
+    import multiprocessing
+
+    if sys.platform == "linux":
+        # Forked workers inherit the built automaton; the initializer arguments are not pickled.
+        context = multiprocessing.get_context("fork")
+        initargs = (masker, (), limit, (), *options)
+    else:
+        context = multiprocessing.get_context("spawn")
+        initargs = (None, patterns, limit, encodings, *options)
+    with concurrent.futures.ProcessPoolExecutor(workers, context, _init_worker, initargs) as pool:
+        return dict(pool.map(_sweep_in_worker, files, chunksize=max(1, min(64, len(files) // (4 * workers)))))
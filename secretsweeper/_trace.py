@@ -0,0 +1,64 @@
+"""Opt-in latency histograms of the native build and masking phases (src/trace.zig)."""
+
+import array
+import math
+
+from ._core import _api, _is_env_flag_set
+
+_TRACE_ENV = "SECRET_SWEEPER_TRACE"
+"""
+Setting the `SECRET_SWEEPER_TRACE` environment variable to a truthy value (`1`/`true`) turns tracing on when
+`secretsweeper` is imported, like `enable_tracing()`.
+"""
+
+TRACE_PHASES = ("build", "search", "reconstruct", "reminder")
+"""The traced phases, in the order of the `Phase` enum in src/trace.zig."""
+
+_BUCKET_BASE_NS = 1024
+"""`trace.BUCKET_BASE_NS`: the first bucket's upper bound, doubling with every further bucket."""
+
+
+def enable_tracing(enabled: bool = True, /) -> None:
+    """
+    Turns the latency histograms of the native phases on or off, for the whole process.
+
+    While tracing is on, every automaton build and every masking call (`mask`, `Masker`, `StreamWrapper`, ...)
+    adds the duration of each of its phases to that phase's histogram: `build`, `search` (walking the input
+    through the automaton), `reconstruct` (writing the masked output) and `reminder` (holding back a possible
+    partial match when streaming). While it is off, the phases read no clock. See `trace_histograms`.
+    """
+    _api().trace_enable(enabled)
+
+
+def reset_tracing() -> None:
+    """Zeroes the latency histograms."""
+    _api().trace_reset()
+
+
+def trace_histograms() -> dict[str, dict]:
+    """
+    The latency histograms recorded while tracing was on, in the shape of a Prometheus histogram.
+
+    :return: For each phase name in `TRACE_PHASES`, a dict with `buckets`, a list of `(upper_bound, count)` pairs
+    with the bound in seconds and the count cumulative, ending with `(math.inf, count)`, and `count` and `sum`
+    (in seconds) over all recorded durations. For example, with `prometheus_client`:
+    `HistogramMetricFamily(name, doc, buckets=[(str(le), n) for le, n in h["buckets"]], sum_value=h["sum"])`.
+    """
+    words = array.array("Q")
+    words.frombytes(_api().trace_snapshot())
+    per_phase = len(words) // len(TRACE_PHASES)
+    histograms = {}
+    for i, phase in enumerate(TRACE_PHASES):
+        *counts, sum_ns = words[i * per_phase : (i + 1) * per_phase]
+        buckets = []
+        total = 0
+        for bucket, count in enumerate(counts):
+            total += count
+            upper_bound = math.inf if bucket == len(counts) - 1 else (_BUCKET_BASE_NS << bucket) / 1e9
+            buckets.append((upper_bound, total))
+        histograms[phase] = {"buckets": buckets, "count": total, "sum": sum_ns / 1e9}
+    return histograms
+
+
+if _is_env_flag_set(_TRACE_ENV):
+    enable_tracing()
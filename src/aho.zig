@@ -1,5 +1,7 @@
 const std = @import("std");
 const testing = std.testing;
+const encodings = @import("encodings.zig");
+const trace = @import("trace.zig");
 
 const MAX_INT = std.math.maxInt(usize);
 
@@ -21,6 +23,21 @@ const Edges = union(enum) {
     dense: *[256]u32,
 };
 
+/// The length of the common prefix of `a` and `b`, which are equally long,
+/// compared 16 bytes at a time.
+fn commonPrefixLen(a: []const u8, b: []const u8) usize {
+    const V = @Vector(16, u8);
+    var i: usize = 0;
+    while (i + 16 <= a.len) : (i += 16) {
+        const va: V = a[i..][0..16].*;
+        const vb: V = b[i..][0..16].*;
+        const differ: u16 = @bitCast(va != vb);
+        if (differ != 0) return i + @ctz(differ);
+    }
+    while (i < a.len and a[i] == b[i]) i += 1;
+    return i;
+}
+
 const Node = struct {
     /// Outgoing edges, adaptively sized.
     edges: Edges = .none,
@@ -91,6 +108,42 @@ const Node = struct {
         }
     }
 
+    /// Iterates the outgoing edges, in no particular order.
+    const EdgeIterator = struct {
+        edges: Edges,
+        i: usize = 0,
+
+        const Edge = struct { key: u8, id: u32 };
+
+        fn next(it: *EdgeIterator) ?Edge {
+            switch (it.edges) {
+                .none => return null,
+                .one => |edge| {
+                    if (it.i > 0) return null;
+                    it.i = 1;
+                    return .{ .key = edge.key, .id = edge.id };
+                },
+                .few => |few| {
+                    if (it.i >= few.count) return null;
+                    defer it.i += 1;
+                    return .{ .key = few.keys[it.i], .id = few.ids[it.i] };
+                },
+                .dense => |dense| {
+                    while (it.i < dense.len) {
+                        const c = it.i;
+                        it.i += 1;
+                        if (dense[c] != 0) return .{ .key = @intCast(c), .id = dense[c] };
+                    }
+                    return null;
+                },
+            }
+        }
+    };
+
+    fn edgeIterator(self: *const Node) EdgeIterator {
+        return .{ .edges = self.edges };
+    }
+
     fn deinitEdges(self: *Node, allocator: std.mem.Allocator) void {
         switch (self.edges) {
             .few => |few| allocator.destroy(few),
@@ -100,51 +153,13 @@ const Node = struct {
     }
 };
 
-/// Aho-Corasick automaton class.
-pub const Aho = struct {
-    /// Memory cap for `dfa_table` + `dfa_match` combined (each entry is 4 bytes, so
-    /// this bounds `num_states * num_classes` at 8 bytes/entry). Pattern sets that
-    /// would exceed it fall back to `build`/`goTo`, which stays fixed-memory
-    /// regardless of pattern size — see memory note `no-unbounded-dfa-memory`.
-    pub const DFA_MEMORY_CAP: usize = 20 * 1024 * 1024;
-
+/// The matching state of one stream over a shared, built `Aho`.
+///
+/// The automaton's tables are immutable once built, so any number of cursors
+/// can walk the same `Aho` concurrently; everything a streaming `mask` call
+/// carries over to the next call of the same stream lives here instead.
+pub const Cursor = struct {
     allocator: std.mem.Allocator,
-
-    // Automaton related variables:
-
-    /// A list of all existing nodes.
-    nodes: std.ArrayList(Node),
-    /// A dense transition table for the root node, filled by `build`. Most of the
-    /// input walks through the root, so this keeps the hot path to a single load
-    /// while inner nodes stay sparse.
-    root_moves: [256]u32 = [_]u32{0} ** 256,
-    /// Byte -> class, computed by `buildDfa`. Bytes with no trie edge anywhere
-    /// share one class, since `goTo` treats them all identically.
-    byte_class: [256]u8 = [_]u8{0} ** 256,
-    num_classes: usize = 0,
-    /// Premultiplied: `dfa_table[state * num_classes + byte_class[c]]` is
-    /// `next_state * num_classes`, ready to use directly as the next lookup index.
-    dfa_table: []u32 = &.{},
-    /// Parallel to `dfa_table`: matched pattern length (0 if not a match) at the
-    /// same index, so match-checking needs no extra address computation.
-    dfa_match: []u32 = &.{},
-    /// Set by `insert` for every pattern of length >= 2: `bigram_ok[(first << 8) |
-    /// second]` is true if some pattern starts with that exact 2-byte prefix.
-    /// Used by `mask`'s DFA dispatch to skip a byte entirely (stay at root, no
-    /// array lookup at all) when it provably cannot start a match — see the
-    /// gate in `mask` for the correctness argument.
-    bigram_ok: [65536]bool = [_]bool{false} ** 65536,
-    /// Set by `insert` for every pattern of length exactly 1. The bigram gate
-    /// above must never skip a byte that is itself a complete match, since a
-    /// 1-byte pattern has no "second byte" to record in `bigram_ok`.
-    one_byte_match: [256]bool = [_]bool{false} ** 256,
-    /// Total number of patterns.
-    pidx: usize,
-    /// The total number of nodes.
-    total: usize,
-
-    // Sweeper related variables:
-
     /// The last found pattern is used to detect overlapping patterns.
     /// It is a position of the last character of the pattern in the input string.
     /// As this automaton always detects the leftmost-longest pattern first we don't need
@@ -175,12 +190,236 @@ pub const Aho = struct {
             }
             return MAX_INT;
         }
-    },
+    } = .{},
     /// In the streaming mode it may hold a reminder of the previous line that should be taken into consideration
     /// in the consecutive call.
     reminder: ?[]u8 = null,
     /// Current state in the trie.
     state: usize = 0,
+    /// Per shard of an automaton built by `Aho.buildSharded`, the state in
+    /// that shard, which `state` stands for otherwise. Allocated by the first
+    /// call that walks the stream over such an automaton.
+    shard_states: []usize = &.{},
+    /// The number of matches `Aho.mask` has met on this stream since the cursor
+    /// was created: as many as `findSpans` reports over everything it was given.
+    /// Not part of a `checkpoint`.
+    matches: u64 = 0,
+    /// Serializes the extension's calls on this cursor, which may run without
+    /// the GIL (see `src/python.zig`); unused by the C ABI.
+    call_lock: std.Io.Mutex = .init,
+
+    pub fn init(allocator: std.mem.Allocator) Cursor {
+        return .{ .allocator = allocator };
+    }
+
+    const CHECKPOINT_MAGIC = "SSC1";
+    /// The fixed part of a `checkpoint` blob: the magic, then the automaton's
+    /// `fingerprint`, the trie node and the three `last_occur` fields as
+    /// little-endian 64-bit integers. Over a sharded automaton the node is the
+    /// first shard's, and the other shards' nodes follow the fixed part the
+    /// same way. The reminder comes last.
+    pub const CHECKPOINT_HEADER_LEN = CHECKPOINT_MAGIC.len + 5 * 8;
+
+    /// The per-shard states over `ac`, which must be sharded: the ones the
+    /// stream left, or all at the root for a stream new to `ac`.
+    fn shardStates(self: *Cursor, ac: *const Aho) ![]usize {
+        if (self.shard_states.len != ac.shards.len) {
+            const states = try self.allocator.alloc(usize, ac.shards.len);
+            @memset(states, 0);
+            self.allocator.free(self.shard_states);
+            self.shard_states = states;
+        }
+        return self.shard_states;
+    }
+
+    /// The trie node the stream is at in shard `shard` of `ac`, or in `ac`
+    /// itself for shard 0 of an automaton that isn't sharded.
+    fn nodeIn(self: *const Cursor, ac: *const Aho, shard: usize) usize {
+        if (ac.shards.len == 0) return ac.nodeOf(self.state);
+        if (self.shard_states.len != ac.shards.len) return 0;
+        return ac.shards[shard].nodeOf(self.shard_states[shard]);
+    }
+
+    /// Serializes the stream state over `ac` into a new blob owned by the
+    /// caller (free it with the cursor's allocator). The state is stored as a
+    /// trie node, not a DFA state, so `restore` accepts it on any build of the
+    /// same patterns, DFA or not, split into as many shards.
+    pub fn checkpoint(self: *const Cursor, ac: *const Aho) ![]u8 {
+        const reminder: []const u8 = self.reminder orelse "";
+        const more_nodes = ac.shards.len -| 1;
+        const blob = try self.allocator.alloc(u8, CHECKPOINT_HEADER_LEN + 8 * more_nodes + reminder.len);
+        @memcpy(blob[0..CHECKPOINT_MAGIC.len], CHECKPOINT_MAGIC);
+        const fields = [5]u64{
+            ac.fingerprint(),
+            self.nodeIn(ac, 0),
+            @bitCast(@as(i64, self.last_occur.pos)),
+            self.last_occur.len,
+            self.last_occur.cum_len,
+        };
+        for (fields, 0..) |field, i| {
+            std.mem.writeInt(u64, blob[CHECKPOINT_MAGIC.len + 8 * i ..][0..8], field, .little);
+        }
+        for (0..more_nodes) |i| {
+            std.mem.writeInt(u64, blob[CHECKPOINT_HEADER_LEN + 8 * i ..][0..8], self.nodeIn(ac, i + 1), .little);
+        }
+        @memcpy(blob[CHECKPOINT_HEADER_LEN + 8 * more_nodes ..], reminder);
+        return blob;
+    }
+
+    /// Replaces the stream state with one saved by `checkpoint`. Fails with
+    /// `error.PatternMismatch` if it was taken over different patterns, and
+    /// with `error.InvalidCheckpoint` if the blob is malformed; the cursor is
+    /// left unchanged on any error.
+    pub fn restore(self: *Cursor, ac: *const Aho, blob: []const u8) !void {
+        if (blob.len < CHECKPOINT_HEADER_LEN or !std.mem.eql(u8, blob[0..CHECKPOINT_MAGIC.len], CHECKPOINT_MAGIC)) {
+            return error.InvalidCheckpoint;
+        }
+        var fields: [5]u64 = undefined;
+        for (&fields, 0..) |*field, i| {
+            field.* = std.mem.readInt(u64, blob[CHECKPOINT_MAGIC.len + 8 * i ..][0..8], .little);
+        }
+        if (fields[0] != ac.fingerprint()) return error.PatternMismatch;
+        const more_nodes = ac.shards.len -| 1;
+        if (blob.len < CHECKPOINT_HEADER_LEN + 8 * more_nodes) return error.InvalidCheckpoint;
+        var nodes: [Aho.MAX_SHARDS]usize = undefined;
+        var depth: usize = 0;
+        for (0..more_nodes + 1) |i| {
+            const node = if (i == 0) fields[1] else std.mem.readInt(u64, blob[CHECKPOINT_HEADER_LEN + 8 * (i - 1) ..][0..8], .little);
+            const trie = if (ac.shards.len == 0) ac else &ac.shards[i];
+            if (node >= trie.nodes.items.len) return error.InvalidCheckpoint;
+            nodes[i] = @intCast(node);
+            depth = @max(depth, trie.nodes.items[nodes[i]].depth);
+        }
+        const reminder = blob[CHECKPOINT_HEADER_LEN + 8 * more_nodes ..];
+        // The reminder never outgrows the depth of the state (see `Aho.mask`).
+        if (reminder.len > depth) return error.InvalidCheckpoint;
+        const copy = if (reminder.len > 0) try self.allocator.dupe(u8, reminder) else null;
+        errdefer if (copy) |c| self.allocator.free(c);
+        if (ac.shards.len == 0) {
+            self.state = ac.stateOf(nodes[0]);
+        } else {
+            for (try self.shardStates(ac), ac.shards, nodes[0..ac.shards.len]) |*state, *shard, node| {
+                state.* = shard.stateOf(node);
+            }
+        }
+        self.reset_reminder();
+        self.reminder = copy;
+        self.last_occur = .{
+            .pos = @as(i64, @bitCast(fields[2])),
+            .len = @intCast(fields[3]),
+            .cum_len = @intCast(fields[4]),
+        };
+    }
+
+    pub fn deinit(self: *Cursor) void {
+        self.reset_reminder();
+        self.allocator.free(self.shard_states);
+        self.shard_states = &.{};
+    }
+
+    pub fn reset_reminder(self: *Cursor) void {
+        if (self.reminder) |reminder| {
+            self.allocator.free(reminder);
+            self.reminder = null;
+        }
+    }
+};
+
+/// Aho-Corasick automaton class.
+pub const Aho = struct {
+    /// Memory cap for the `dfa` table (2 or 4 bytes per `num_rows * num_classes`
+    /// entry, see `Dfa`) and its per-node bookkeeping (9 bytes per trie node).
+    /// Pattern sets that would exceed it fall back to `build`/`goTo`, which stays
+    /// fixed-memory regardless of pattern size — see memory note
+    /// `no-unbounded-dfa-memory`.
+    pub const DFA_MEMORY_CAP: usize = 20 * 1024 * 1024;
+
+    /// Trie nodes at least this deep that only link a chain (exactly one
+    /// child, no pattern ending there) get no `dfa` row: the walk matches the
+    /// rest of their chain against `chain_bytes` instead. Long secrets (PEM and
+    /// SSH keys, JWTs) are almost all chain, so each of their bytes costs a few
+    /// bytes of bookkeeping rather than a row of `num_classes` words. Shallower
+    /// nodes keep their rows, since input that isn't a secret seldom walks
+    /// this deep.
+    pub const CHAIN_MIN_DEPTH = 8;
+
+    /// A DFA transition table in the narrowest word that holds it. Only trie
+    /// nodes that aren't chain links (see `CHAIN_MIN_DEPTH`) have a row, and
+    /// their states are premultiplied (row * `num_classes`), so the entry for
+    /// byte `c` in state `s` is at `s + byte_class[c]`. A chain node's state is
+    /// `chain_base + node`. An entry holds the next state shifted left by one,
+    /// with the low bit set if that state ends a pattern or is a chain node:
+    /// one load per byte decides whether the walk can go on, and the pattern
+    /// length is only looked up in `nodes` on a hit.
+    pub const Dfa = union(enum) {
+        none,
+        /// Every state fits in 15 bits: 2 bytes per entry.
+        narrow: []u16,
+        wide: []u32,
+    };
+
+    /// The most automatons `buildSharded` splits the patterns into.
+    pub const MAX_SHARDS = 64;
+
+    /// Inputs at least this long are walked through the shards of a sharded
+    /// automaton on a thread per shard; shorter ones, one shard after another
+    /// on the calling thread, where starting the threads would cost more than
+    /// it saves.
+    pub const PARALLEL_MIN_BYTES = 64 * 1024;
+
+    /// The shards walk the input in blocks of this many bytes, so the matches
+    /// each one holds for `walkShards` to merge stay bounded by a block.
+    const SHARD_BLOCK_LEN = 1 << 20;
+
+    allocator: std.mem.Allocator,
+
+    // Automaton related variables:
+
+    /// A list of all existing nodes.
+    nodes: std.ArrayList(Node),
+    /// A dense transition table for the root node, filled by `build`. Most of the
+    /// input walks through the root, so this keeps the hot path to a single load
+    /// while inner nodes stay sparse.
+    root_moves: [256]u32 = [_]u32{0} ** 256,
+    /// Byte -> class, computed by `buildDfa`. Bytes with no trie edge anywhere
+    /// share one class, since `goTo` treats them all identically.
+    byte_class: [256]u8 = [_]u8{0} ** 256,
+    num_classes: usize = 0,
+    /// The transition table built by `buildDfa`, if any.
+    dfa: Dfa = .none,
+    /// Per trie node, the state `walk` carries for it under DFA dispatch.
+    dfa_states: []u32 = &.{},
+    /// Per `dfa` row, the trie node it belongs to.
+    row_nodes: []u32 = &.{},
+    /// The first chain node state, past every premultiplied row.
+    chain_base: usize = 0,
+    /// The pattern-byte pool: the key of the only edge of every chain node,
+    /// indexed by node. `insertAs` numbers a pattern's new nodes in order, so
+    /// a run of chain nodes spells its bytes out contiguously.
+    chain_bytes: []u8 = &.{},
+    /// Per chain node, the first node past its run of chain nodes: where the
+    /// walk lands once the rest of the run is matched.
+    chain_ends: []u32 = &.{},
+    /// Set by `insert` for every pattern of length >= 2: `bigram_ok[(first << 8) |
+    /// second]` is true if some pattern starts with that exact 2-byte prefix.
+    /// Used by `mask`'s DFA dispatch to skip a byte entirely (stay at root, no
+    /// array lookup at all) when it provably cannot start a match — see the
+    /// gate in `mask` for the correctness argument.
+    bigram_ok: [65536]bool = [_]bool{false} ** 65536,
+    /// Set by `insert` for every pattern of length exactly 1. The bigram gate
+    /// above must never skip a byte that is itself a complete match, since a
+    /// 1-byte pattern has no "second byte" to record in `bigram_ok`.
+    one_byte_match: [256]bool = [_]bool{false} ** 256,
+    /// Hashes every inserted pattern in order: the same patterns inserted in the
+    /// same order number the trie nodes the same way. See `fingerprint`.
+    pattern_hash: std.hash.Wyhash = std.hash.Wyhash.init(0),
+    /// The automatons `buildSharded` split the patterns into, which every
+    /// walk goes through instead of this one's own trie; empty otherwise.
+    shards: []Aho = &.{},
+    /// Total number of patterns.
+    pidx: usize,
+    /// The total number of nodes.
+    total: usize,
 
     pub fn init(allocator: std.mem.Allocator) !Aho {
         var nodes= try std.ArrayList(Node).initCapacity(allocator, 0);
@@ -191,25 +430,24 @@ pub const Aho = struct {
             .nodes = nodes,
             .pidx = 0,
             .total = 0,
-            .last_occur = .{},
         };
     }
 
-    pub fn reset_reminder(self: *Aho) void {
-        if (self.reminder) |reminder| {
-            self.allocator.free(reminder);
-            self.reminder = null;
-        }
-    }
-
     pub fn deinit(self: *Aho) void {
-        self.reset_reminder();
         for (self.nodes.items) |*node| {
             node.deinitEdges(self.allocator);
         }
         self.nodes.deinit(self.allocator);
-        if (self.dfa_table.len > 0) self.allocator.free(self.dfa_table);
-        if (self.dfa_match.len > 0) self.allocator.free(self.dfa_match);
+        switch (self.dfa) {
+            .none => {},
+            inline else => |table| self.allocator.free(table),
+        }
+        self.allocator.free(self.dfa_states);
+        self.allocator.free(self.row_nodes);
+        self.allocator.free(self.chain_bytes);
+        self.allocator.free(self.chain_ends);
+        for (self.shards) |*shard| shard.deinit();
+        self.allocator.free(self.shards);
     }
 
     /// Returns the next state for byte `c`, following fail links while the state
@@ -228,10 +466,34 @@ pub const Aho = struct {
     /// Inserts a new pattern and returns its unique identifier.
     /// Empty pattern is ignored. In this case function returns null.
     pub fn insert(self: *Aho, pattern: []const u8) !?usize {
+        return self.insertAs(pattern, null);
+    }
+
+    /// Inserts a pattern together with its encoded variants (see `encodings.zig`).
+    /// Every variant shares the raw pattern's identifier, and variants already in
+    /// the trie (as another pattern or another pattern's variant) are left as is.
+    pub fn insertEncoded(self: *Aho, pattern: []const u8, encs: encodings.Encodings) !?usize {
+        const id = try self.insert(pattern) orelse return null;
+        var variants = try encodings.Variants.init(self.allocator);
+        defer variants.deinit();
+        try variants.generate(pattern, encs);
+        for (0..variants.count()) |i| {
+            _ = try self.insertAs(variants.get(i), @intCast(id));
+        }
+        return id;
+    }
+
+    /// Inserts a pattern, giving a newly created pattern node the identifier `id`,
+    /// or the next unused one when it is null.
+    fn insertAs(self: *Aho, pattern: []const u8, id: ?u32) !?usize {
         if (pattern.len == 0) {
             // Ignore empty patterns.
             return null;
         }
+        var len_bytes: [8]u8 = undefined;
+        std.mem.writeInt(u64, &len_bytes, pattern.len, .little);
+        self.pattern_hash.update(&len_bytes);
+        self.pattern_hash.update(pattern);
         if (pattern.len == 1) {
             self.one_byte_match[pattern[0]] = true;
         } else {
@@ -255,10 +517,12 @@ pub const Aho = struct {
             u = self.total;
         }
         if (self.nodes.items[u].id == 0) {
-            self.pidx += 1;
             // Both fit in u32: nodes are counted per pattern byte, and `insert`
             // fails with TooManyNodes before the node count can exceed it.
-            self.nodes.items[u].id = @intCast(self.pidx);
+            self.nodes.items[u].id = id orelse blk: {
+                self.pidx += 1;
+                break :blk @intCast(self.pidx);
+            };
             self.nodes.items[u].len = @intCast(pattern.len);
         }
         return self.nodes.items[u].id;
@@ -297,154 +561,566 @@ pub const Aho = struct {
     /// list, not one entry per match, because a later overlapping match's
     /// star-cap can reach back through stars an earlier match already emitted —
     /// `ensureTailStars` treats that as already satisfied instead of duplicating it.
+    /// No two `stars` runs are adjacent: a cluster of overlapping matches is one
+    /// run however many matches it has, so the list grows by at most two ops per
+    /// cluster, and every op `ensureTailStars` walks back over is merged away.
     const Op = union(enum) {
         literal: struct { start: usize, end: usize },
         stars: usize,
     };
 
-    /// Drops the last `n` bytes of decided output from `ops`. Always lands inside
-    /// the literal run just pushed for the current match (see `mask`): that run's
-    /// length equals `num` exactly, and `diff <= num` always holds.
-    fn trimTail(ops: *std.ArrayList(Op), n: usize) void {
-        var remaining = n;
-        while (remaining > 0) {
+    /// Ensures the last `size` bytes of decided output are stars, converting or
+    /// splitting trailing `literal` runs as needed and merging the stars into
+    /// one trailing run. A `stars` run met on the way is already satisfied, so
+    /// a chain of overlapping star-caps stays idempotent. Every op it walks
+    /// over but the last is merged away, so over a `mask` call it does at most
+    /// one step per op ever appended plus one per call: O(1) amortized.
+    fn ensureTailStars(ops: *std.ArrayList(Op), allocator: std.mem.Allocator, size: usize) !void {
+        var stars: usize = 0;
+        while (ops.items.len > 0) {
             const last_idx = ops.items.len - 1;
             switch (ops.items[last_idx]) {
-                .literal => |lit| {
-                    const len = lit.end - lit.start;
-                    if (len <= remaining) {
-                        ops.shrinkRetainingCapacity(last_idx);
-                        remaining -= len;
-                    } else {
-                        ops.items[last_idx] = .{ .literal = .{ .start = lit.start, .end = lit.end - remaining } };
-                        remaining = 0;
-                    }
-                },
                 .stars => |count| {
-                    if (count <= remaining) {
-                        ops.shrinkRetainingCapacity(last_idx);
-                        remaining -= count;
-                    } else {
-                        ops.items[last_idx] = .{ .stars = count - remaining };
-                        remaining = 0;
+                    stars += count;
+                    ops.shrinkRetainingCapacity(last_idx);
+                },
+                .literal => |lit| {
+                    if (stars >= size) break;
+                    const back = @min(lit.end - lit.start, size - stars);
+                    stars += back;
+                    if (back < lit.end - lit.start) {
+                        ops.items[last_idx] = .{ .literal = .{ .start = lit.start, .end = lit.end - back } };
+                        break;
                     }
+                    ops.shrinkRetainingCapacity(last_idx);
                 },
             }
         }
+        try ops.append(allocator, .{ .stars = stars });
     }
 
-    /// Ensures the last `size` bytes of decided output are stars, converting or
-    /// splitting trailing `literal` runs as needed. Stops as soon as it meets a
-    /// `stars` run that already covers the rest of `size` — nothing to convert
-    /// there, which is what keeps a chain of overlapping star-caps idempotent.
-    fn ensureTailStars(ops: *std.ArrayList(Op), allocator: std.mem.Allocator, size: usize) !void {
-        var remaining = size;
-        var i = ops.items.len;
-        while (remaining > 0 and i > 0) {
-            i -= 1;
-            switch (ops.items[i]) {
-                .stars => |count| {
-                    if (count <= remaining) {
-                        remaining -= count;
-                        continue;
-                    }
-                    break; // already fully covers what's left; nothing to convert
-                },
-                .literal => |lit| {
-                    const len = lit.end - lit.start;
-                    if (len <= remaining) {
-                        ops.items[i] = .{ .stars = len };
-                        remaining -= len;
-                        continue;
-                    }
-                    const back = remaining;
-                    const front_end = lit.end - back;
-                    ops.items[i] = .{ .literal = .{ .start = lit.start, .end = front_end } };
-                    try ops.insert(allocator, i + 1, .{ .stars = back });
-                    break;
-                },
+    /// One match reported by `findSpans`: the `[start, end)` byte range of the
+    /// input and the matched pattern's identifier minus one, i.e. the 0-based
+    /// index of the distinct pattern in insertion order. Laid out as three u64s
+    /// so a list of spans can be handed to Python as a flat buffer of triples.
+    pub const Span = extern struct {
+        start: u64,
+        end: u64,
+        id: u64,
+    };
+
+    /// Returns the trie node for a state carried by `walk`.
+    fn nodeOf(self: *const Aho, state: usize) usize {
+        // `state` is a premultiplied row or a chain state under DFA dispatch.
+        // Only called per match or per call, never per byte, so the division
+        // is cheap.
+        if (!self.usesDfa()) return state;
+        if (state >= self.chain_base) return state - self.chain_base;
+        return self.row_nodes[state / self.num_classes];
+    }
+
+    /// The inverse of `nodeOf`: the state `walk` carries for a trie node.
+    fn stateOf(self: *const Aho, node: usize) usize {
+        return if (self.usesDfa()) self.dfa_states[node] else node;
+    }
+
+    fn isChainState(self: *const Aho, state: usize) bool {
+        return state >= self.chain_base;
+    }
+
+    /// Whether `buildDfa` built the table that `walk` dispatches through, for
+    /// every shard of a sharded automaton.
+    pub fn usesDfa(self: *const Aho) bool {
+        if (self.shards.len > 0) {
+            for (self.shards) |*shard| {
+                if (!shard.usesDfa()) return false;
             }
+            return true;
         }
+        return self.dfa != .none;
     }
 
-    /// Masks all patterns in `text` with `*`.
-    ///
-    /// Two passes: the first walks the automaton (DFA dispatch when built for
-    /// this automaton, else the fail-link-walking `goTo`) and records an `Op`
-    /// per match instead of writing bytes, so a rare match doesn't force output
-    /// work for every byte in between. The second replays the op list to build
-    /// the output in one pass of bulk memcpy/memset.
+    /// Identifies the inserted patterns, their order and encoded variants
+    /// included, so a `Cursor.checkpoint` is only restored over an automaton
+    /// whose trie nodes mean the same. The split into shards is a function of
+    /// the patterns and the number of shards, so that number is hashed too.
+    pub fn fingerprint(self: *const Aho) u64 {
+        var hash = self.pattern_hash;
+        if (self.shards.len > 0) {
+            var len_bytes: [8]u8 = undefined;
+            std.mem.writeInt(u64, &len_bytes, self.shards.len, .little);
+            hash.update(&len_bytes);
+        }
+        return hash.final();
+    }
+
+    /// Walks `text` through the automaton starting from `state.*` and calls
+    /// `sink.onMatch(local_pos, match_len, id)` for every match, where
+    /// `local_pos` is the position of the match's last byte in `text` and `id`
+    /// the matched pattern's identifier. Returns
+    /// that position as soon as `onMatch` returns true, or null once the whole
+    /// text is walked. `state.*` is left at the state after the last walked byte.
     ///
-    /// `self.state` is premultiplied (`real_state * num_classes`) under DFA
-    /// dispatch, a plain index otherwise; both agree on 0, so resetting or
-    /// carrying it across calls needs no special-casing either way.
+    /// The state is a premultiplied row or a chain state under DFA dispatch
+    /// (see `Dfa`), a plain node index otherwise; both agree on 0, so
+    /// resetting or carrying it across calls needs no special-casing either way.
     ///
-    /// The DFA branch also gates on `bigram_ok`/`one_byte_match` at the root: a
-    /// byte that provably cannot start any match skips the `dfa_table`/`dfa_match`
-    /// lookup entirely, which is a large win specifically for sparse corpora
-    /// (few real matches spread through a lot of non-matching text) since most
+    /// The DFA walk also gates on `bigram_ok`/`one_byte_match` at the root: a
+    /// byte that provably cannot start any match skips the `dfa` lookup
+    /// entirely, which is a large win specifically for sparse corpora (few
+    /// real matches spread through a lot of non-matching text) since most
     /// bytes never leave the root. See the gate's own comment for the
     /// correctness argument.
-    pub fn mask(self: *Aho, args: struct {
-        /// An input string.
-        text: []const u8,
-        /// The max number of stars to mask patterns in the result.
-        max_stars: u64 = 15,
-        /// In streaming mode, incomplete patterns at the end of the input are buffered and processed on the next call.
-        /// The function does not process the entire text at once if an incomplete pattern is found at the end
-        /// of the input. Instead, it saves the remainder in its internal state and uses it in the next call,
-        /// treating the input as a continuation of the previous one.
-        is_streaming: bool = false,
-    }) ![]u8 {
-        if (!args.is_streaming) {
-            self.reset_reminder();
-            self.state = 0;
-            self.last_occur = .{};
+    fn walk(self: *const Aho, state: *usize, text: []const u8, sink: anytype) !?usize {
+        return switch (self.dfa) {
+            .none => self.walkTrie(state, text, sink),
+            .narrow => |table| self.walkDfa(u16, table, state, text, sink),
+            .wide => |table| self.walkDfa(u32, table, state, text, sink),
+        };
+    }
+
+    fn walkTrie(self: *const Aho, state: *usize, text: []const u8, sink: anytype) !?usize {
+        var s = state.*;
+        defer state.* = s;
+        for (text, 0..) |c, local_pos| {
+            s = self.goTo(s, c);
+            const node = self.nodes.items[s];
+            if (node.id == 0) continue;
+            if (try @call(.never_inline, @TypeOf(sink.*).onMatch, .{ sink, local_pos, node.len, node.id })) {
+                return local_pos;
+            }
         }
-        const reminder: []const u8 = if (self.reminder) |r| r else &[_]u8{};
-        const reminder_len = reminder.len;
-        const input_len = reminder_len + args.text.len;
+        return null;
+    }
 
-        // Pass 1: search. `pos` is absolute (reminder ++ text) position — only
-        // `args.text` is walked here since `self.state`/`self.last_occur` already
-        // reflect having consumed `reminder` in a previous call.
-        var ops = try std.ArrayList(Op).initCapacity(self.allocator, 0);
-        defer ops.deinit(self.allocator);
-        // Absolute position up to which an `Op` already accounts for every byte
-        // seen this call. Starts at 0, not `reminder_len`: the reminder is never
-        // walked byte-by-byte, but a match's star-cap can still reach into it.
-        var flushed_upto: usize = 0;
-        const use_dfa = self.dfa_table.len > 0;
-        for (args.text, 0..) |c, local_pos| {
-            const pos = reminder_len + local_pos;
-            var match_len: usize = 0;
-            if (use_dfa) {
-                // At the root, a byte that starts no pattern (or starts only
-                // 2+-byte patterns whose second byte doesn't follow) can never
-                // produce a match here, and always lands back at root either
-                // way — so it's provably safe to skip straight to the next byte
-                // without touching `dfa_table`/`dfa_match` at all. Guarded by
-                // `one_byte_match` first: a 1-byte pattern match must never be
-                // skipped, and `bigram_ok` alone has no way to record it (no
-                // second byte to check). The last byte of a chunk always falls
-                // through (can't peek ahead), which matters for streaming: the
-                // reminder-depth bookkeeping needs `self.state` genuinely
-                // updated for that byte, not skipped.
-                if (self.state == 0 and !self.one_byte_match[c] and local_pos + 1 < args.text.len) {
-                    const next_c = args.text[local_pos + 1];
-                    if (!self.bigram_ok[(@as(usize, c) << 8) | next_c]) {
-                        continue;
-                    }
+    fn walkDfa(
+        self: *const Aho,
+        comptime Word: type,
+        table: []const Word,
+        state: *usize,
+        text: []const u8,
+        sink: anytype,
+    ) !?usize {
+        var s = state.*;
+        defer state.* = s;
+        var i: usize = 0;
+        if (self.isChainState(s)) {
+            // The previous call of this stream stopped inside a chain.
+            if (try self.walkChain(Word, table, &s, text, &i, sink)) |local_pos| return local_pos;
+        }
+        while (i < text.len) : (i += 1) {
+            const c = text[i];
+            // At the root, a byte that starts no pattern (or starts only
+            // 2+-byte patterns whose second byte doesn't follow) can never
+            // produce a match here, and always lands back at root either
+            // way — so it's provably safe to skip straight to the next byte
+            // without touching `dfa` at all. Guarded by `one_byte_match`
+            // first: a 1-byte pattern match must never be skipped, and
+            // `bigram_ok` alone has no way to record it (no second byte to
+            // check). The last byte of a chunk always falls through (can't
+            // peek ahead), which matters for streaming: the reminder-depth
+            // bookkeeping needs the state genuinely updated for that byte,
+            // not skipped.
+            if (s == 0 and !self.one_byte_match[c] and i + 1 < text.len) {
+                const next_c = text[i + 1];
+                if (!self.bigram_ok[(@as(usize, c) << 8) | next_c]) {
+                    continue;
                 }
-                const idx = self.state + self.byte_class[c];
-                self.state = self.dfa_table[idx];
-                match_len = self.dfa_match[idx];
+            }
+            const word = table[s + self.byte_class[c]];
+            s = word >> 1;
+            if (word & 1 == 0) continue;
+            if (self.isChainState(s)) {
+                var next = i + 1;
+                if (try self.walkChain(Word, table, &s, text, &next, sink)) |local_pos| return local_pos;
+                i = next - 1;
+                continue;
+            }
+            const node = self.nodes.items[self.row_nodes[s / self.num_classes]];
+            // Matches are rare next to the bytes walked: keep the handler out
+            // of this loop so its code doesn't crowd the per-byte path.
+            if (try @call(.never_inline, @TypeOf(sink.*).onMatch, .{ sink, i, node.len, node.id })) {
+                return i;
+            }
+        }
+        return null;
+    }
+
+    /// Continues `walkDfa` from the chain node in `state.*` at `text[pos.*..]`.
+    /// The rest of the node's run is compared against `chain_bytes` in one go;
+    /// on a mismatch the fail links are followed, through further chain nodes
+    /// by their one edge, to a node with a `dfa` row. Leaves `state.*` at a row
+    /// state, or at a chain state if the text runs out first, and `pos.*` at
+    /// the next byte to walk. Reports a match on the row state like `walk`.
+    noinline fn walkChain(
+        self: *const Aho,
+        comptime Word: type,
+        table: []const Word,
+        state: *usize,
+        text: []const u8,
+        pos: *usize,
+        sink: anytype,
+    ) !?usize {
+        var node = state.* - self.chain_base;
+        var p = pos.*;
+        defer pos.* = p;
+        while (true) {
+            const end = self.chain_ends[node];
+            const run = @min(end - node, text.len - p);
+            const same = commonPrefixLen(text[p..][0..run], self.chain_bytes[node..][0..run]);
+            node += same;
+            p += same;
+            if (node == end) break;
+            if (p == text.len) {
+                state.* = self.chain_base + node;
+                return null;
+            }
+            // `node`'s one edge doesn't take the next byte.
+            const c = text[p];
+            p += 1;
+            var fail = self.nodes.items[node].fail;
+            while (self.isChainState(self.dfa_states[fail]) and self.chain_bytes[fail] != c) {
+                fail = self.nodes.items[fail].fail;
+            }
+            if (self.isChainState(self.dfa_states[fail])) {
+                node = fail + 1;
             } else {
-                self.state = self.goTo(self.state, c);
-                const node = self.nodes.items[self.state];
-                match_len = if (node.id > 0) node.len else 0;
+                const word = table[self.dfa_states[fail] + self.byte_class[c]];
+                if (word & 1 == 0) {
+                    state.* = word >> 1;
+                    return null;
+                }
+                node = self.nodeOf(word >> 1);
+            }
+            if (!self.isChainState(self.dfa_states[node])) break;
+        }
+        state.* = self.dfa_states[node];
+        const match = self.nodes.items[node];
+        if (match.id != 0 and try @call(.never_inline, @TypeOf(sink.*).onMatch, .{ sink, p - 1, match.len, match.id })) {
+            return p - 1;
+        }
+        return null;
+    }
+
+    /// The trie depth of the stream's state: how many of the bytes it walked
+    /// last can still be the start of a match. Over a sharded automaton, the
+    /// deepest shard's, since the state of the whole pattern set is the state
+    /// of the shard holding the pattern it is a prefix of.
+    fn streamDepth(self: *const Aho, cursor: *const Cursor) usize {
+        var depth: usize = 0;
+        for (0..@max(self.shards.len, 1)) |i| {
+            const trie = if (self.shards.len == 0) self else &self.shards[i];
+            depth = @max(depth, trie.nodes.items[cursor.nodeIn(self, i)].depth);
+        }
+        return depth;
+    }
+
+    /// One match a shard reports to `walkShards`, at the position of its last
+    /// byte in the block.
+    const ShardMatch = struct { pos: u32, len: u32, id: u32 };
+
+    /// One shard's walk over a block for `walkShards`, which may run on a
+    /// thread of its own: it writes only its own state and matches.
+    const ShardWalk = struct {
+        shard: *const Aho,
+        state: *usize,
+        block: []const u8 = &.{},
+        matches: std.ArrayList(ShardMatch) = .empty,
+        failed: bool = false,
+        /// Set by `walkShards` once `block` holds the next block, or `stop` is set.
+        start: std.Io.Event = .unset,
+        /// Set by the shard's thread once it has walked `block`.
+        done: std.Io.Event = .unset,
+        stop: bool = false,
+
+        fn onMatch(shard_walk: *ShardWalk, local_pos: usize, match_len: usize, id: u32) !bool {
+            try shard_walk.matches.append(shard_walk.shard.allocator, .{ .pos = @intCast(local_pos), .len = @intCast(match_len), .id = id });
+            return false;
+        }
+
+        fn run(shard_walk: *ShardWalk) void {
+            shard_walk.matches.clearRetainingCapacity();
+            _ = shard_walk.shard.walk(shard_walk.state, shard_walk.block, shard_walk) catch {
+                shard_walk.failed = true;
+            };
+        }
+
+        /// The shard's thread: walks each block `walkShards` hands it until it
+        /// is stopped. Waiting on and setting the events keeps no state in the
+        /// `Io` instance, so any thread may use the global one.
+        fn serve(shard_walk: *ShardWalk) void {
+            const io = std.Io.Threaded.global_single_threaded.io();
+            while (true) {
+                shard_walk.start.waitUncancelable(io);
+                shard_walk.start.reset();
+                if (shard_walk.stop) return;
+                shard_walk.run();
+                shard_walk.done.set(io);
+            }
+        }
+    };
+
+    /// Merges the matches the shards found in one block by position: a binary
+    /// min-heap of the shards that have matches left, keyed by the position of
+    /// their next one, so each match costs O(log shards) and shards without
+    /// any are never looked at.
+    const ShardMerge = struct {
+        walks: []const ShardWalk,
+        heads: [MAX_SHARDS]usize = @splat(0),
+        heap: [MAX_SHARDS]u8 = undefined,
+        len: usize = 0,
+
+        fn init(walks: []const ShardWalk) ShardMerge {
+            var merge = ShardMerge{ .walks = walks };
+            for (walks, 0..) |*shard_walk, i| {
+                if (shard_walk.matches.items.len == 0) continue;
+                merge.heap[merge.len] = @intCast(i);
+                merge.len += 1;
+            }
+            var i = merge.len / 2;
+            while (i > 0) {
+                i -= 1;
+                merge.siftDown(i);
+            }
+            return merge;
+        }
+
+        fn headPos(merge: *const ShardMerge, slot: usize) u32 {
+            const i = merge.heap[slot];
+            return merge.walks[i].matches.items[merge.heads[i]].pos;
+        }
+
+        fn siftDown(merge: *ShardMerge, start: usize) void {
+            var slot = start;
+            while (true) {
+                var least = slot;
+                for ([_]usize{ 2 * slot + 1, 2 * slot + 2 }) |child| {
+                    if (child < merge.len and merge.headPos(child) < merge.headPos(least)) least = child;
+                }
+                if (least == slot) return;
+                std.mem.swap(u8, &merge.heap[slot], &merge.heap[least]);
+                slot = least;
+            }
+        }
+
+        /// The next match by position across the shards, or null once all are merged.
+        fn next(merge: *ShardMerge) ?ShardMatch {
+            if (merge.len == 0) return null;
+            const i = merge.heap[0];
+            const match = merge.walks[i].matches.items[merge.heads[i]];
+            merge.heads[i] += 1;
+            if (merge.heads[i] == merge.walks[i].matches.items.len) {
+                merge.len -= 1;
+                merge.heap[0] = merge.heap[merge.len];
+            }
+            merge.siftDown(0);
+            return match;
+        }
+    };
+
+    /// `walk` over a sharded automaton, each shard from its own state in
+    /// `states`. Every block of the text is walked through all the shards and
+    /// their matches are merged by position into the calls to `sink.onMatch`.
+    /// For inputs of `PARALLEL_MIN_BYTES` or more, every shard but the first
+    /// gets a thread, started once per call and handed the blocks in turn.
+    /// The merged sequence is exactly the one `walk` reports over the whole
+    /// pattern set, since no two shards ever match at the same position (see
+    /// `buildSharded`). If the sink stops the walk, the states are left
+    /// wherever the shards got to in that block.
+    fn walkShards(self: *const Aho, states: []usize, text: []const u8, sink: anytype) !?usize {
+        const n = self.shards.len;
+        var walks: [MAX_SHARDS]ShardWalk = undefined;
+        for (walks[0..n], self.shards, states) |*shard_walk, *shard, *state| {
+            shard_walk.* = .{ .shard = shard, .state = state };
+        }
+        defer for (walks[0..n]) |*shard_walk| shard_walk.matches.deinit(self.allocator);
+        // The calling thread walks the first shard, and any shard whose
+        // thread fails to start, itself.
+        const io = std.Io.Threaded.global_single_threaded.io();
+        var threads: [MAX_SHARDS]?std.Thread = @splat(null);
+        if (text.len >= PARALLEL_MIN_BYTES) {
+            for (walks[1..n], threads[1..n]) |*shard_walk, *thread| {
+                thread.* = std.Thread.spawn(.{}, ShardWalk.serve, .{shard_walk}) catch null;
+            }
+        }
+        defer for (walks[0..n], threads[0..n]) |*shard_walk, thread| {
+            const t = thread orelse continue;
+            shard_walk.stop = true;
+            shard_walk.start.set(io);
+            t.join();
+        };
+        var offset: usize = 0;
+        while (offset < text.len) : (offset += SHARD_BLOCK_LEN) {
+            const block = text[offset..@min(offset + SHARD_BLOCK_LEN, text.len)];
+            for (walks[0..n], threads[0..n]) |*shard_walk, thread| {
+                shard_walk.block = block;
+                if (thread != null) {
+                    shard_walk.done.reset();
+                    shard_walk.start.set(io);
+                }
+            }
+            for (walks[0..n], threads[0..n]) |*shard_walk, thread| {
+                if (thread == null) shard_walk.run();
+            }
+            // Every thread is waited for before any failure returns: `serve`
+            // must be back waiting for `start` before the deferred stop sets it.
+            for (walks[0..n], threads[0..n]) |*shard_walk, thread| {
+                if (thread != null) shard_walk.done.waitUncancelable(io);
+            }
+            for (walks[0..n]) |*shard_walk| {
+                if (shard_walk.failed) return error.OutOfMemory;
+            }
+            var merge = ShardMerge.init(walks[0..n]);
+            while (merge.next()) |match| {
+                const local_pos = offset + match.pos;
+                if (try @call(.never_inline, @TypeOf(sink.*).onMatch, .{ sink, local_pos, match.len, match.id })) {
+                    return local_pos;
+                }
+            }
+        }
+        return null;
+    }
+
+    /// Appends a `Span` to `spans` for every match in `text`, in the order
+    /// `mask` meets them (by end position): at most one per position, the
+    /// pattern of the state `walk` is in there, not the shorter patterns that
+    /// end at it too or inside a longer pattern's prefix (outputs are not
+    /// followed along fail links). Other overlapping matches are reported
+    /// individually; `mask` merges them into one masked run. Reads only the
+    /// built tables, never the streaming state, so it is safe to call while
+    /// other threads use the same automaton.
+    pub fn findSpans(self: *const Aho, text: []const u8, spans: *std.ArrayList(Span)) !void {
+        const Sink = struct {
+            ac: *const Aho,
+            spans: *std.ArrayList(Span),
+
+            fn onMatch(sink: *@This(), local_pos: usize, match_len: usize, id: u32) !bool {
+                try sink.spans.append(sink.ac.allocator, .{
+                    .start = local_pos + 1 - match_len,
+                    .end = local_pos + 1,
+                    .id = id - 1,
+                });
+                return false;
             }
-            if (match_len == 0) continue;
+        };
+        var sink = Sink{ .ac = self, .spans = spans };
+        if (self.shards.len > 0) {
+            var states: [MAX_SHARDS]usize = @splat(0);
+            _ = try self.walkShards(states[0..self.shards.len], text, &sink);
+        } else {
+            var state: usize = 0;
+            _ = try self.walk(&state, text, &sink);
+        }
+    }
+
+    /// Returns the first match in `text` (the one with the smallest end
+    /// position, as `mask` meets it), or null if there is none. Stops walking at
+    /// that match and allocates nothing. Like `findSpans`, it only reads the
+    /// built tables.
+    ///
+    /// A sharded automaton's first match is the first of its shards' first
+    /// matches, so the shards are walked one after another, each only up to
+    /// the first match found so far.
+    pub fn firstMatch(self: *const Aho, text: []const u8) ?Span {
+        if (self.shards.len > 0) {
+            var first: ?Span = null;
+            for (self.shards) |*shard| {
+                const span = shard.firstMatch(if (first) |f| text[0 .. f.end - 1] else text) orelse continue;
+                first = span;
+            }
+            return first;
+        }
+        const Sink = struct {
+            match_len: usize = 0,
+            id: u32 = 0,
+
+            fn onMatch(sink: *@This(), local_pos: usize, match_len: usize, id: u32) !bool {
+                _ = local_pos;
+                sink.match_len = match_len;
+                sink.id = id;
+                return true;
+            }
+        };
+        var state: usize = 0;
+        var sink = Sink{};
+        const end = (self.walk(&state, text, &sink) catch unreachable) orelse return null;
+        return .{
+            .start = end + 1 - sink.match_len,
+            .end = end + 1,
+            .id = sink.id - 1,
+        };
+    }
+
+    /// The number of matches `mask` records as `Op`s before it gives up
+    /// deferring the output: past this many matches in one call the input is
+    /// match-dense, writing each match's bytes at once is cheaper than
+    /// bookkeeping them, so the ops so far are replayed and the rest of the
+    /// call writes straight into the output buffer.
+    const FUSE_AFTER_OPS = 1024;
+
+    /// Copies `[start, end)` of the combined reminder ++ text input to
+    /// `dst[dst_len.*..]`, splitting at the reminder/text boundary as needed.
+    fn copyRange(dst: []u8, dst_len: *usize, rem: []const u8, txt: []const u8, start: usize, end: usize) void {
+        if (end <= start) return;
+        var s = start;
+        if (s < rem.len) {
+            const e = @min(end, rem.len);
+            @memcpy(dst[dst_len.*..][0 .. e - s], rem[s..e]);
+            dst_len.* += e - s;
+            s = e;
+        }
+        if (s < end) {
+            @memcpy(dst[dst_len.*..][0 .. end - s], txt[s - rem.len .. end - rem.len]);
+            dst_len.* += end - s;
+        }
+    }
+
+    /// Records the `Op`s for the matches `walk` reports to `mask`, or, once
+    /// `FUSE_AFTER_OPS` is reached, applies them to `out` directly: an `Op`
+    /// only ever trims or stars the tail of the decided output, which the
+    /// output buffer can do in place just as well.
+    const MaskSink = struct {
+        ac: *const Aho,
+        cursor: *Cursor,
+        ops: *std.ArrayList(Op),
+        /// Absolute position up to which an `Op` already accounts for every byte
+        /// seen this call. Starts at 0, not the reminder length: the reminder is
+        /// never walked byte-by-byte, but a match's star-cap can still reach into it.
+        flushed_upto: usize = 0,
+        reminder: []const u8,
+        text: []const u8,
+        max_stars: u64,
+        /// The output buffer, sized for the whole combined input; `out_len`
+        /// bytes of it are decided while `fused`.
+        out: []u8,
+        out_len: usize = 0,
+        fused: bool = false,
+
+        /// Writes the recorded ops to `out` and switches to writing there directly.
+        fn fuse(sink: *MaskSink) void {
+            sink.replay();
+            sink.ops.clearRetainingCapacity();
+            sink.fused = true;
+        }
+
+        fn replay(sink: *MaskSink) void {
+            for (sink.ops.items) |op| {
+                switch (op) {
+                    .literal => |lit| copyRange(sink.out, &sink.out_len, sink.reminder, sink.text, lit.start, lit.end),
+                    .stars => |count| {
+                        @memset(sink.out[sink.out_len..][0..count], '*');
+                        sink.out_len += count;
+                    },
+                }
+            }
+        }
+
+        fn onMatch(sink: *MaskSink, local_pos: usize, match_len: usize, id: u32) !bool {
+            _ = id;
+            const self = sink.cursor;
+            self.matches += 1;
+            const allocator = sink.ac.allocator;
+            const pos = sink.reminder.len + local_pos;
             // This is the difference between the last character positions of the two patterns.
             const num = self.last_occur.overlapReminder(pos, match_len);
             self.last_occur.cum_len = if (num == MAX_INT) match_len else self.last_occur.cum_len + num;
@@ -457,79 +1133,122 @@ pub const Aho = struct {
             // If this difference is greater than 0 we need to limit the mask.
             // For overlapping patterns, we must account for the stars already printed by the previous pattern.
             var diff: usize = 0;
-            if (self.last_occur.cum_len > args.max_stars) {
-                diff = self.last_occur.cum_len - args.max_stars;
+            if (self.last_occur.cum_len > sink.max_stars) {
+                diff = self.last_occur.cum_len - sink.max_stars;
                 diff = @min(num, diff);
             }
+            // A match can start before this call's input when its first bytes
+            // were already emitted, e.g. after `Cursor.reset_reminder` flushed
+            // a held prefix; only the run this call pushes can be trimmed.
+            diff = @min(diff, pos + 1 - sink.flushed_upto);
             var size = match_len - diff;
             if (num < MAX_INT) {
-                if (self.last_occur.len >= args.max_stars) {
+                if (self.last_occur.len >= sink.max_stars) {
                     size = 0;
                 } else {
                     size = @min(num, size);
                 }
             }
-            if (diff > 0 or size > 0) {
-                // `pos + 1 - flushed_upto` equals `num` exactly (both the reminder
-                // and every prior match set `flushed_upto` to their own `pos + 1`),
-                // so `diff <= num` guarantees `trimTail` never reaches past this run.
-                if (pos + 1 > flushed_upto) {
-                    try ops.append(self.allocator, .{ .literal = .{ .start = flushed_upto, .end = pos + 1 } });
-                }
-                flushed_upto = pos + 1;
-                if (diff > 0) trimTail(&ops, diff);
-                if (size > 0) try ensureTailStars(&ops, self.allocator, size);
+            if (diff == 0 and size == 0) return false;
+            // The bytes since the previous match are decided now, all but the
+            // last `diff` of them, which the star-cap drops: `diff` is capped to
+            // them above. Both branches below do work bounded by those bytes and
+            // the stars, which the overlap caps likewise, so masking stays
+            // O(n + matches) however the patterns overlap.
+            const kept_upto = pos + 1 - diff;
+            if (sink.fused) {
+                copyRange(sink.out, &sink.out_len, sink.reminder, sink.text, sink.flushed_upto, kept_upto);
+                sink.flushed_upto = pos + 1;
+                const stars = @min(size, sink.out_len);
+                @memset(sink.out[sink.out_len - stars .. sink.out_len], '*');
+                return false;
             }
+            if (kept_upto > sink.flushed_upto) {
+                try sink.ops.append(allocator, .{ .literal = .{ .start = sink.flushed_upto, .end = kept_upto } });
+            }
+            sink.flushed_upto = pos + 1;
+            if (size > 0) try ensureTailStars(sink.ops, allocator, size);
+            if (sink.ops.items.len >= FUSE_AFTER_OPS) sink.fuse();
+            return false;
         }
+    };
 
-        // Pass 2: reconstruct. Copies a `[start, end)` span of the combined
-        // reminder++text input, splitting at the reminder/text boundary as needed.
-        var buf = try self.allocator.alloc(u8, input_len);
-        var buf_len: usize = 0;
-        const copyRange = struct {
-            fn call(dst: []u8, dst_len: *usize, rem: []const u8, txt: []const u8, rlen: usize, start: usize, end: usize) void {
-                if (end <= start) return;
-                var s = start;
-                if (s < rlen) {
-                    const e = @min(end, rlen);
-                    @memcpy(dst[dst_len.*..][0 .. e - s], rem[s..e]);
-                    dst_len.* += e - s;
-                    s = e;
-                }
-                if (s < end) {
-                    @memcpy(dst[dst_len.*..][0 .. end - s], txt[s - rlen .. end - rlen]);
-                    dst_len.* += end - s;
-                }
-            }
-        }.call;
+    /// Masks all patterns in `text` with `*`.
+    ///
+    /// Two passes: the first walks the automaton (see `walk`) and records an
+    /// `Op` per match instead of writing bytes, so a rare match doesn't force
+    /// output work for every byte in between. The second replays the op list
+    /// to build the output in one pass of bulk memcpy/memset.
+    ///
+    /// Only reads the automaton: all matching state lives in the cursor, so
+    /// calls with distinct cursors may run concurrently.
+    pub fn mask(self: *const Aho, args: struct {
+        /// An input string.
+        text: []const u8,
+        /// The max number of stars to mask patterns in the result.
+        max_stars: u64 = 15,
+        /// The stream to continue, for streaming mode: incomplete patterns at the end of the input are buffered
+        /// and processed on the next call. The function does not process the entire text at once if an incomplete
+        /// pattern is found at the end of the input. Instead, it saves the remainder in the cursor and uses it in
+        /// the next call, treating the input as a continuation of the previous one. Null masks `text` on its own.
+        cursor: ?*Cursor = null,
+    }) ![]u8 {
+        var one_shot = Cursor.init(self.allocator);
+        defer one_shot.deinit();
+        const is_streaming = args.cursor != null;
+        const cursor = args.cursor orelse &one_shot;
+        const reminder: []const u8 = if (cursor.reminder) |r| r else &[_]u8{};
+        const reminder_len = reminder.len;
+        const input_len = reminder_len + args.text.len;
 
-        for (ops.items) |op| {
-            switch (op) {
-                .literal => |lit| copyRange(buf, &buf_len, reminder, args.text, reminder_len, lit.start, lit.end),
-                .stars => |count| {
-                    @memset(buf[buf_len..][0..count], '*');
-                    buf_len += count;
-                },
-            }
+        // Pass 1: search. Positions are absolute (reminder ++ text) — only
+        // `args.text` is walked here since `cursor.state`/`cursor.last_occur` already
+        // reflect having consumed `reminder` in a previous call. Match-dense
+        // input switches to writing `buf` directly partway (see `FUSE_AFTER_OPS`).
+        var buf = try self.allocator.alloc(u8, input_len);
+        errdefer self.allocator.free(buf);
+        var ops = try std.ArrayList(Op).initCapacity(self.allocator, 0);
+        defer ops.deinit(self.allocator);
+        var sink = MaskSink{
+            .ac = self,
+            .cursor = cursor,
+            .ops = &ops,
+            .reminder = reminder,
+            .text = args.text,
+            .max_stars = args.max_stars,
+            .out = buf,
+        };
+        const search_started = trace.start();
+        if (self.shards.len > 0) {
+            _ = try self.walkShards(try cursor.shardStates(self), args.text, &sink);
+        } else {
+            _ = try self.walk(&cursor.state, args.text, &sink);
         }
-        copyRange(buf, &buf_len, reminder, args.text, reminder_len, flushed_upto, input_len);
+        trace.record(.search, search_started);
+
+        // Pass 2: reconstruct what is still recorded as ops, then the tail
+        // after the last match.
+        const reconstruct_started = trace.start();
+        if (!sink.fused) sink.replay();
+        copyRange(buf, &sink.out_len, reminder, args.text, sink.flushed_upto, input_len);
+        const buf_len = sink.out_len;
+        trace.record(.reconstruct, reconstruct_started);
 
         var new_reminder_len: usize = 0;
-        if (args.is_streaming) {
-            self.reset_reminder();
+        if (is_streaming) {
+            const reminder_started = trace.start();
+            defer trace.record(.reminder, reminder_started);
+            cursor.reset_reminder();
             // Only the current state's trie depth of trailing bytes can still belong to
             // a future match, so retaining more would grow the reminder without bound
             // on inputs that keep the automaton away from the starting state.
             // Masking may have shrunk the buffer below that depth; retain what exists.
-            // `self.state` is premultiplied under DFA dispatch, so recover the real node
-            // index once here (once per call, not per byte, so the division is cheap).
-            const real_state = if (use_dfa) self.state / self.num_classes else self.state;
-            new_reminder_len = @min(self.nodes.items[real_state].depth, buf_len);
+            new_reminder_len = @min(self.streamDepth(cursor), buf_len);
             if (new_reminder_len > 0) {
-                self.reminder = try self.allocator.alloc(u8, new_reminder_len);
-                @memcpy(self.reminder.?, buf[buf_len - new_reminder_len..buf_len]);
+                cursor.reminder = try cursor.allocator.alloc(u8, new_reminder_len);
+                @memcpy(cursor.reminder.?, buf[buf_len - new_reminder_len..buf_len]);
             }
-            self.last_occur.pos = self.last_occur.pos - @as(isize, @intCast(args.text.len));
+            cursor.last_occur.pos = cursor.last_occur.pos - @as(isize, @intCast(args.text.len));
         }
         if (buf_len < input_len or new_reminder_len > 0) {
             buf = try self.allocator.realloc(buf, buf_len - new_reminder_len);
@@ -537,6 +1256,33 @@ pub const Aho = struct {
         return buf;
     }
 
+    /// The `Dfa` word for a move to `next_node`.
+    fn encodeDfaWord(self: *const Aho, next_node: u32) u32 {
+        const next_state = self.dfa_states[next_node];
+        return next_state << 1 | @intFromBool(self.isChainState(next_state) or self.nodes.items[next_node].id != 0);
+    }
+
+    /// The node the DFA moves to from `node` on byte `c`, while `buildDfa`
+    /// fills `raw`: a chain node has no row, so its fail links are followed to
+    /// a node that has one, which is shallower and so already filled.
+    fn dfaNext(self: *const Aho, raw: []const u32, node: usize, c: u8) u32 {
+        var u = node;
+        while (self.isChainState(self.dfa_states[u])) {
+            if (self.chain_bytes[u] == c) return @intCast(u + 1);
+            u = self.nodes.items[u].fail;
+        }
+        return raw[self.dfa_states[u] + self.byte_class[c]];
+    }
+
+    /// Whether `buildDfa` leaves trie node `u` without a `dfa` row, see
+    /// `CHAIN_MIN_DEPTH`. Its one child is always `u + 1`: a node that no
+    /// pattern ends at was created on the way to a longer one, right before
+    /// its child.
+    fn isChainNode(self: *const Aho, u: usize) bool {
+        const node = self.nodes.items[u];
+        return node.depth >= CHAIN_MIN_DEPTH and node.id == 0 and node.edges == .one and node.edges.one.id == u + 1;
+    }
+
     /// Builds the byte-class-compressed, premultiplied DFA that `mask` dispatches
     /// through instead of `goTo`. Returns `false` (without allocating) if the
     /// projected table would exceed `DFA_MEMORY_CAP` — caller falls back to the
@@ -596,58 +1342,275 @@ pub const Aho = struct {
         }
         self.num_classes = next_class;
         const nc = self.num_classes;
-        const num_states = self.total + 1;
+        const num_nodes = self.total + 1;
+        var num_rows: usize = 0;
+        for (0..num_nodes) |u| {
+            if (!self.isChainNode(u)) num_rows += 1;
+        }
 
-        // Bail out before allocating anything if the compressed tables would still
-        // exceed the memory cap for this pattern set.
-        const entries = std.math.mul(usize, num_states, nc) catch return false;
-        const bytes_needed = std.math.mul(usize, entries, 8) catch return false;
-        if (bytes_needed > DFA_MEMORY_CAP) {
+        // Bail out before allocating anything if the compressed table would still
+        // exceed the memory cap for this pattern set. The widest state, shifted
+        // for the flag bit, picks the word size.
+        const entries = std.math.mul(usize, num_rows, nc) catch return false;
+        const max_state = entries + num_nodes - 1;
+        const narrow = max_state <= std.math.maxInt(u16) >> 1;
+        const table_bytes = std.math.mul(usize, entries, if (narrow) 2 else 4) catch return false;
+        const bytes_needed = table_bytes + num_nodes * 9 + num_rows * 4;
+        if (bytes_needed > DFA_MEMORY_CAP or max_state > std.math.maxInt(u32) >> 1) {
             return false;
         }
 
-        // Classic BFS DFA construction, but walking classes (via one representative
-        // raw byte per class) instead of all 256 raw byte values.
-        const raw = try self.allocator.alloc(u32, num_states * nc);
-        defer self.allocator.free(raw);
-
-        for (0..nc) |cl| {
-            raw[cl] = @intCast(self.nodes.items[0].child(representative[cl]) orelse 0);
+        // Rows go to the nodes that aren't chain links, in node order, so the
+        // root keeps state 0. Freed by `deinit` should anything below fail.
+        self.chain_base = entries;
+        self.dfa_states = try self.allocator.alloc(u32, num_nodes);
+        self.row_nodes = try self.allocator.alloc(u32, num_rows);
+        self.chain_bytes = try self.allocator.alloc(u8, num_nodes);
+        self.chain_ends = try self.allocator.alloc(u32, num_nodes);
+        var row: usize = 0;
+        for (0..num_nodes) |u| {
+            if (self.isChainNode(u)) {
+                self.dfa_states[u] = @intCast(self.chain_base + u);
+                self.chain_bytes[u] = self.nodes.items[u].edges.one.key;
+            } else {
+                self.dfa_states[u] = @intCast(row * nc);
+                self.row_nodes[row] = @intCast(u);
+                self.chain_bytes[u] = 0;
+                row += 1;
+            }
+        }
+        var u = num_nodes;
+        while (u > 0) {
+            u -= 1;
+            const next: u32 = @intCast(u + 1);
+            self.chain_ends[u] = if (!self.isChainNode(u)) 0 else if (self.isChainNode(next)) self.chain_ends[next] else next;
         }
 
+        // Classic BFS DFA construction, but walking classes (via one representative
+        // raw byte per class) instead of all 256 raw byte values, and a chain
+        // node's one edge instead of a row.
+        // Filled with plain next-node ids first, then encoded into `Dfa` words
+        // in place (wide) or into a narrow copy.
+        const raw = try self.allocator.alloc(u32, entries);
+        var keep_raw = false;
+        defer if (!keep_raw) self.allocator.free(raw);
+
         var queue = try std.ArrayList(usize).initCapacity(self.allocator, 0);
         defer queue.deinit(self.allocator);
         try queue.append(self.allocator, 0);
         var head: usize = 0;
         while (head < queue.items.len) {
-            const u = queue.items[head];
+            const v = queue.items[head];
             head += 1;
-            const fail_u = self.nodes.items[u].fail;
-            for (0..nc) |cl| {
+            const fail_v = self.nodes.items[v].fail;
+            if (self.isChainState(self.dfa_states[v])) {
+                const c = self.chain_bytes[v];
+                self.nodes.items[v + 1].fail = self.dfaNext(raw, fail_v, c);
+                try queue.append(self.allocator, v + 1);
+                continue;
+            }
+            const moves = raw[self.dfa_states[v]..][0..nc];
+            for (moves, 0..) |*move, cl| {
                 const c = representative[cl];
-                if (self.nodes.items[u].child(c)) |v| {
-                    if (u != 0) {
-                        self.nodes.items[v].fail = raw[fail_u * nc + cl];
+                if (self.nodes.items[v].child(c)) |w| {
+                    if (v != 0) {
+                        self.nodes.items[w].fail = self.dfaNext(raw, fail_v, c);
                     }
-                    raw[u * nc + cl] = @intCast(v);
-                    try queue.append(self.allocator, v);
-                } else if (u != 0) {
-                    raw[u * nc + cl] = raw[fail_u * nc + cl];
+                    move.* = @intCast(w);
+                    try queue.append(self.allocator, w);
+                } else {
+                    move.* = if (v == 0) 0 else self.dfaNext(raw, fail_v, c);
                 }
             }
         }
 
-        self.dfa_table = try self.allocator.alloc(u32, num_states * nc);
-        self.dfa_match = try self.allocator.alloc(u32, num_states * nc);
-        const nc32: u32 = @intCast(nc);
-        for (0..num_states * nc) |i| {
-            const next_state = raw[i];
-            self.dfa_table[i] = next_state * nc32;
-            self.dfa_match[i] = self.nodes.items[next_state].len;
+        if (narrow) {
+            const table = try self.allocator.alloc(u16, raw.len);
+            for (raw, table) |next_node, *word| {
+                word.* = @intCast(self.encodeDfaWord(next_node));
+            }
+            self.dfa = .{ .narrow = table };
+        } else {
+            for (raw) |*word| {
+                word.* = self.encodeDfaWord(word.*);
+            }
+            self.dfa = .{ .wide = raw };
+            keep_raw = true;
         }
         return true;
     }
 
+    /// Builds the automaton split into up to `num_shards` smaller ones (at
+    /// most `MAX_SHARDS`), each built with `buildDfa`, or with `build` when
+    /// `dfa` is false or its table would exceed `DFA_MEMORY_CAP`: a pattern set
+    /// too large for one DFA can still be walked through several, and large
+    /// inputs are walked through the shards concurrently (see `walkShards`).
+    ///
+    /// Walking the shards finds exactly the matches of the whole set, so
+    /// masking stays byte-for-byte the same. The walk reports the pattern
+    /// ending at the deepest state, so a pattern occurring inside another one
+    /// past its first byte hides its matches there: such patterns share a
+    /// shard. Then if a shard's state is a pattern, it is the state of the
+    /// whole set too, and no other shard's is. Patterns that only share a
+    /// prefix may go to different shards.
+    ///
+    /// Builds the automaton unsplit, like `buildDfa`/`build`, if `num_shards`
+    /// is below 2 or the patterns are all tied into one shard. Otherwise the
+    /// automaton keeps only its root node once the shards are built.
+    pub fn buildSharded(self: *Aho, num_shards: usize, dfa: bool) !void {
+        const shard_of = try self.allocator.alloc(u8, self.pidx + 1);
+        defer self.allocator.free(shard_of);
+        const used = if (num_shards < 2) 1 else try self.partition(@min(num_shards, MAX_SHARDS), shard_of);
+        if (used < 2) {
+            if (!dfa or !try self.buildDfa()) try self.build();
+            return;
+        }
+        const shards = try self.allocator.alloc(Aho, used);
+        var num_init: usize = 0;
+        errdefer {
+            for (shards[0..num_init]) |*shard| shard.deinit();
+            self.allocator.free(shards);
+        }
+        for (shards) |*shard| {
+            shard.* = try Aho.init(self.allocator);
+            num_init += 1;
+        }
+        try self.spreadPatterns(shards, shard_of);
+        for (shards) |*shard| {
+            if (!dfa or !try shard.buildDfa()) try shard.build();
+        }
+        for (self.nodes.items) |*node| node.deinitEdges(self.allocator);
+        self.nodes.shrinkAndFree(self.allocator, 1);
+        self.nodes.items[0] = .{};
+        self.shards = shards;
+    }
+
+    /// Groups the patterns for `buildSharded`: a pattern occurring inside
+    /// another one past its first byte is tied to it, and the groups of tied
+    /// patterns go to `num_shards` shards of about the same total pattern
+    /// length, largest group first. Writes the shard of every pattern
+    /// identifier to `shard_of` and returns the number of shards used, which
+    /// are the first ones. Overwrites the fail links, which `buildDfa` and
+    /// `build` compute anew.
+    fn partition(self: *Aho, num_shards: usize, shard_of: []u8) !usize {
+        const allocator = self.allocator;
+        const nodes = self.nodes.items;
+        // Union-find over the pattern identifiers, 0 for none.
+        const group = try allocator.alloc(u32, self.pidx + 1);
+        defer allocator.free(group);
+        for (group, 0..) |*g, id| g.* = @intCast(id);
+        const Groups = struct {
+            fn find(groups: []u32, id: u32) u32 {
+                var root = id;
+                while (groups[root] != root) root = groups[root];
+                var i = id;
+                while (groups[i] != root) {
+                    const up = groups[i];
+                    groups[i] = root;
+                    i = up;
+                }
+                return root;
+            }
+
+            fn tie(groups: []u32, a: u32, b: u32) void {
+                const root_a = find(groups, a);
+                const root_b = find(groups, b);
+                if (root_a < root_b) groups[root_b] = root_a else groups[root_a] = root_b;
+            }
+        };
+
+        // Breadth-first, so that a node's fail link, and what is known of the
+        // node it leads to, are in place before its children need them.
+        const queue = try allocator.alloc(u32, nodes.len);
+        defer allocator.free(queue);
+        // Per node, the nearest pattern node on its fail chain (its longest
+        // suffix that is a pattern), or 0.
+        const suffix = try allocator.alloc(u32, nodes.len);
+        defer allocator.free(suffix);
+        // Per node, a pattern tied to every `suffix` of it and of the nodes
+        // on its way from the root, or 0: every pattern below it is tied to
+        // that one, since they all contain those suffixes past their first byte.
+        const tied = try allocator.alloc(u32, nodes.len);
+        defer allocator.free(tied);
+        for (0..256) |i| {
+            self.root_moves[i] = @intCast(nodes[0].child(@intCast(i)) orelse 0);
+        }
+        queue[0] = 0;
+        suffix[0] = 0;
+        tied[0] = 0;
+        var tail: usize = 1;
+        for (0..nodes.len) |head| {
+            const u = queue[head];
+            var edges = nodes[u].edgeIterator();
+            while (edges.next()) |edge| {
+                const v = edge.id;
+                queue[tail] = v;
+                tail += 1;
+                const fail: u32 = if (u == 0) 0 else @intCast(self.goTo(nodes[u].fail, edge.key));
+                nodes[v].fail = fail;
+                suffix[v] = if (nodes[fail].id != 0) fail else suffix[fail];
+                tied[v] = tied[u];
+                if (suffix[v] != 0) {
+                    const id = nodes[suffix[v]].id;
+                    if (tied[v] == 0) tied[v] = id else Groups.tie(group, tied[v], id);
+                }
+                if (nodes[v].id != 0 and tied[v] != 0) Groups.tie(group, nodes[v].id, tied[v]);
+            }
+        }
+
+        // Weigh the groups by total pattern length, encoded variants included.
+        const weights = try allocator.alloc(u64, self.pidx + 1);
+        defer allocator.free(weights);
+        @memset(weights, 0);
+        for (nodes) |node| {
+            if (node.id != 0) weights[Groups.find(group, node.id)] += node.len;
+        }
+        var roots = try std.ArrayList(u32).initCapacity(allocator, 0);
+        defer roots.deinit(allocator);
+        for (1..group.len) |id| {
+            if (group[id] == id) try roots.append(allocator, @intCast(id));
+        }
+        const ByWeight = struct {
+            fn heavier(w: []const u64, a: u32, b: u32) bool {
+                return w[a] > w[b] or (w[a] == w[b] and a < b);
+            }
+        };
+        std.mem.sort(u32, roots.items, @as([]const u64, weights), ByWeight.heavier);
+        var loads: [MAX_SHARDS]u64 = @splat(0);
+        for (roots.items) |root| {
+            const lightest = std.mem.indexOfMin(u64, loads[0..num_shards]);
+            shard_of[root] = @intCast(lightest);
+            loads[lightest] += weights[root];
+        }
+        for (1..group.len) |id| shard_of[id] = shard_of[Groups.find(group, @intCast(id))];
+        return @min(num_shards, roots.items.len);
+    }
+
+    /// Inserts every pattern in the trie, encoded variants included, into
+    /// `shards[shard_of[id]]` under its own identifier `id`, spelling each
+    /// out along a depth-first walk.
+    fn spreadPatterns(self: *const Aho, shards: []Aho, shard_of: []const u8) !void {
+        const Visit = struct { node: u32, depth: u32, key: u8 };
+        var stack = try std.ArrayList(Visit).initCapacity(self.allocator, 0);
+        defer stack.deinit(self.allocator);
+        var path = try std.ArrayList(u8).initCapacity(self.allocator, 0);
+        defer path.deinit(self.allocator);
+        try stack.append(self.allocator, .{ .node = 0, .depth = 0, .key = 0 });
+        while (stack.pop()) |visit| {
+            const node = self.nodes.items[visit.node];
+            if (visit.depth > 0) {
+                path.shrinkRetainingCapacity(visit.depth - 1);
+                try path.append(self.allocator, visit.key);
+            }
+            if (node.id != 0) {
+                _ = try shards[shard_of[node.id]].insertAs(path.items, node.id);
+            }
+            var edges = node.edgeIterator();
+            while (edges.next()) |edge| {
+                try stack.append(self.allocator, .{ .node = edge.id, .depth = visit.depth + 1, .key = edge.key });
+            }
+        }
+    }
 };
 
 test "Aho" {
@@ -696,13 +1659,14 @@ test "Aho" {
     ac = try Aho.init(allocator);
     _ = try ac.insert("line");
     try ac.build();
+    var cursor = Cursor.init(allocator);
     var file_content = [_][]const u8{"first line\n", "second line\n", "third line\n"};
     var expected = [_][]const u8{"first ****\n", "second ****\n", "third ****\n"};
     for (0..file_content.len) |i| {
-        const buffer = try ac.mask(.{ .text= file_content[i], .is_streaming = true });
+        const buffer = try ac.mask(.{ .text= file_content[i], .cursor = &cursor });
         defer allocator.free(buffer);
         try testing.expectEqualStrings(expected[i], buffer);
-        try testing.expectEqualStrings("", ac.reminder orelse "");
+        try testing.expectEqualStrings("", cursor.reminder orelse "");
     }
 
     ac.deinit();
@@ -710,14 +1674,16 @@ test "Aho" {
     ac = try Aho.init(allocator);
     _ = try ac.insert("st line\nsecond line\nthird ");
     try ac.build();
+    cursor.deinit();
+    cursor = Cursor.init(allocator);
     file_content = [_][]const u8{"first line\n", "second line\n", "third line\n"};
     expected = [_][]const u8{"fir", "", "*line\n"};
     var expected_reminder = [_][]const u8{"st line\n", "st line\nsecond line\n", ""};
     for (0..file_content.len) |i| {
-        const buffer = try ac.mask(.{ .text= file_content[i], .is_streaming = true, .max_stars = 1 });
+        const buffer = try ac.mask(.{ .text= file_content[i], .cursor = &cursor, .max_stars = 1 });
         defer allocator.free(buffer);
         try testing.expectEqualStrings(expected[i], buffer);
-        try testing.expectEqualStrings(expected_reminder[i], ac.reminder orelse "");
+        try testing.expectEqualStrings(expected_reminder[i], cursor.reminder orelse "");
     }
 
     ac.deinit();
@@ -726,16 +1692,62 @@ test "Aho" {
     defer ac.deinit();
     _ = try ac.insert("st line\nsecond line\nthird line\n");
     try ac.build();
+    cursor.deinit();
+    cursor = Cursor.init(allocator);
+    defer cursor.deinit();
     file_content = [_][]const u8{"first line\n", "second line\n", "third line\n"};
     expected = [_][]const u8{"fir", "", ""};
     expected_reminder = [_][]const u8{"st line\n", "st line\nsecond line\n", "*"};
     for (0..file_content.len) |i| {
-        const buffer = try ac.mask(.{ .text= file_content[i], .is_streaming = true, .max_stars = 1 });
+        const buffer = try ac.mask(.{ .text= file_content[i], .cursor = &cursor, .max_stars = 1 });
         defer allocator.free(buffer);
         try testing.expectEqualStrings(expected[i], buffer);
-        try testing.expectEqualStrings(expected_reminder[i], ac.reminder orelse "");
+        try testing.expectEqualStrings(expected_reminder[i], cursor.reminder orelse "");
+    }
+    try testing.expectEqualStrings("*", cursor.reminder orelse "");
+}
+
+test "Aho masks encoded variants" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    var ac = try Aho.init(allocator);
+    defer ac.deinit();
+    const id = try ac.insertEncoded("s3cr3t/key", .{ .base64 = true, .url = true });
+    // Inserting a variant as a pattern of its own reuses the existing node.
+    try testing.expectEqual(id, try ac.insertEncoded("s3cr3t%2Fkey", .{}));
+    try testing.expectEqual(1, ac.pidx);
+    try testing.expect(try ac.buildDfa());
+
+    const masked = try ac.mask(.{ .text = "a=czNjcjN0L2tleQ== b=s3cr3t%2fkey c=s3cr3t/key" });
+    defer allocator.free(masked);
+    try testing.expectEqualStrings("a=*************** b=************ c=**********", masked);
+}
+
+test "Aho first match" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    for ([_]bool{ true, false }) |use_dfa| {
+        var ac = try Aho.init(allocator);
+        defer ac.deinit();
+        _ = try ac.insert("her");
+        _ = try ac.insert("as");
+        _ = try ac.insert("x");
+        if (use_dfa) {
+            try testing.expect(try ac.buildDfa());
+        } else {
+            try ac.build();
+        }
+        try testing.expectEqual(Aho.Span{ .start = 2, .end = 4, .id = 1 }, ac.firstMatch("a as her").?);
+        try testing.expectEqual(Aho.Span{ .start = 1, .end = 4, .id = 0 }, ac.firstMatch("ther").?);
+        // A 1-byte pattern in the last position is not skipped by the bigram gate.
+        try testing.expectEqual(Aho.Span{ .start = 4, .end = 5, .id = 2 }, ac.firstMatch("aaaax").?);
+        try testing.expectEqual(null, ac.firstMatch("no match"));
+        try testing.expectEqual(null, ac.firstMatch(""));
     }
-    try testing.expectEqualStrings("*", ac.reminder orelse "");
 }
 
 test "Aho reminder is bounded by the longest pattern prefix" {
@@ -747,30 +1759,468 @@ test "Aho reminder is bounded by the longest pattern prefix" {
     defer ac.deinit();
     _ = try ac.insert("ab");
     try ac.build();
+    var cursor = Cursor.init(allocator);
+    defer cursor.deinit();
 
     // The automaton never returns to the starting state on this input, but only
     // the trailing "a" can still be part of a match: everything else is emitted.
     var expected: []const u8 = "aaa";
     for (0..3) |i| {
-        const buffer = try ac.mask(.{ .text = "aaaa", .is_streaming = true });
+        const buffer = try ac.mask(.{ .text = "aaaa", .cursor = &cursor });
         defer allocator.free(buffer);
         if (i > 0) {
             // The retained "a" is prepended, so full chunks are emitted from now on.
             expected = "aaaa";
         }
         try testing.expectEqualStrings(expected, buffer);
-        try testing.expectEqualStrings("a", ac.reminder orelse "");
+        try testing.expectEqualStrings("a", cursor.reminder orelse "");
     }
 
     // The retained "a" combines with a "b" in the next chunk into a match.
     // The stars are withheld while a following pattern could still overlap them.
-    const masked = try ac.mask(.{ .text = "b", .is_streaming = true });
+    const masked = try ac.mask(.{ .text = "b", .cursor = &cursor });
     defer allocator.free(masked);
     try testing.expectEqualStrings("", masked);
-    try testing.expectEqualStrings("**", ac.reminder orelse "");
+    try testing.expectEqualStrings("**", cursor.reminder orelse "");
 
-    const rest = try ac.mask(.{ .text = "c", .is_streaming = true });
+    const rest = try ac.mask(.{ .text = "c", .cursor = &cursor });
     defer allocator.free(rest);
     try testing.expectEqualStrings("**c", rest);
-    try testing.expectEqualStrings("", ac.reminder orelse "");
+    try testing.expectEqualStrings("", cursor.reminder orelse "");
+}
+
+test "Aho cursors share one automaton" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    var ac = try Aho.init(allocator);
+    defer ac.deinit();
+    _ = try ac.insert("secret");
+    try testing.expect(try ac.buildDfa());
+
+    // Two interleaved streams keep their partial matches apart.
+    var a = Cursor.init(allocator);
+    defer a.deinit();
+    var b = Cursor.init(allocator);
+    defer b.deinit();
+    const chunks = [_][2][]const u8{ .{ "one sec", "two se" }, .{ "ret!", "cond" } };
+    const expected = [_][2][]const u8{ .{ "one ", "two " }, .{ "******!", "second" } };
+    for (chunks, expected) |chunk, want| {
+        for ([_]*Cursor{ &a, &b }, 0..) |cursor, i| {
+            const buffer = try ac.mask(.{ .text = chunk[i], .cursor = cursor });
+            defer allocator.free(buffer);
+            try testing.expectEqualStrings(want[i], buffer);
+        }
+    }
+    try testing.expectEqualStrings("", a.reminder orelse "");
+    try testing.expectEqualStrings("", b.reminder orelse "");
+    try testing.expectEqual(1, a.matches);
+    try testing.expectEqual(0, b.matches);
+}
+
+test "Aho cursor counts the matches findSpans reports" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    var ac = try Aho.init(allocator);
+    defer ac.deinit();
+    for ([_][]const u8{ "ash", "her", "abcd", "bc" }) |pattern| _ = try ac.insert(pattern);
+    try ac.build();
+    const text = "asher abcx abcd ash";
+    var spans = try std.ArrayList(Aho.Span).initCapacity(allocator, 0);
+    defer spans.deinit(allocator);
+    try ac.findSpans(text, &spans);
+
+    // Matches split across chunks are counted once, when they complete.
+    var cursor = Cursor.init(allocator);
+    defer cursor.deinit();
+    var start: usize = 0;
+    while (start < text.len) : (start += 3) {
+        const buffer = try ac.mask(.{ .text = text[start..@min(start + 3, text.len)], .cursor = &cursor });
+        allocator.free(buffer);
+    }
+    try testing.expectEqual(spans.items.len, cursor.matches);
+}
+
+test "Aho match completing after a flushed reminder" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    var ac = try Aho.init(allocator);
+    defer ac.deinit();
+    _ = try ac.insert("BEGIN-secret-END");
+    try ac.build();
+    var cursor = Cursor.init(allocator);
+    defer cursor.deinit();
+
+    const head = try ac.mask(.{ .text = "x BEGIN-", .max_stars = 5, .cursor = &cursor });
+    defer allocator.free(head);
+    try testing.expectEqualStrings("x ", head);
+    try testing.expectEqualStrings("BEGIN-", cursor.reminder orelse "");
+    // The caller gave up holding "BEGIN-" and emitted it masked; the state is
+    // kept, so the rest of the secret is still recognized and never emitted.
+    cursor.reset_reminder();
+    const middle = try ac.mask(.{ .text = "secret-", .max_stars = 5, .cursor = &cursor });
+    defer allocator.free(middle);
+    try testing.expectEqualStrings("", middle);
+    const tail = try ac.mask(.{ .text = "END y", .max_stars = 5, .cursor = &cursor });
+    defer allocator.free(tail);
+    try testing.expectEqualStrings(" y", tail);
+    try testing.expectEqualStrings("", cursor.reminder orelse "");
+}
+
+test "Aho ensureTailStars merges star runs" {
+    const allocator = testing.allocator;
+    var ops = try std.ArrayList(Aho.Op).initCapacity(allocator, 0);
+    defer ops.deinit(allocator);
+
+    try ops.append(allocator, .{ .literal = .{ .start = 0, .end = 10 } });
+    try Aho.ensureTailStars(&ops, allocator, 3);
+    try ops.append(allocator, .{ .literal = .{ .start = 10, .end = 11 } });
+    // Reaches through the stars into the literal before them.
+    try Aho.ensureTailStars(&ops, allocator, 5);
+    try testing.expectEqualDeep(&[_]Aho.Op{ .{ .literal = .{ .start = 0, .end = 6 } }, .{ .stars = 5 } }, ops.items);
+    // Already satisfied by the trailing run.
+    try Aho.ensureTailStars(&ops, allocator, 2);
+    try testing.expectEqual(2, ops.items.len);
+    // A whole cluster of overlapping matches, one byte each, stays one run.
+    for (11..1011) |end| {
+        try ops.append(allocator, .{ .literal = .{ .start = end, .end = end + 1 } });
+        try Aho.ensureTailStars(&ops, allocator, 1);
+    }
+    try testing.expectEqualDeep(&[_]Aho.Op{ .{ .literal = .{ .start = 0, .end = 6 } }, .{ .stars = 1005 } }, ops.items);
+    try Aho.ensureTailStars(&ops, allocator, 2000);
+    try testing.expectEqualDeep(&[_]Aho.Op{.{ .stars = 1011 }}, ops.items);
+}
+
+test "Aho fused masking of match-dense input matches the op list" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    // Overlapping patterns, capped stars and a multiline pattern, repeated far
+    // past `FUSE_AFTER_OPS` matches.
+    const unit = "x ab abc bcd abcd\nqq-token-token-tok ";
+    const text = try allocator.alloc(u8, unit.len * 2 * Aho.FUSE_AFTER_OPS);
+    defer allocator.free(text);
+    for (0..2 * Aho.FUSE_AFTER_OPS) |i| @memcpy(text[i * unit.len ..][0..unit.len], unit);
+
+    for ([_]bool{ true, false }) |dfa| {
+        var ac = try Aho.init(allocator);
+        defer ac.deinit();
+        for ([_][]const u8{ "ab", "abc", "bcd", "abcd\nqq", "token-token-tok" }) |pattern| {
+            _ = try ac.insert(pattern);
+        }
+        if (!dfa or !try ac.buildDfa()) try ac.build();
+
+        const whole = try ac.mask(.{ .text = text, .max_stars = 3 });
+        defer allocator.free(whole);
+
+        // Streaming one unit at a time never gets near the threshold.
+        var expected = try std.ArrayList(u8).initCapacity(allocator, text.len);
+        defer expected.deinit(allocator);
+        var cursor = Cursor.init(allocator);
+        defer cursor.deinit();
+        var pos: usize = 0;
+        while (pos < text.len) : (pos += unit.len) {
+            const chunk = try ac.mask(.{ .text = text[pos..][0..unit.len], .max_stars = 3, .cursor = &cursor });
+            defer allocator.free(chunk);
+            try expected.appendSlice(allocator, chunk);
+        }
+        try expected.appendSlice(allocator, cursor.reminder orelse "");
+        try testing.expectEqualStrings(expected.items, whole);
+    }
+}
+
+test "Aho cursor checkpoint and restore" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    var dfa = try Aho.init(allocator);
+    defer dfa.deinit();
+    var trie = try Aho.init(allocator);
+    defer trie.deinit();
+    for ([_]*Aho{ &dfa, &trie }) |ac| {
+        _ = try ac.insert("BEGIN-secret-END");
+        _ = try ac.insert("token");
+    }
+    try testing.expect(try dfa.buildDfa());
+    try trie.build();
+    try testing.expectEqual(dfa.fingerprint(), trie.fingerprint());
+
+    var cursor = Cursor.init(allocator);
+    defer cursor.deinit();
+    const head = try dfa.mask(.{ .text = "a token BEGIN-sec", .max_stars = 3, .cursor = &cursor });
+    defer allocator.free(head);
+    try testing.expectEqualStrings("a *** ", head);
+    const blob = try cursor.checkpoint(&dfa);
+    defer allocator.free(blob);
+    try testing.expectEqual(Cursor.CHECKPOINT_HEADER_LEN + "BEGIN-sec".len, blob.len);
+
+    // A fresh cursor over the goto/fail-link build continues the same stream.
+    var resumed = Cursor.init(allocator);
+    defer resumed.deinit();
+    try resumed.restore(&trie, blob);
+    const tail = try trie.mask(.{ .text = "ret-END tokens", .max_stars = 3, .cursor = &resumed });
+    defer allocator.free(tail);
+    try testing.expectEqualStrings("*** ***s", tail);
+
+    var other = try Aho.init(allocator);
+    defer other.deinit();
+    _ = try other.insert("token");
+    _ = try other.insert("BEGIN-secret-END");
+    try other.build();
+    try testing.expectError(error.PatternMismatch, resumed.restore(&other, blob));
+    try testing.expectError(error.InvalidCheckpoint, resumed.restore(&trie, blob[0 .. blob.len - 10]));
+    try testing.expectError(error.InvalidCheckpoint, resumed.restore(&trie, "SSC2"));
+}
+
+test "Aho narrow and wide DFA tables match the trie walk" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    var prng = std.Random.DefaultPrng.init(7);
+    const random = prng.random();
+    var patterns: [1000][12]u8 = undefined;
+    for (&patterns) |*pattern| {
+        for (pattern) |*c| c.* = "abcdefgh"[random.uintLessThan(u8, 8)];
+    }
+    var text: [64 * 1024]u8 = undefined;
+    for (&text, 0..) |*c, i| c.* = if (i % 97 < 12) patterns[i / 97 % patterns.len][i % 97] else "abcdefgh xyz"[random.uintLessThan(u8, 12)];
+
+    // A few patterns fit 16-bit words; all of them need 32-bit ones.
+    for ([_]usize{ 4, patterns.len }, [_]std.meta.Tag(Aho.Dfa){ .narrow, .wide }) |count, expected_tag| {
+        var dfa = try Aho.init(allocator);
+        defer dfa.deinit();
+        var trie = try Aho.init(allocator);
+        defer trie.deinit();
+        for (patterns[0..count]) |*pattern| {
+            _ = try dfa.insert(pattern);
+            _ = try trie.insert(pattern);
+        }
+        try testing.expect(try dfa.buildDfa());
+        try testing.expectEqual(expected_tag, std.meta.activeTag(dfa.dfa));
+        try trie.build();
+
+        const expected = try trie.mask(.{ .text = &text, .max_stars = 5 });
+        defer allocator.free(expected);
+        const masked = try dfa.mask(.{ .text = &text, .max_stars = 5 });
+        defer allocator.free(masked);
+        try testing.expectEqualStrings(expected, masked);
+        try testing.expect(std.mem.indexOfScalar(u8, masked, '*') != null);
+    }
+}
+
+test "Aho chain compression matches the trie walk" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    // 100 PEM-sized keys take ~44 MiB as full DFA rows, far over the cap.
+    const alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+    var prng = std.Random.DefaultPrng.init(11);
+    const random = prng.random();
+    var keys: [100][1700]u8 = undefined;
+    for (&keys) |*key| {
+        for (key) |*c| c.* = alphabet[random.uintLessThan(u8, alphabet.len)];
+    }
+    // Fail links into the middle of another chain, and through chains of one repeated byte.
+    const extra = [_][]const u8{ keys[0][600..700], keys[1][1650..], "a" ** 40 ++ "b", "a" ** 30 ++ "c" };
+
+    var text = try std.ArrayList(u8).initCapacity(allocator, 0);
+    defer text.deinit(allocator);
+    for (0..300) |i| {
+        const key = &keys[random.uintLessThan(usize, keys.len)];
+        switch (i % 5) {
+            0 => try text.appendSlice(allocator, key),
+            1 => try text.appendSlice(allocator, key[0..random.uintLessThan(usize, key.len)]),
+            2 => try text.appendSlice(allocator, keys[0][0..random.uintLessThan(usize, 750)]),
+            3 => try text.appendNTimes(allocator, 'a', random.uintLessThan(usize, 60)),
+            else => try text.appendSlice(allocator, keys[1][random.uintLessThan(usize, 1700)..]),
+        }
+        try text.append(allocator, alphabet[random.uintLessThan(u8, alphabet.len)]);
+    }
+
+    var dfa = try Aho.init(allocator);
+    defer dfa.deinit();
+    var trie = try Aho.init(allocator);
+    defer trie.deinit();
+    for ([_]*Aho{ &dfa, &trie }) |ac| {
+        for (&keys) |*key| _ = try ac.insert(key);
+        for (extra) |pattern| _ = try ac.insert(pattern);
+    }
+    try testing.expect(try dfa.buildDfa());
+    try testing.expect(dfa.row_nodes.len < 2000);
+    try trie.build();
+
+    const expected = try trie.mask(.{ .text = text.items, .max_stars = 5 });
+    defer allocator.free(expected);
+    const masked = try dfa.mask(.{ .text = text.items, .max_stars = 5 });
+    defer allocator.free(masked);
+    try testing.expectEqualStrings(expected, masked);
+
+    var expected_spans = try std.ArrayList(Aho.Span).initCapacity(allocator, 0);
+    defer expected_spans.deinit(allocator);
+    try trie.findSpans(text.items, &expected_spans);
+    var spans = try std.ArrayList(Aho.Span).initCapacity(allocator, 0);
+    defer spans.deinit(allocator);
+    try dfa.findSpans(text.items, &spans);
+    try testing.expectEqualSlices(Aho.Span, expected_spans.items, spans.items);
+    try testing.expect(spans.items.len > 100);
+
+    // Streamed in chunks that stop inside chains. Nested patterns are left
+    // out: a match nested in one that spans a chunk boundary is not carried
+    // over to the next call correctly on either walk.
+    var stream_dfa = try Aho.init(allocator);
+    defer stream_dfa.deinit();
+    var stream_trie = try Aho.init(allocator);
+    defer stream_trie.deinit();
+    for ([_]*Aho{ &stream_dfa, &stream_trie }) |ac| {
+        for (&keys) |*key| _ = try ac.insert(key);
+        for (extra[2..]) |pattern| _ = try ac.insert(pattern);
+    }
+    try testing.expect(try stream_dfa.buildDfa());
+    try stream_trie.build();
+    for ([_]usize{ 1, 7, 1000 }) |chunk| {
+        var outputs: [2]std.ArrayList(u8) = .{ try .initCapacity(allocator, 0), try .initCapacity(allocator, 0) };
+        defer for (&outputs) |*out| out.deinit(allocator);
+        for ([_]*Aho{ &stream_trie, &stream_dfa }, &outputs) |ac, *out| {
+            var cursor = Cursor.init(allocator);
+            defer cursor.deinit();
+            var start: usize = 0;
+            while (start < text.items.len) : (start += chunk) {
+                const part = try ac.mask(.{
+                    .text = text.items[start..@min(start + chunk, text.items.len)],
+                    .max_stars = 5,
+                    .cursor = &cursor,
+                });
+                defer allocator.free(part);
+                try out.appendSlice(allocator, part);
+            }
+        }
+        try testing.expectEqualStrings(outputs[0].items, outputs[1].items);
+    }
+}
+
+test "Aho shards match the whole pattern set" {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    // `bc` inside `abcd` hides its match in `abce`, so the two share a shard.
+    var small = try Aho.init(allocator);
+    defer small.deinit();
+    for ([_][]const u8{ "abcd", "bc", "xyz" }) |pattern| _ = try small.insert(pattern);
+    try small.buildSharded(8, true);
+    try testing.expectEqual(2, small.shards.len);
+    const small_masked = try small.mask(.{ .text = "abce bc xyz abcd" });
+    defer allocator.free(small_masked);
+    try testing.expectEqualStrings("abce ** *** ****", small_masked);
+
+    var prng = std.Random.DefaultPrng.init(13);
+    const random = prng.random();
+    var patterns: [300][10]u8 = undefined;
+    var lens: [300]usize = undefined;
+    for (&patterns, &lens) |*pattern, *len| {
+        for (pattern) |*c| c.* = "abcdef"[random.uintLessThan(u8, 6)];
+        len.* = random.intRangeAtMost(usize, 2, pattern.len);
+    }
+    // Patterns, their prefixes and noise, past one block.
+    var text = try std.ArrayList(u8).initCapacity(allocator, 0);
+    defer text.deinit(allocator);
+    while (text.items.len < Aho.SHARD_BLOCK_LEN + 4096) {
+        const pattern = &patterns[random.uintLessThan(usize, patterns.len)];
+        switch (random.uintLessThan(u8, 3)) {
+            0 => try text.appendSlice(allocator, pattern),
+            1 => try text.appendSlice(allocator, pattern[0..random.uintLessThan(usize, pattern.len)]),
+            else => try text.append(allocator, "abcdef \n"[random.uintLessThan(u8, 8)]),
+        }
+    }
+
+    // Patterns inside others, and one inside those, tie shards together.
+    const Patterns = struct {
+        fn insertNested(ac: *Aho, all: *const [300][10]u8, all_lens: []const usize) !void {
+            for (all, all_lens) |*pattern, len| _ = try ac.insertEncoded(pattern[0..len], .{ .base64 = true });
+            for (all[0..20]) |*pattern| _ = try ac.insert(pattern[1..4]);
+            _ = try ac.insert(all[0][2..3]);
+        }
+
+        fn insertFlat(ac: *Aho, all: *const [300][10]u8) !void {
+            for (all) |*pattern| _ = try ac.insert(pattern);
+        }
+    };
+    var whole = try Aho.init(allocator);
+    defer whole.deinit();
+    try Patterns.insertNested(&whole, &patterns, &lens);
+    try testing.expect(try whole.buildDfa());
+    const expected = try whole.mask(.{ .text = text.items, .max_stars = 3 });
+    defer allocator.free(expected);
+    var expected_spans = try std.ArrayList(Aho.Span).initCapacity(allocator, 0);
+    defer expected_spans.deinit(allocator);
+    try whole.findSpans(text.items, &expected_spans);
+    try testing.expect(expected_spans.items.len > 100_000);
+
+    // Streamed in chunks; nested patterns are left out, see "Aho chain
+    // compression matches the trie walk".
+    var flat = try Aho.init(allocator);
+    defer flat.deinit();
+    try Patterns.insertFlat(&flat, &patterns);
+    try testing.expect(try flat.buildDfa());
+
+    for ([_]usize{ 2, 5, Aho.MAX_SHARDS }, [_]bool{ true, false, true }) |num_shards, dfa| {
+        var sharded = try Aho.init(allocator);
+        defer sharded.deinit();
+        try Patterns.insertNested(&sharded, &patterns, &lens);
+        try sharded.buildSharded(num_shards, dfa);
+        try testing.expect(sharded.shards.len > 1 and sharded.shards.len <= num_shards);
+        try testing.expectEqual(dfa, sharded.usesDfa());
+
+        // Long enough to walk the shards on threads, across two blocks.
+        const masked = try sharded.mask(.{ .text = text.items, .max_stars = 3 });
+        defer allocator.free(masked);
+        try testing.expectEqualStrings(expected, masked);
+        var spans = try std.ArrayList(Aho.Span).initCapacity(allocator, 0);
+        defer spans.deinit(allocator);
+        try sharded.findSpans(text.items, &spans);
+        try testing.expectEqualSlices(Aho.Span, expected_spans.items, spans.items);
+        for ([_]usize{ 0, 5000, text.items.len - 20, text.items.len }) |start| {
+            try testing.expectEqualDeep(whole.firstMatch(text.items[start..]), sharded.firstMatch(text.items[start..]));
+        }
+
+        var flat_sharded = try Aho.init(allocator);
+        defer flat_sharded.deinit();
+        try Patterns.insertFlat(&flat_sharded, &patterns);
+        try flat_sharded.buildSharded(num_shards, dfa);
+        try testing.expectEqual(num_shards, flat_sharded.shards.len);
+        // Checkpointed halfway into a fresh cursor.
+        const streamed = text.items[0 .. 64 * 1024];
+        var outputs: [2]std.ArrayList(u8) = .{ try .initCapacity(allocator, 0), try .initCapacity(allocator, 0) };
+        defer for (&outputs) |*out| out.deinit(allocator);
+        for ([_]*Aho{ &flat, &flat_sharded }, &outputs) |ac, *out| {
+            var cursor = Cursor.init(allocator);
+            defer cursor.deinit();
+            var start: usize = 0;
+            while (start < streamed.len) : (start += 7) {
+                if (start == 7 * 4000) {
+                    const blob = try cursor.checkpoint(ac);
+                    defer allocator.free(blob);
+                    cursor.deinit();
+                    cursor = Cursor.init(allocator);
+                    try cursor.restore(ac, blob);
+                    if (ac == &flat_sharded) try testing.expectError(error.PatternMismatch, cursor.restore(&flat, blob));
+                }
+                const chunk = streamed[start..@min(start + 7, streamed.len)];
+                const part = try ac.mask(.{ .text = chunk, .max_stars = 3, .cursor = &cursor });
+                defer allocator.free(part);
+                try out.appendSlice(allocator, part);
+            }
+        }
+        try testing.expectEqualStrings(outputs[0].items, outputs[1].items);
+        try testing.expect(std.mem.indexOfScalar(u8, outputs[1].items, '*') != null);
+    }
 }
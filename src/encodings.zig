@@ -0,0 +1,261 @@
+//! Encoded variants of a search pattern: the forms a secret takes after it has
+//! been base64-encoded, percent-encoded or JSON-escaped on its way into a log.
+//!
+//! `Aho.insertEncoded` inserts every variant into the same trie as the raw
+//! pattern, so the build and the scan stay a single pass over the input, and
+//! identical variants (e.g. the URL form of a pattern with nothing to escape)
+//! collapse into one trie path.
+const std = @import("std");
+const testing = std.testing;
+
+/// The set of encodings to generate variants for. Bit positions are part of
+/// the C ABI (`ss_insert_encoded`) and mirrored by `secretsweeper._core`.
+pub const Encodings = packed struct(u32) {
+    /// Standard base64 (RFC 4648 §4), standalone and embedded in a longer blob.
+    base64: bool = false,
+    /// URL-safe base64 without padding (RFC 4648 §5), as used by JWTs.
+    base64url: bool = false,
+    /// Percent-encoding (RFC 3986), with upper- and lowercase hex digits.
+    url: bool = false,
+    /// JSON string escaping, including the `\u00XX` forms Go and Python emit.
+    json: bool = false,
+    _padding: u28 = 0,
+};
+
+/// Shorter fragments of a base64 blob are too likely to occur by chance in
+/// unrelated base64 data (a 64^-8 chance per position at this length), so the
+/// embedded variants of short patterns are skipped; the standalone encoding is
+/// always generated.
+const MIN_EMBEDDED_BASE64_LEN = 8;
+
+/// Collects the encoded variants of one pattern into a reusable buffer.
+pub const Variants = struct {
+    allocator: std.mem.Allocator,
+    /// All variants, back to back.
+    bytes: std.ArrayList(u8),
+    /// The end offset of each variant in `bytes`.
+    ends: std.ArrayList(usize),
+
+    pub fn init(allocator: std.mem.Allocator) !Variants {
+        return .{
+            .allocator = allocator,
+            .bytes = try std.ArrayList(u8).initCapacity(allocator, 0),
+            .ends = try std.ArrayList(usize).initCapacity(allocator, 0),
+        };
+    }
+
+    pub fn deinit(self: *Variants) void {
+        self.bytes.deinit(self.allocator);
+        self.ends.deinit(self.allocator);
+    }
+
+    /// The number of collected variants.
+    pub fn count(self: *const Variants) usize {
+        return self.ends.items.len;
+    }
+
+    /// Returns the `i`-th collected variant.
+    pub fn get(self: *const Variants, i: usize) []const u8 {
+        const start = if (i == 0) 0 else self.ends.items[i - 1];
+        return self.bytes.items[start..self.ends.items[i]];
+    }
+
+    /// Replaces the collected variants with those of `pattern` for `encodings`.
+    /// Variants equal to the raw pattern are dropped.
+    pub fn generate(self: *Variants, pattern: []const u8, encodings: Encodings) !void {
+        self.bytes.clearRetainingCapacity();
+        self.ends.clearRetainingCapacity();
+        if (pattern.len == 0) return;
+        if (encodings.base64) try self.addBase64(pattern, &std.base64.standard, &std.base64.standard_no_pad);
+        if (encodings.base64url) try self.addBase64(pattern, null, &std.base64.url_safe_no_pad);
+        if (encodings.url) {
+            try self.addPercent(pattern, "0123456789ABCDEF");
+            try self.addPercent(pattern, "0123456789abcdef");
+        }
+        if (encodings.json) {
+            try self.addJson(pattern, .{});
+            try self.addJson(pattern, .{ .html_safe = true });
+            try self.addJson(pattern, .{ .ascii_only = true });
+        }
+        // Keep only the variants that differ from the raw pattern and from each
+        // other; the trie would merge duplicates anyway, this just spares the walk.
+        var kept: usize = 0;
+        var write: usize = 0;
+        for (0..self.count()) |i| {
+            const variant = self.get(i);
+            var duplicate = std.mem.eql(u8, variant, pattern);
+            for (0..kept) |j| {
+                if (duplicate) break;
+                duplicate = std.mem.eql(u8, variant, self.get(j));
+            }
+            if (duplicate) continue;
+            std.mem.copyForwards(u8, self.bytes.items[write..][0..variant.len], variant);
+            write += variant.len;
+            self.ends.items[kept] = write;
+            kept += 1;
+        }
+        self.ends.shrinkRetainingCapacity(kept);
+        self.bytes.shrinkRetainingCapacity(write);
+    }
+
+    fn push(self: *Variants, variant: []const u8) !void {
+        try self.bytes.appendSlice(self.allocator, variant);
+        try self.ends.append(self.allocator, self.bytes.items.len);
+    }
+
+    /// Adds the standalone encoding (padded with `padded` when given) and the
+    /// three alignment-dependent fragments that appear when the pattern sits at
+    /// an arbitrary byte offset inside a longer base64 blob: only the output
+    /// characters whose 6 bits all come from the pattern itself are kept.
+    fn addBase64(
+        self: *Variants,
+        pattern: []const u8,
+        padded: ?*const std.base64.Codecs,
+        unpadded: *const std.base64.Codecs,
+    ) !void {
+        const codecs = padded orelse unpadded;
+        const standalone = try self.bytes.addManyAsSlice(self.allocator, codecs.Encoder.calcSize(pattern.len));
+        _ = codecs.Encoder.encode(standalone, pattern);
+        try self.ends.append(self.allocator, self.bytes.items.len);
+
+        const shifted = try self.allocator.alloc(u8, pattern.len + 2);
+        defer self.allocator.free(shifted);
+        const encoded = try self.allocator.alloc(u8, unpadded.Encoder.calcSize(shifted.len));
+        defer self.allocator.free(encoded);
+        for (0..3) |shift| {
+            const source = shifted[0 .. shift + pattern.len];
+            @memset(source[0..shift], 0);
+            @memcpy(source[shift..], pattern);
+            const out = unpadded.Encoder.encode(encoded, source);
+            // Characters covering bits [6k, 6k + 6) are pattern-only when they
+            // start at or after the `shift` filler bytes and end within the input.
+            const first = (8 * shift + 5) / 6;
+            const last = (8 * source.len) / 6;
+            if (last < first or last - first < MIN_EMBEDDED_BASE64_LEN) continue;
+            try self.push(out[first..last]);
+        }
+    }
+
+    /// Adds the percent-encoded form: every byte outside the RFC 3986
+    /// unreserved set becomes `%XX` with the given hex `digits`.
+    fn addPercent(self: *Variants, pattern: []const u8, digits: *const [16]u8) !void {
+        for (pattern) |c| {
+            if (std.ascii.isAlphanumeric(c) or c == '-' or c == '.' or c == '_' or c == '~') {
+                try self.bytes.append(self.allocator, c);
+            } else {
+                try self.bytes.appendSlice(self.allocator, &.{ '%', digits[c >> 4], digits[c & 0xf] });
+            }
+        }
+        try self.ends.append(self.allocator, self.bytes.items.len);
+    }
+
+    const JsonStyle = struct {
+        /// Escape `<`, `>` and `&` like Go's `encoding/json` (and so Terraform) does.
+        html_safe: bool = false,
+        /// Escape non-ASCII code points like Python's `json.dumps` does by default.
+        ascii_only: bool = false,
+    };
+
+    /// Adds the body of the JSON string literal encoding the pattern, without
+    /// the surrounding quotes. `ascii_only` is skipped for invalid UTF-8, which
+    /// JSON encoders reject or replace rather than escape.
+    fn addJson(self: *Variants, pattern: []const u8, style: JsonStyle) !void {
+        var it = (std.unicode.Utf8View.init(pattern) catch {
+            if (style.ascii_only) return;
+            try self.addJsonBytes(pattern, style);
+            try self.ends.append(self.allocator, self.bytes.items.len);
+            return;
+        }).iterator();
+        while (it.nextCodepointSlice()) |slice| {
+            if (slice.len == 1 or !style.ascii_only) {
+                try self.addJsonBytes(slice, style);
+                continue;
+            }
+            const cp = std.unicode.utf8Decode(slice) catch unreachable;
+            if (cp >= 0x10000) {
+                const v = cp - 0x10000;
+                try self.addUnicodeEscape(@intCast(0xd800 + (v >> 10)));
+                try self.addUnicodeEscape(@intCast(0xdc00 + (v & 0x3ff)));
+            } else {
+                try self.addUnicodeEscape(@intCast(cp));
+            }
+        }
+        try self.ends.append(self.allocator, self.bytes.items.len);
+    }
+
+    fn addJsonBytes(self: *Variants, bytes: []const u8, style: JsonStyle) !void {
+        for (bytes) |c| {
+            const escape: ?u8 = switch (c) {
+                '"' => '"',
+                '\\' => '\\',
+                '\n' => 'n',
+                '\r' => 'r',
+                '\t' => 't',
+                0x08 => 'b',
+                0x0c => 'f',
+                else => null,
+            };
+            if (escape) |e| {
+                try self.bytes.appendSlice(self.allocator, &.{ '\\', e });
+            } else if (c < 0x20 or (style.html_safe and (c == '<' or c == '>' or c == '&'))) {
+                try self.addUnicodeEscape(c);
+            } else {
+                try self.bytes.append(self.allocator, c);
+            }
+        }
+    }
+
+    fn addUnicodeEscape(self: *Variants, unit: u16) !void {
+        const digits = "0123456789abcdef";
+        try self.bytes.appendSlice(self.allocator, &.{
+            '\\',
+            'u',
+            digits[unit >> 12],
+            digits[(unit >> 8) & 0xf],
+            digits[(unit >> 4) & 0xf],
+            digits[unit & 0xf],
+        });
+    }
+};
+
+fn expectVariants(pattern: []const u8, encodings: Encodings, expected: []const []const u8) !void {
+    var variants = try Variants.init(testing.allocator);
+    defer variants.deinit();
+    try variants.generate(pattern, encodings);
+    try testing.expectEqual(expected.len, variants.count());
+    for (expected, 0..) |e, i| {
+        try testing.expectEqualStrings(e, variants.get(i));
+    }
+}
+
+test "base64 variants" {
+    // The standalone encoding, then the pattern-only characters of the pattern
+    // encoded at offsets 0, 1 and 2 (mod 3) of a longer blob.
+    try expectVariants("hunter2secret", .{ .base64 = true }, &.{
+        "aHVudGVyMnNlY3JldA==",
+        "aHVudGVyMnNlY3Jld",
+        "h1bnRlcjJzZWNyZX",
+        "odW50ZXIyc2VjcmV0",
+    });
+    // Too short for the embedded fragments: only the standalone form is kept.
+    try expectVariants("pw", .{ .base64 = true }, &.{"cHc="});
+    try expectVariants("a?b>", .{ .base64url = true }, &.{"YT9iPg"});
+}
+
+test "percent-encoded variants" {
+    try expectVariants("p@ss/w?rd", .{ .url = true }, &.{ "p%40ss%2Fw%3Frd", "p%40ss%2fw%3frd" });
+    // Nothing to escape: the variant equals the raw pattern and is dropped.
+    try expectVariants("plain-token_1.0~", .{ .url = true }, &.{});
+}
+
+test "JSON-escaped variants" {
+    try expectVariants("a\"b\\c\nd<e>", .{ .json = true }, &.{
+        "a\\\"b\\\\c\\nd<e>",
+        "a\\\"b\\\\c\\nd\\u003ce\\u003e",
+    });
+    try expectVariants("пароль\x01", .{ .json = true }, &.{
+        "пароль\\u0001",
+        "\\u043f\\u0430\\u0440\\u043e\\u043b\\u044c\\u0001",
+    });
+    try expectVariants("\xf0\x9f\x94\x91", .{ .json = true }, &.{"\\ud83d\\udd11"});
+}
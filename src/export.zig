@@ -1,11 +1,15 @@
 //! C ABI exports over the Aho-Corasick automaton, consumed by the Python
-//! `secretsweeper._core` module through ctypes.
+//! `secretsweeper._ctypes_lib` module, the ctypes fallback for `_native`.
 //!
 //! Every function returning `i32` uses 0 for success and -1 for an allocation
-//! failure. Buffers returned via `ss_mask` are owned by the caller and must be
-//! released with `ss_free`.
+//! failure, unless documented otherwise. Buffers returned via `ss_mask` and
+//! `ss_cursor_checkpoint` are owned by the caller and must be released with
+//! `ss_free`.
 const std = @import("std");
 const Aho = @import("aho.zig").Aho;
+const Cursor = @import("aho.zig").Cursor;
+const Encodings = @import("encodings.zig").Encodings;
+const trace = @import("trace.zig");
 
 const allocator = std.heap.c_allocator;
 
@@ -31,12 +35,21 @@ export fn ss_insert(ac: *Aho, pattern: [*]const u8, len: usize) i32 {
     return 0;
 }
 
+/// Insert a search pattern together with its encoded variants, selected by the
+/// `Encodings` bit set. Must be called before `ss_build`.
+export fn ss_insert_encoded(ac: *Aho, pattern: [*]const u8, len: usize, encodings: u32) i32 {
+    _ = ac.insertEncoded(pattern[0..len], @bitCast(encodings)) catch return -1;
+    return 0;
+}
+
 /// Builds whichever representation `mask` will use — never both. Tries the DFA
 /// first; falls back to the classic goto/fail-link build only if the pattern
 /// set exceeds `Aho.DFA_MEMORY_CAP`. Call once, after all patterns are
 /// inserted, even for automatons reused across many `ss_mask` calls (e.g.
 /// `StreamWrapper`).
 export fn ss_build(ac: *Aho) i32 {
+    const started = trace.start();
+    defer trace.record(.build, started);
     const dfa_ok = ac.buildDfa() catch return -1;
     if (!dfa_ok) {
         ac.build() catch return -1;
@@ -44,27 +57,54 @@ export fn ss_build(ac: *Aho) i32 {
     return 0;
 }
 
+/// Like `ss_build`, but splits the patterns into up to `num_shards` automatons
+/// that `ss_mask`, `ss_find_spans` and `ss_first_match` walk side by side, on
+/// a thread per shard for large inputs (see `Aho.buildSharded`); a nonzero
+/// `fallback` skips the DFA like `ss_build_fallback`. The results stay the
+/// same as with `ss_build`.
+export fn ss_build_sharded(ac: *Aho, num_shards: usize, fallback: i32) i32 {
+    const started = trace.start();
+    defer trace.record(.build, started);
+    ac.buildSharded(num_shards, fallback == 0) catch return -1;
+    return 0;
+}
+
+/// Returns 1 if `ss_build` built the DFA that `ss_mask` dispatches through (for
+/// every shard, after `ss_build_sharded`), or 0 if the pattern set exceeded
+/// `Aho.DFA_MEMORY_CAP` and it fell back to the goto/fail-link walk (or
+/// `ss_build_fallback` forced it).
+export fn ss_uses_dfa(ac: *const Aho) i32 {
+    return @intFromBool(ac.usesDfa());
+}
+
 /// Test-only: builds the classic goto/fail-link representation unconditionally,
 /// skipping the DFA attempt `ss_build` always makes first. Pattern sets small
 /// enough for the DFA otherwise never exercise this path in normal use, so tests
 /// that want to cover both need a way to force it — see
 /// `secretsweeper._core._build_automaton`.
 export fn ss_build_fallback(ac: *Aho) i32 {
+    const started = trace.start();
+    defer trace.record(.build, started);
     ac.build() catch return -1;
     return 0;
 }
 
 /// Mask all patterns in the text with the star character.
 ///
+/// With a `cursor` (see `ss_cursor_new`), the text continues that cursor's
+/// stream: a trailing partial match is held back as the cursor's reminder.
+/// Without one, the text is masked on its own. The automaton is only read, so
+/// calls with distinct cursors may run concurrently.
+///
 /// On success writes the result buffer to `out_ptr`/`out_len` and returns 0.
 /// An empty result is reported as a null `out_ptr` with `out_len` 0 and needs
 /// no `ss_free` call.
 export fn ss_mask(
-    ac: *Aho,
+    ac: *const Aho,
+    cursor: ?*Cursor,
     text: [*]const u8,
     len: usize,
     max_stars: u64,
-    is_streaming: bool,
     out_ptr: *?[*]u8,
     out_len: *usize,
 ) i32 {
@@ -73,7 +113,7 @@ export fn ss_mask(
     const masked = ac.mask(.{
         .text = text[0..len],
         .max_stars = max_stars,
-        .is_streaming = is_streaming,
+        .cursor = cursor,
     }) catch return -1;
     if (masked.len == 0) {
         allocator.free(masked);
@@ -86,6 +126,51 @@ export fn ss_mask(
     return 0;
 }
 
+/// Find every match in the text without masking it.
+///
+/// On success writes an array of `out_count` (start, end, pattern id) spans to
+/// `out_ptr` and returns 0; release it with `ss_free_spans`. No matches are
+/// reported as a null `out_ptr` with `out_count` 0. Only reads the built
+/// automaton, so it may run concurrently with other calls on the same handle.
+export fn ss_find_spans(
+    ac: *const Aho,
+    text: [*]const u8,
+    len: usize,
+    out_ptr: *?[*]Aho.Span,
+    out_count: *usize,
+) i32 {
+    var spans = std.ArrayList(Aho.Span).initCapacity(allocator, 0) catch return -1;
+    ac.findSpans(text[0..len], &spans) catch {
+        spans.deinit(allocator);
+        return -1;
+    };
+    const owned = spans.toOwnedSlice(allocator) catch {
+        spans.deinit(allocator);
+        return -1;
+    };
+    out_ptr.* = if (owned.len > 0) owned.ptr else null;
+    out_count.* = owned.len;
+    return 0;
+}
+
+/// Find the first match in the text, stopping the scan there.
+///
+/// Returns 1 and writes the match to `out` if there is one, 0 otherwise.
+/// Allocates nothing and, like `ss_find_spans`, only reads the automaton.
+export fn ss_first_match(ac: *const Aho, text: [*]const u8, len: usize, out: *Aho.Span) i32 {
+    out.* = ac.firstMatch(text[0..len]) orelse return 0;
+    return 1;
+}
+
+/// Release a span array returned by `ss_find_spans`.
+export fn ss_free_spans(ptr: ?[*]Aho.Span, count: usize) void {
+    if (ptr) |p| {
+        if (count > 0) {
+            allocator.free(p[0..count]);
+        }
+    }
+}
+
 /// Release a buffer returned by `ss_mask`.
 export fn ss_free(ptr: ?[*]u8, len: usize) void {
     if (ptr) |p| {
@@ -95,11 +180,25 @@ export fn ss_free(ptr: ?[*]u8, len: usize) void {
     }
 }
 
-/// Get the streaming-mode reminder. Returns a pointer into the automaton's
-/// internal state that stays valid until the next `ss_mask`/`ss_reset_reminder`
-/// call; the caller must copy it and must not free it.
-export fn ss_get_reminder(ac: *Aho, out_len: *usize) ?[*]const u8 {
-    const reminder = ac.reminder orelse {
+/// Create a streaming cursor, usable with any automaton. Returns null on
+/// allocation failure.
+export fn ss_cursor_new() ?*Cursor {
+    const cursor = allocator.create(Cursor) catch return null;
+    cursor.* = Cursor.init(allocator);
+    return cursor;
+}
+
+/// Destroy a cursor created with `ss_cursor_new`.
+export fn ss_cursor_destroy(cursor: *Cursor) void {
+    cursor.deinit();
+    allocator.destroy(cursor);
+}
+
+/// Get the cursor's streaming-mode reminder. Returns a pointer into the cursor
+/// that stays valid until the next `ss_mask`/`ss_reset_reminder` call with it;
+/// the caller must copy it and must not free it.
+export fn ss_get_reminder(cursor: *const Cursor, out_len: *usize) ?[*]const u8 {
+    const reminder = cursor.reminder orelse {
         out_len.* = 0;
         return null;
     };
@@ -107,13 +206,64 @@ export fn ss_get_reminder(ac: *Aho, out_len: *usize) ?[*]const u8 {
     return reminder.ptr;
 }
 
-/// Reset the streaming-mode reminder.
-export fn ss_reset_reminder(ac: *Aho) void {
-    ac.reset_reminder();
+/// The number of matches `ss_mask` has met on the cursor's stream since it was
+/// created, as many as `ss_find_spans` reports over everything it was given.
+export fn ss_cursor_matches(cursor: *const Cursor) u64 {
+    return cursor.matches;
+}
+
+/// Reset the cursor's streaming-mode reminder.
+export fn ss_reset_reminder(cursor: *Cursor) void {
+    cursor.reset_reminder();
+}
+
+/// Serialize the cursor's stream state over the automaton (see
+/// `Cursor.checkpoint`). On success writes the blob to `out_ptr`/`out_len` and
+/// returns 0; release it with `ss_free`.
+export fn ss_cursor_checkpoint(ac: *const Aho, cursor: *const Cursor, out_ptr: *[*]u8, out_len: *usize) i32 {
+    const blob = cursor.checkpoint(ac) catch return -1;
+    out_ptr.* = blob.ptr;
+    out_len.* = blob.len;
+    return 0;
+}
+
+/// Replace the cursor's stream state with a blob from `ss_cursor_checkpoint`.
+/// Returns 0 on success, 1 for a malformed blob, 2 for a blob taken over
+/// different patterns, and -1 on allocation failure; the cursor is left
+/// unchanged on any failure.
+export fn ss_cursor_restore(ac: *const Aho, cursor: *Cursor, blob: [*]const u8, len: usize) i32 {
+    cursor.restore(ac, blob[0..len]) catch |err| return switch (err) {
+        error.InvalidCheckpoint => 1,
+        error.PatternMismatch => 2,
+        error.OutOfMemory => -1,
+    };
+    return 0;
+}
+
+/// Turn the latency histograms of `trace.zig` on (nonzero) or off.
+export fn ss_trace_enable(on: i32) void {
+    trace.setEnabled(on != 0);
+}
+
+/// Copy the latency histograms to `out`, which holds `out_len` u64s (see
+/// `trace.snapshot` for the layout). Returns the number of u64s a full copy
+/// takes; nothing is written if `out_len` is smaller.
+export fn ss_trace_snapshot(out: ?[*]u64, out_len: usize) usize {
+    if (out) |words| {
+        if (out_len >= trace.SNAPSHOT_LEN) trace.snapshot(words[0..trace.SNAPSHOT_LEN]);
+    }
+    return trace.SNAPSHOT_LEN;
+}
+
+/// Zero the latency histograms.
+export fn ss_trace_reset() void {
+    trace.reset();
 }
 
 test {
     _ = @import("aho.zig");
+    _ = @import("encodings.zig");
+    _ = @import("trace.zig");
 }
 
 test "C ABI roundtrip" {
@@ -122,10 +272,11 @@ test "C ABI roundtrip" {
 
     try std.testing.expectEqual(0, ss_insert(ac, "her", 3));
     try std.testing.expectEqual(0, ss_build(ac));
+    try std.testing.expectEqual(1, ss_uses_dfa(ac));
 
     var out_ptr: ?[*]u8 = null;
     var out_len: usize = 0;
-    try std.testing.expectEqual(0, ss_mask(ac, "asher", 5, 15, false, &out_ptr, &out_len));
+    try std.testing.expectEqual(0, ss_mask(ac, null, "asher", 5, 15, &out_ptr, &out_len));
     defer ss_free(out_ptr, out_len);
     try std.testing.expectEqualStrings("as***", out_ptr.?[0..out_len]);
 }
@@ -136,11 +287,11 @@ test "C ABI roundtrip via forced fallback build" {
 
     try std.testing.expectEqual(0, ss_insert(ac, "her", 3));
     try std.testing.expectEqual(0, ss_build_fallback(ac));
-    try std.testing.expectEqual(0, ac.dfa_table.len); // confirms the DFA was skipped
+    try std.testing.expectEqual(0, ss_uses_dfa(ac)); // confirms the DFA was skipped
 
     var out_ptr: ?[*]u8 = null;
     var out_len: usize = 0;
-    try std.testing.expectEqual(0, ss_mask(ac, "asher", 5, 15, false, &out_ptr, &out_len));
+    try std.testing.expectEqual(0, ss_mask(ac, null, "asher", 5, 15, &out_ptr, &out_len));
     defer ss_free(out_ptr, out_len);
     try std.testing.expectEqualStrings("as***", out_ptr.?[0..out_len]);
 }
@@ -152,14 +303,63 @@ test "C ABI streaming roundtrip" {
     try std.testing.expectEqual(0, ss_insert(ac, "her", 3));
     try std.testing.expectEqual(0, ss_build(ac));
 
+    const cursor = ss_cursor_new().?;
+    defer ss_cursor_destroy(cursor);
     var out_ptr: ?[*]u8 = null;
     var out_len: usize = 0;
     // "ashe" ends with a partial match: "he" is held back as the reminder.
-    try std.testing.expectEqual(0, ss_mask(ac, "ashe", 4, 15, true, &out_ptr, &out_len));
+    try std.testing.expectEqual(0, ss_mask(ac, cursor, "ashe", 4, 15, &out_ptr, &out_len));
     try std.testing.expectEqualStrings("as", out_ptr.?[0..out_len]);
     ss_free(out_ptr, out_len);
+    var reminder_len: usize = 0;
+    try std.testing.expectEqualStrings("he", ss_get_reminder(cursor, &reminder_len).?[0..reminder_len]);
+    // A checkpoint carries the stream, reminder included, over to a fresh cursor.
+    var blob_ptr: [*]u8 = undefined;
+    var blob_len: usize = 0;
+    try std.testing.expectEqual(0, ss_cursor_checkpoint(ac, cursor, &blob_ptr, &blob_len));
+    defer ss_free(blob_ptr, blob_len);
+    const resumed = ss_cursor_new().?;
+    defer ss_cursor_destroy(resumed);
+    try std.testing.expectEqual(1, ss_cursor_restore(ac, resumed, blob_ptr, 4));
+    try std.testing.expectEqual(0, ss_cursor_restore(ac, resumed, blob_ptr, blob_len));
     // "rs" completes "her": the reminder is flushed, output longer than input.
-    try std.testing.expectEqual(0, ss_mask(ac, "rs", 2, 15, true, &out_ptr, &out_len));
+    try std.testing.expectEqual(0, ss_mask(ac, resumed, "rs", 2, 15, &out_ptr, &out_len));
     try std.testing.expectEqualStrings("***s", out_ptr.?[0..out_len]);
     ss_free(out_ptr, out_len);
 }
+
+test "C ABI find spans" {
+    const ac = ss_new().?;
+    defer ss_destroy(ac);
+
+    try std.testing.expectEqual(0, ss_insert(ac, "her", 3));
+    try std.testing.expectEqual(0, ss_insert(ac, "as", 2));
+    try std.testing.expectEqual(0, ss_build(ac));
+
+    var out_ptr: ?[*]Aho.Span = null;
+    var out_count: usize = 0;
+    try std.testing.expectEqual(0, ss_find_spans(ac, "asher", 5, &out_ptr, &out_count));
+    try std.testing.expectEqualSlices(
+        Aho.Span,
+        &.{ .{ .start = 0, .end = 2, .id = 1 }, .{ .start = 2, .end = 5, .id = 0 } },
+        out_ptr.?[0..out_count],
+    );
+    ss_free_spans(out_ptr, out_count);
+
+    try std.testing.expectEqual(0, ss_find_spans(ac, "none", 4, &out_ptr, &out_count));
+    try std.testing.expectEqual(null, out_ptr);
+    try std.testing.expectEqual(0, out_count);
+}
+
+test "C ABI first match" {
+    const ac = ss_new().?;
+    defer ss_destroy(ac);
+
+    try std.testing.expectEqual(0, ss_insert(ac, "her", 3));
+    try std.testing.expectEqual(0, ss_build(ac));
+
+    var span: Aho.Span = undefined;
+    try std.testing.expectEqual(1, ss_first_match(ac, "asher her", 9, &span));
+    try std.testing.expectEqual(Aho.Span{ .start = 2, .end = 5, .id = 0 }, span);
+    try std.testing.expectEqual(0, ss_first_match(ac, "ashe", 4, &span));
+}
@@ -1,38 +1,67 @@
 //! CPython extension module `secretsweeper._native`.
 //!
-//! Hot-path binding only: `masking_read` runs once per console line, and the
-//! generic ctypes marshaling dominates its cost (~700ns per call, measured
-//! against ~40ns of automaton work). This module receives the Python argument
-//! objects directly (METH_FASTCALL) and builds the result bytes in native
-//! code, cutting the per-call overhead to the level of a builtin function.
-//! Cold-path calls (automaton construction, reminders, destruction) stay on
-//! ctypes in `secretsweeper._core`, which also keeps a full ctypes fallback
+//! The whole automaton API as builtin functions: `masking_read` runs once per
+//! console line, and generic ctypes marshaling dominated its cost (~700ns per
+//! call, measured against ~40ns of automaton work); construction and the
+//! reminder calls pay the same toll on every short-lived `StreamWrapper`. This
+//! module receives the Python argument objects directly (METH_FASTCALL) and
+//! builds the results in native code, cutting the per-call overhead to the
+//! level of a builtin function. The read-only scans (`find_spans`,
+//! `first_match`) take any buffer object without copying it and release the
+//! GIL while they walk the input. `secretsweeper._ctypes_lib` mirrors this
+//! API over the ctypes shared library, and `_core` only loads it as a fallback
 //! for platforms where this extension is not built.
 //!
 //! Uses the CPython stable ABI (available since Python 3.2, METH_FASTCALL in
 //! the limited API since 3.10; the package requires >=3.11). The needed C API
 //! functions and struct layouts are declared manually, so no Python headers
 //! are required at build time; the symbols resolve against the hosting
-//! interpreter when the module is imported. Free-threaded CPython has no
-//! stable ABI and a different object header layout, so the module is neither
-//! shipped in free-threaded wheels nor imported by `_core` there.
+//! interpreter when the module is imported.
 //!
-//! The automaton handle is the pointer returned by `ss_new` in the ctypes
-//! shared library. Both artifacts are compiled from the same sources in one
-//! `zig build`, so the `Aho` layout is identical and the handle can be shared
-//! across them; allocations flow through the `std.mem.Allocator` vtable
-//! stored inside the automaton, so both sides use the same C allocator.
+//! Free-threaded CPython (3.13t+) has no stable ABI, so `-Dfree-threaded`
+//! builds a version-specific variant instead: the object header takes the
+//! free-threaded layout and the module declares that it does not need the GIL.
+//! Streaming calls serialize on the cursor's own `call_lock` in both builds:
+//! there is no GIL to do it there, and the GIL build releases the GIL while it
+//! masks a long chunk. A built automaton is only ever read, so the one-shot
+//! `mask` and the scans need no lock in either build and release the GIL.
+//!
+//! The module uses multi-phase initialization and keeps no state of its own,
+//! so isolated sub-interpreters with a GIL of their own (PEP 684, 3.12+) can
+//! import it and mask in parallel. The latency histograms of `trace.zig` are
+//! the one thing they share: atomic counters for the whole process.
+//!
+//! An automaton handle is the `Aho` pointer as a Python int, a cursor handle
+//! the `Cursor` pointer. The ctypes shared library is compiled from the same
+//! sources in one `zig build`, so the layouts are identical and handles can be
+//! shared across both artifacts; allocations flow through the
+//! `std.mem.Allocator` vtables stored inside them, so both sides use the same
+//! C allocator.
 
 const std = @import("std");
 const Aho = @import("aho.zig").Aho;
+const Cursor = @import("aho.zig").Cursor;
+const Encodings = @import("encodings.zig").Encodings;
+const trace = @import("trace.zig");
+const free_threaded = @import("build_options").free_threaded;
 
 const PyObject = opaque {};
 
 // --- Stable-ABI declarations (manual, no Python.h) ---
 
-const PyObjectHeader = extern struct {
-    ob_refcnt: isize,
-    ob_type: ?*anyopaque,
+/// `PyObject_HEAD` of a statically allocated object (`PyObject_HEAD_INIT`).
+const PyObjectHeader = if (free_threaded) extern struct {
+    ob_tid: usize = 0,
+    ob_flags: u16 = 0,
+    ob_mutex: u8 = 0,
+    ob_gc_bits: u8 = 0,
+    /// `_Py_IMMORTAL_REFCNT_LOCAL`
+    ob_ref_local: u32 = std.math.maxInt(u32),
+    ob_ref_shared: isize = 0,
+    ob_type: ?*anyopaque = null,
+} else extern struct {
+    ob_refcnt: isize = 1,
+    ob_type: ?*anyopaque = null,
 };
 
 const PyModuleDef_Base = extern struct {
@@ -49,97 +78,686 @@ const PyMethodDef = extern struct {
     ml_doc: ?[*:0]const u8 = null,
 };
 
+const PyModuleDef_Slot = extern struct {
+    slot: c_int = 0,
+    value: ?*anyopaque = null,
+};
+
 const PyModuleDef = extern struct {
     m_base: PyModuleDef_Base,
     m_name: [*:0]const u8,
     m_doc: ?[*:0]const u8 = null,
     m_size: isize = -1,
     m_methods: ?[*]PyMethodDef = null,
-    m_slots: ?*anyopaque = null,
+    m_slots: ?[*]PyModuleDef_Slot = null,
     m_traverse: ?*const anyopaque = null,
     m_clear: ?*const anyopaque = null,
     m_free: ?*const anyopaque = null,
 };
 
+const Py_buffer = extern struct {
+    buf: ?[*]u8 = null,
+    obj: ?*PyObject = null,
+    len: isize = 0,
+    itemsize: isize = 0,
+    readonly: c_int = 0,
+    ndim: c_int = 0,
+    format: ?[*:0]u8 = null,
+    shape: ?*isize = null,
+    strides: ?*isize = null,
+    suboffsets: ?*isize = null,
+    internal: ?*anyopaque = null,
+};
+
 const METH_FASTCALL: c_int = 0x0080;
-/// `PYTHON_ABI_VERSION`: marks the module as stable-ABI for `PyModule_Create2`.
-const PYTHON_ABI_VERSION: c_int = 3;
+/// `PyBUF_SIMPLE`: a plain contiguous byte buffer (in the limited API since 3.11).
+const PyBUF_SIMPLE: c_int = 0;
+/// `Py_mod_multiple_interpreters` (3.12+) and its `Py_MOD_PER_INTERPRETER_GIL_SUPPORTED` value.
+const Py_mod_multiple_interpreters: c_int = 3;
+const Py_MOD_PER_INTERPRETER_GIL_SUPPORTED: *anyopaque = @ptrFromInt(2);
+/// `Py_mod_gil` (3.13+) and its `Py_MOD_GIL_NOT_USED` value.
+const Py_mod_gil: c_int = 4;
+const Py_MOD_GIL_NOT_USED: *anyopaque = @ptrFromInt(1);
+/// The first `Py_Version` of 3.12, which added `Py_mod_multiple_interpreters`.
+const PY_3_12: c_ulong = 0x030C0000;
 
-extern fn PyModule_Create2(def: *PyModuleDef, api_version: c_int) ?*PyObject;
+extern fn PyModuleDef_Init(def: *PyModuleDef) ?*PyObject;
+extern const Py_Version: c_ulong;
 extern fn PyBytes_FromStringAndSize(v: ?[*]const u8, len: isize) ?*PyObject;
 extern fn PyBytes_AsStringAndSize(obj: *PyObject, buffer: *?[*]u8, length: *isize) c_int;
+extern fn PyUnicode_AsUTF8AndSize(obj: *PyObject, size: *isize) ?[*]const u8;
+extern fn PyUnicode_DecodeUTF8(s: [*]const u8, size: isize, errors: ?[*:0]const u8) ?*PyObject;
+extern fn PyList_New(size: isize) ?*PyObject;
+extern fn PyList_SetItem(list: *PyObject, index: isize, item: *PyObject) c_int;
+extern fn PyTuple_New(size: isize) ?*PyObject;
+extern fn PyTuple_SetItem(tuple: *PyObject, pos: isize, item: *PyObject) c_int;
+extern fn PyBool_FromLong(v: c_long) ?*PyObject;
+extern fn PyLong_FromUnsignedLongLong(v: c_ulonglong) ?*PyObject;
+extern fn PyLong_FromVoidPtr(p: *anyopaque) ?*PyObject;
 extern fn PyLong_AsVoidPtr(obj: *PyObject) ?*anyopaque;
 extern fn PyLong_AsUnsignedLongLong(obj: *PyObject) c_ulonglong;
+extern fn PyObject_GetBuffer(obj: *PyObject, view: *Py_buffer, flags: c_int) c_int;
+extern fn PyBuffer_Release(view: *Py_buffer) void;
+extern fn PyObject_IsTrue(obj: *PyObject) c_int;
+extern fn PyEval_SaveThread() ?*anyopaque;
+extern fn PyEval_RestoreThread(tstate: ?*anyopaque) void;
+extern fn Py_IncRef(obj: ?*PyObject) void;
+extern fn Py_DecRef(obj: ?*PyObject) void;
 extern fn PyErr_Occurred() ?*PyObject;
 extern fn PyErr_SetString(exc: *PyObject, msg: [*:0]const u8) void;
+extern var _Py_NoneStruct: PyObjectHeader;
 extern var PyExc_TypeError: *PyObject;
 extern var PyExc_MemoryError: *PyObject;
+extern var PyExc_ValueError: *PyObject;
 
 // --- Module functions ---
 
-/// `masking_read(handle: int, data: bytes, limit: int) -> bytes`
-///
-/// Streaming mask over the chunk, mirroring `_StreamWrapper.masking_read`.
-/// The GIL is held for the whole call, which serializes automaton mutation.
-fn maskingRead(
-    self: ?*PyObject,
-    args: ?[*]const ?*PyObject,
-    nargs: isize,
-) callconv(.c) ?*PyObject {
-    _ = self;
-    if (nargs != 3) {
-        PyErr_SetString(PyExc_TypeError, "masking_read expects (handle, data, limit)");
-        return null;
-    }
-    const argv = args.?;
-    const handle = PyLong_AsVoidPtr(argv[0].?) orelse {
+const allocator = std.heap.c_allocator;
+
+/// Checks the positional argument count, setting a TypeError naming the
+/// expected signature on mismatch.
+fn expectArgs(nargs: isize, comptime n: isize, comptime signature: []const u8) bool {
+    if (nargs == n) return true;
+    PyErr_SetString(PyExc_TypeError, signature ++ " expects " ++ std.fmt.comptimePrint("{d}", .{n}) ++ " arguments");
+    return false;
+}
+
+/// Converts the automaton handle argument, setting a Python error on failure.
+fn automatonArg(obj: *PyObject) ?*Aho {
+    const handle = PyLong_AsVoidPtr(obj) orelse {
         if (PyErr_Occurred() == null) {
             PyErr_SetString(PyExc_TypeError, "invalid automaton handle");
         }
         return null;
     };
+    return @ptrCast(@alignCast(handle));
+}
+
+/// Converts the cursor handle argument, setting a Python error on failure.
+fn cursorArg(obj: *PyObject) ?*Cursor {
+    const handle = PyLong_AsVoidPtr(obj) orelse {
+        if (PyErr_Occurred() == null) {
+            PyErr_SetString(PyExc_TypeError, "invalid cursor handle");
+        }
+        return null;
+    };
+    return @ptrCast(@alignCast(handle));
+}
+
+/// Converts an unsigned int argument, setting a Python error on failure.
+fn unsignedArg(obj: *PyObject) ?u64 {
+    const value = PyLong_AsUnsignedLongLong(obj);
+    if (value == std.math.maxInt(c_ulonglong) and PyErr_Occurred() != null) {
+        return null;
+    }
+    return value;
+}
+
+/// Copies `bytes` into a new Python bytes object.
+fn newBytes(bytes: []const u8) ?*PyObject {
+    return PyBytes_FromStringAndSize(if (bytes.len > 0) bytes.ptr else null, @intCast(bytes.len));
+}
+
+fn newNone() *PyObject {
+    const none: *PyObject = @ptrCast(&_Py_NoneStruct);
+    Py_IncRef(none);
+    return none;
+}
+
+/// Takes the cursor's `call_lock`, which serializes the calls on one cursor:
+/// there is no GIL to do it on free-threaded builds, and the GIL is released
+/// while a long chunk is masked (see `maskStreamChunk`). A contended caller
+/// sleeps on a futex until the holder unlocks rather than spinning. Waiting on
+/// and waking a futex keeps no state in the `Io` instance, so any thread may.
+fn lockCalls(cursor: *Cursor) void {
+    cursor.call_lock.lockUncancelable(std.Io.Threaded.global_single_threaded.io());
+}
+
+fn unlockCalls(cursor: *Cursor) void {
+    cursor.call_lock.unlock(std.Io.Threaded.global_single_threaded.io());
+}
+
+/// Streaming chunks at least this long are masked with the GIL released, so
+/// other threads run meanwhile, e.g. the `prefetch` reader of `StreamWrapper`
+/// reading the next chunk; for shorter ones the GIL round trip is not worth it.
+const RELEASE_GIL_MIN_LEN = 4096;
+
+/// Masks the next chunk of the cursor's stream under its `call_lock`. The GIL
+/// is released before the lock is taken and only taken back after it is
+/// unlocked, so the lock holder never waits for the GIL while a caller waiting
+/// for the lock holds it.
+fn maskStreamChunk(ac: *Aho, cursor: *Cursor, view: *const Py_buffer, limit: u64) ![]u8 {
+    const release_gil = view.len >= RELEASE_GIL_MIN_LEN;
+    const tstate = if (release_gil) PyEval_SaveThread() else null;
+    defer if (release_gil) PyEval_RestoreThread(tstate);
+    lockCalls(cursor);
+    defer unlockCalls(cursor);
+    return ac.mask(.{
+        .text = if (view.len > 0) view.buf.?[0..@intCast(view.len)] else "",
+        .max_stars = limit,
+        .cursor = cursor,
+    });
+}
+
+/// `new() -> int`
+///
+/// Creates an empty automaton, mirroring `ss_new`.
+fn new(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    _ = args;
+    if (!expectArgs(nargs, 0, "new()")) return null;
+    const ac = allocator.create(Aho) catch {
+        PyErr_SetString(PyExc_MemoryError, "failed to create the automaton");
+        return null;
+    };
+    ac.* = Aho.init(allocator) catch {
+        allocator.destroy(ac);
+        PyErr_SetString(PyExc_MemoryError, "failed to create the automaton");
+        return null;
+    };
+    return PyLong_FromVoidPtr(ac) orelse {
+        ac.deinit();
+        allocator.destroy(ac);
+        return null;
+    };
+}
+
+/// `destroy(handle: int) -> None`
+///
+/// Destroys an automaton, mirroring `ss_destroy`.
+fn destroy(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 1, "destroy(handle)")) return null;
+    const ac = automatonArg(args.?[0].?) orelse return null;
+    ac.deinit();
+    ac.allocator.destroy(ac);
+    return newNone();
+}
+
+/// `insert(handle: int, pattern: bytes, encodings: int) -> None`
+///
+/// Inserts a pattern and its variants for the `Encodings` bit set, mirroring
+/// `ss_insert`/`ss_insert_encoded`.
+fn insert(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 3, "insert(handle, pattern, encodings)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
     var buf: ?[*]u8 = null;
     var len: isize = 0;
     if (PyBytes_AsStringAndSize(argv[1].?, &buf, &len) != 0) {
         return null;
     }
-    const limit = PyLong_AsUnsignedLongLong(argv[2].?);
-    if (limit == std.math.maxInt(c_ulonglong) and PyErr_Occurred() != null) {
+    const flags = unsignedArg(argv[2].?) orelse return null;
+    const pattern: []const u8 = if (len > 0) buf.?[0..@intCast(len)] else "";
+    const inserted = if (flags == 0)
+        ac.insert(pattern)
+    else
+        ac.insertEncoded(pattern, @bitCast(@as(u32, @truncate(flags))));
+    _ = inserted catch {
+        PyErr_SetString(PyExc_MemoryError, "failed to insert a pattern");
         return null;
+    };
+    return newNone();
+}
+
+/// `build(handle: int, fallback: bool) -> None`
+///
+/// Builds the automaton after all inserts, mirroring `ss_build` (or
+/// `ss_build_fallback` when `fallback` is true).
+fn build(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 2, "build(handle, fallback)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
+    const fallback = PyObject_IsTrue(argv[1].?);
+    if (fallback < 0) return null;
+    const started = trace.start();
+    defer trace.record(.build, started);
+    const dfa_ok = fallback == 0 and (ac.buildDfa() catch return buildFailed());
+    if (!dfa_ok) {
+        ac.build() catch return buildFailed();
     }
+    return newNone();
+}
 
-    const ac: *Aho = @ptrCast(@alignCast(handle));
+/// `build_sharded(handle: int, fallback: bool, shards: int) -> None`
+///
+/// Builds the automaton split into up to `shards` automatons, mirroring
+/// `ss_build_sharded`.
+fn buildSharded(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 3, "build_sharded(handle, fallback, shards)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
+    const fallback = PyObject_IsTrue(argv[1].?);
+    if (fallback < 0) return null;
+    const shards = unsignedArg(argv[2].?) orelse return null;
+    const started = trace.start();
+    defer trace.record(.build, started);
+    ac.buildSharded(@intCast(@min(shards, Aho.MAX_SHARDS)), fallback == 0) catch return buildFailed();
+    return newNone();
+}
+
+/// `uses_dfa(handle: int) -> bool`
+///
+/// Whether `build` chose the DFA, mirroring `ss_uses_dfa`.
+fn usesDfa(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 1, "uses_dfa(handle)")) return null;
+    const ac = automatonArg(args.?[0].?) orelse return null;
+    return PyBool_FromLong(@intFromBool(ac.usesDfa()));
+}
+
+fn buildFailed() ?*PyObject {
+    PyErr_SetString(PyExc_MemoryError, "failed to build the automaton");
+    return null;
+}
+
+/// `cursor_new() -> int`
+///
+/// Creates a streaming cursor, mirroring `ss_cursor_new`.
+fn cursorNew(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    _ = args;
+    if (!expectArgs(nargs, 0, "cursor_new()")) return null;
+    const cursor = allocator.create(Cursor) catch {
+        PyErr_SetString(PyExc_MemoryError, "failed to create the cursor");
+        return null;
+    };
+    cursor.* = Cursor.init(allocator);
+    return PyLong_FromVoidPtr(cursor) orelse {
+        allocator.destroy(cursor);
+        return null;
+    };
+}
+
+/// `cursor_destroy(cursor: int) -> None`
+///
+/// Destroys a cursor, mirroring `ss_cursor_destroy`.
+fn cursorDestroy(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 1, "cursor_destroy(cursor)")) return null;
+    const cursor = cursorArg(args.?[0].?) orelse return null;
+    cursor.deinit();
+    cursor.allocator.destroy(cursor);
+    return newNone();
+}
+
+/// `mask(handle: int, data: Buffer, limit: int) -> bytes`
+///
+/// One-shot mask of the whole input, mirroring `ss_mask` without a cursor.
+/// It only reads the automaton, so it runs with the GIL released.
+fn mask(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 3, "mask(handle, data, limit)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
+    var view = Py_buffer{};
+    if (PyObject_GetBuffer(argv[1].?, &view, PyBUF_SIMPLE) != 0) {
+        return null;
+    }
+    defer PyBuffer_Release(&view);
+    const limit = unsignedArg(argv[2].?) orelse return null;
+
+    const tstate = PyEval_SaveThread();
     const masked = ac.mask(.{
-        .text = if (len > 0) buf.?[0..@intCast(len)] else "",
+        .text = if (view.len > 0) view.buf.?[0..@intCast(view.len)] else "",
         .max_stars = limit,
-        .is_streaming = true,
-    }) catch {
+    });
+    PyEval_RestoreThread(tstate);
+    const out = masked catch {
+        PyErr_SetString(PyExc_MemoryError, "failed to mask the input");
+        return null;
+    };
+    defer ac.allocator.free(out);
+    return newBytes(out);
+}
+
+/// `mask_text(handle: int, text: str, limit: int) -> str`
+///
+/// `mask` over the UTF-8 form of a `str`, without an encode/decode round trip
+/// in Python: CPython keeps that form inside the object (an ASCII string's
+/// data is it) and fills it in once otherwise, so the scan reads it in place,
+/// with the GIL released. Returns `text` itself when nothing was masked.
+fn maskText(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 3, "mask_text(handle, text, limit)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
+    var len: isize = 0;
+    // The str is immutable and borrowed for the whole call, so its UTF-8 stays valid.
+    const utf8 = PyUnicode_AsUTF8AndSize(argv[1].?, &len) orelse return null;
+    const limit = unsignedArg(argv[2].?) orelse return null;
+    const text = utf8[0..@intCast(len)];
+
+    const tstate = PyEval_SaveThread();
+    const masked = ac.mask(.{ .text = text, .max_stars = limit });
+    PyEval_RestoreThread(tstate);
+    const out = masked catch {
+        PyErr_SetString(PyExc_MemoryError, "failed to mask the input");
+        return null;
+    };
+    defer ac.allocator.free(out);
+    if (std.mem.eql(u8, out, text)) {
+        Py_IncRef(argv[1]);
+        return argv[1];
+    }
+    return PyUnicode_DecodeUTF8(out.ptr, @intCast(out.len), null);
+}
+
+/// `masking_read(handle: int, cursor: int, data: Buffer, limit: int) -> bytes`
+///
+/// Streaming mask over the chunk, continuing the cursor's stream, mirroring
+/// `_StreamWrapper.masking_read`. The cursor's `call_lock` serializes cursor
+/// mutation; chunks of `RELEASE_GIL_MIN_LEN` bytes or more release the GIL.
+fn maskingRead(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 4, "masking_read(handle, cursor, data, limit)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
+    const cursor = cursorArg(argv[1].?) orelse return null;
+    var view = Py_buffer{};
+    if (PyObject_GetBuffer(argv[2].?, &view, PyBUF_SIMPLE) != 0) {
+        return null;
+    }
+    defer PyBuffer_Release(&view);
+    const limit = unsignedArg(argv[3].?) orelse return null;
+
+    const masked = maskStreamChunk(ac, cursor, &view, limit) catch {
+        PyErr_SetString(PyExc_MemoryError, "failed to mask the input");
+        return null;
+    };
+    defer ac.allocator.free(masked);
+    return newBytes(masked);
+}
+
+/// `masking_read_lines(handle: int, cursor: int, data: Buffer, limit: int) -> list[bytes]`
+///
+/// `masking_read` over a whole block, with the output split after every `\n`
+/// in the same call: all complete lines (each with its `\n`), then the
+/// unterminated rest, possibly empty. One call per block instead of one per
+/// line saves the per-call overhead that dominates logs of short lines.
+fn maskingReadLines(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 4, "masking_read_lines(handle, cursor, data, limit)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
+    const cursor = cursorArg(argv[1].?) orelse return null;
+    var view = Py_buffer{};
+    if (PyObject_GetBuffer(argv[2].?, &view, PyBUF_SIMPLE) != 0) {
+        return null;
+    }
+    defer PyBuffer_Release(&view);
+    const limit = unsignedArg(argv[3].?) orelse return null;
+
+    const masked = maskStreamChunk(ac, cursor, &view, limit) catch {
         PyErr_SetString(PyExc_MemoryError, "failed to mask the input");
         return null;
     };
     defer ac.allocator.free(masked);
-    return PyBytes_FromStringAndSize(
-        if (masked.len > 0) masked.ptr else null,
-        @intCast(masked.len),
-    );
+
+    const count = std.mem.count(u8, masked, "\n");
+    const list = PyList_New(@intCast(count + 1)) orelse return null;
+    var start: usize = 0;
+    for (0..count + 1) |i| {
+        const end = if (i < count) std.mem.indexOfScalarPos(u8, masked, start, '\n').? + 1 else masked.len;
+        const line = newBytes(masked[start..end]) orelse {
+            Py_DecRef(list);
+            return null;
+        };
+        _ = PyList_SetItem(list, @intCast(i), line);
+        start = end;
+    }
+    return list;
+}
+
+/// `get_reminder(cursor: int) -> bytes`
+///
+/// A copy of the cursor's streaming-mode reminder, mirroring `ss_get_reminder`.
+fn getReminder(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 1, "get_reminder(cursor)")) return null;
+    const cursor = cursorArg(args.?[0].?) orelse return null;
+    lockCalls(cursor);
+    defer unlockCalls(cursor);
+    return newBytes(cursor.reminder orelse "");
+}
+
+/// `cursor_matches(cursor: int) -> int`
+///
+/// The number of matches masked on the cursor's stream, mirroring
+/// `ss_cursor_matches`.
+fn cursorMatches(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 1, "cursor_matches(cursor)")) return null;
+    const cursor = cursorArg(args.?[0].?) orelse return null;
+    lockCalls(cursor);
+    defer unlockCalls(cursor);
+    return PyLong_FromUnsignedLongLong(cursor.matches);
+}
+
+/// `consume_reminder(cursor: int) -> bytes`
+///
+/// `get_reminder` followed by `ss_reset_reminder`, in one call.
+fn consumeReminder(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 1, "consume_reminder(cursor)")) return null;
+    const cursor = cursorArg(args.?[0].?) orelse return null;
+    lockCalls(cursor);
+    defer unlockCalls(cursor);
+    defer cursor.reset_reminder();
+    return newBytes(cursor.reminder orelse "");
+}
+
+/// `cursor_checkpoint(handle: int, cursor: int) -> bytes`
+///
+/// The cursor's stream state over the automaton as a blob, mirroring
+/// `ss_cursor_checkpoint`.
+fn cursorCheckpoint(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 2, "cursor_checkpoint(handle, cursor)")) return null;
+    const ac = automatonArg(args.?[0].?) orelse return null;
+    const cursor = cursorArg(args.?[1].?) orelse return null;
+    lockCalls(cursor);
+    const blob = cursor.checkpoint(ac);
+    unlockCalls(cursor);
+    const out = blob catch {
+        PyErr_SetString(PyExc_MemoryError, "failed to checkpoint the cursor");
+        return null;
+    };
+    defer cursor.allocator.free(out);
+    return newBytes(out);
+}
+
+/// `cursor_restore(handle: int, cursor: int, blob: Buffer) -> None`
+///
+/// Replaces the cursor's stream state with a `cursor_checkpoint` blob,
+/// mirroring `ss_cursor_restore`; a blob that does not fit raises ValueError.
+fn cursorRestore(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 3, "cursor_restore(handle, cursor, blob)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
+    const cursor = cursorArg(argv[1].?) orelse return null;
+    var view = Py_buffer{};
+    if (PyObject_GetBuffer(argv[2].?, &view, PyBUF_SIMPLE) != 0) {
+        return null;
+    }
+    defer PyBuffer_Release(&view);
+
+    lockCalls(cursor);
+    const restored = cursor.restore(ac, if (view.len > 0) view.buf.?[0..@intCast(view.len)] else "");
+    unlockCalls(cursor);
+    restored catch |err| {
+        switch (err) {
+            error.InvalidCheckpoint => PyErr_SetString(PyExc_ValueError, "invalid checkpoint"),
+            error.PatternMismatch => PyErr_SetString(PyExc_ValueError, "the checkpoint was taken over different patterns"),
+            error.OutOfMemory => PyErr_SetString(PyExc_MemoryError, "failed to restore the cursor"),
+        }
+        return null;
+    };
+    return newNone();
+}
+
+/// `find_spans(handle: int, data: Buffer) -> bytes`
+///
+/// Every match in `data` as native-endian u64 (start, end, pattern id) triples,
+/// mirroring `ss_find_spans`. The scan only reads the built automaton, so it
+/// runs with the GIL released; the buffer export keeps `data` alive and sized.
+fn findSpans(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 2, "find_spans(handle, data)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
+    var view = Py_buffer{};
+    if (PyObject_GetBuffer(argv[1].?, &view, PyBUF_SIMPLE) != 0) {
+        return null;
+    }
+    defer PyBuffer_Release(&view);
+    const text: []const u8 = if (view.len > 0) view.buf.?[0..@intCast(view.len)] else "";
+
+    var spans = std.ArrayList(Aho.Span).initCapacity(ac.allocator, 0) catch {
+        PyErr_SetString(PyExc_MemoryError, "failed to find the spans");
+        return null;
+    };
+    defer spans.deinit(ac.allocator);
+    const tstate = PyEval_SaveThread();
+    const found = ac.findSpans(text, &spans);
+    PyEval_RestoreThread(tstate);
+    found catch {
+        PyErr_SetString(PyExc_MemoryError, "failed to find the spans");
+        return null;
+    };
+    return newBytes(std.mem.sliceAsBytes(spans.items));
+}
+
+/// `first_match(handle: int, data: Buffer) -> tuple[int, int, int] | None`
+///
+/// The first match in `data` as a (start, end, pattern id) tuple, or None,
+/// mirroring `ss_first_match`: the scan stops at that match, allocates nothing
+/// and runs with the GIL released like `find_spans`.
+fn firstMatch(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 2, "first_match(handle, data)")) return null;
+    const argv = args.?;
+    const ac = automatonArg(argv[0].?) orelse return null;
+    var view = Py_buffer{};
+    if (PyObject_GetBuffer(argv[1].?, &view, PyBUF_SIMPLE) != 0) {
+        return null;
+    }
+    defer PyBuffer_Release(&view);
+    const text: []const u8 = if (view.len > 0) view.buf.?[0..@intCast(view.len)] else "";
+
+    const tstate = PyEval_SaveThread();
+    const found = ac.firstMatch(text);
+    PyEval_RestoreThread(tstate);
+    const span = found orelse return newNone();
+    const tuple = PyTuple_New(3) orelse return null;
+    for ([_]u64{ span.start, span.end, span.id }, 0..) |value, i| {
+        const item = PyLong_FromUnsignedLongLong(value) orelse {
+            Py_DecRef(tuple);
+            return null;
+        };
+        _ = PyTuple_SetItem(tuple, @intCast(i), item);
+    }
+    return tuple;
+}
+
+/// `trace_enable(on: bool) -> None`
+///
+/// Turns the latency histograms of `trace.zig` on or off, mirroring `ss_trace_enable`.
+fn traceEnable(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    if (!expectArgs(nargs, 1, "trace_enable(on)")) return null;
+    const on = PyObject_IsTrue(args.?[0].?);
+    if (on < 0) return null;
+    trace.setEnabled(on != 0);
+    return newNone();
+}
+
+/// `trace_snapshot() -> bytes`
+///
+/// The latency histograms as native-endian u64s, laid out as `trace.snapshot`
+/// writes them, mirroring `ss_trace_snapshot`.
+fn traceSnapshot(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    _ = args;
+    if (!expectArgs(nargs, 0, "trace_snapshot()")) return null;
+    var words: [trace.SNAPSHOT_LEN]u64 = undefined;
+    trace.snapshot(&words);
+    return newBytes(std.mem.sliceAsBytes(&words));
+}
+
+/// `trace_reset() -> None`
+///
+/// Zeroes the latency histograms, mirroring `ss_trace_reset`.
+fn traceReset(self: ?*PyObject, args: ?[*]const ?*PyObject, nargs: isize) callconv(.c) ?*PyObject {
+    _ = self;
+    _ = args;
+    if (!expectArgs(nargs, 0, "trace_reset()")) return null;
+    trace.reset();
+    return newNone();
+}
+
+fn method(comptime name: [*:0]const u8, comptime func: anytype, comptime doc: [*:0]const u8) PyMethodDef {
+    return .{ .ml_name = name, .ml_meth = @ptrCast(func), .ml_flags = METH_FASTCALL, .ml_doc = doc };
 }
 
 var methods = [_]PyMethodDef{
-    .{
-        .ml_name = "masking_read",
-        .ml_meth = @ptrCast(&maskingRead),
-        .ml_flags = METH_FASTCALL,
-        .ml_doc = "masking_read(handle, data, limit) -> bytes",
-    },
+    method("new", &new, "new() -> int"),
+    method("destroy", &destroy, "destroy(handle) -> None"),
+    method("insert", &insert, "insert(handle, pattern, encodings) -> None"),
+    method("build", &build, "build(handle, fallback) -> None"),
+    method("build_sharded", &buildSharded, "build_sharded(handle, fallback, shards) -> None"),
+    method("uses_dfa", &usesDfa, "uses_dfa(handle) -> bool"),
+    method("cursor_new", &cursorNew, "cursor_new() -> int"),
+    method("cursor_destroy", &cursorDestroy, "cursor_destroy(cursor) -> None"),
+    method("mask", &mask, "mask(handle, data, limit) -> bytes"),
+    method("mask_text", &maskText, "mask_text(handle, text, limit) -> str"),
+    method("masking_read", &maskingRead, "masking_read(handle, cursor, data, limit) -> bytes"),
+    method("masking_read_lines", &maskingReadLines, "masking_read_lines(handle, cursor, data, limit) -> list[bytes]"),
+    method("get_reminder", &getReminder, "get_reminder(cursor) -> bytes"),
+    method("consume_reminder", &consumeReminder, "consume_reminder(cursor) -> bytes"),
+    method("cursor_matches", &cursorMatches, "cursor_matches(cursor) -> int"),
+    method("cursor_checkpoint", &cursorCheckpoint, "cursor_checkpoint(handle, cursor) -> bytes"),
+    method("cursor_restore", &cursorRestore, "cursor_restore(handle, cursor, blob) -> None"),
+    method("find_spans", &findSpans, "find_spans(handle, data) -> bytes"),
+    method("first_match", &firstMatch, "first_match(handle, data) -> tuple[int, int, int] | None"),
+    method("trace_enable", &traceEnable, "trace_enable(on) -> None"),
+    method("trace_snapshot", &traceSnapshot, "trace_snapshot() -> bytes"),
+    method("trace_reset", &traceReset, "trace_reset() -> None"),
+    .{}, // sentinel
+};
+
+/// The module keeps no state of its own and no Python objects outside the
+/// calls: it may be imported into any number of interpreters, each with its
+/// own GIL, or none at all in the free-threaded build.
+var slots = [_]PyModuleDef_Slot{
+    .{ .slot = Py_mod_multiple_interpreters, .value = Py_MOD_PER_INTERPRETER_GIL_SUPPORTED },
+} ++ (if (free_threaded) [_]PyModuleDef_Slot{.{ .slot = Py_mod_gil, .value = Py_MOD_GIL_NOT_USED }} else .{}) ++ [_]PyModuleDef_Slot{
     .{}, // sentinel
 };
 
 var module_def = PyModuleDef{
-    .m_base = .{ .ob_base = .{ .ob_refcnt = 1, .ob_type = null } },
+    .m_base = .{ .ob_base = .{} },
+    .m_name = "secretsweeper._native",
+    .m_size = 0,
+    .m_methods = &methods,
+    .m_slots = &slots,
+};
+
+/// `module_def` for Python 3.11, which fails the import on a slot it doesn't
+/// know; its sub-interpreters all share one GIL anyway.
+var module_def_3_11 = PyModuleDef{
+    .m_base = .{ .ob_base = .{} },
     .m_name = "secretsweeper._native",
+    .m_size = 0,
     .m_methods = &methods,
 };
 
+/// Multi-phase initialization (PEP 489): the import system creates the
+/// module from the definition, once per interpreter that imports it.
 export fn PyInit__native() ?*PyObject {
-    return PyModule_Create2(&module_def, PYTHON_ABI_VERSION);
+    return PyModuleDef_Init(if (Py_Version >= PY_3_12) &module_def else &module_def_3_11);
 }
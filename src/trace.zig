@@ -0,0 +1,118 @@
+//! Opt-in latency histograms for the phases of building and masking.
+//!
+//! Off by default. While off, an instrumented phase costs one relaxed atomic
+//! load and a branch per call (never per byte) and reads no clock. Once
+//! `setEnabled(true)`, each phase's duration is added to a fixed-bucket
+//! histogram shared by every automaton and thread in the process; the counters
+//! are atomic, so calls running without the GIL record without a lock.
+//!
+//! Bucket `i` counts the durations below `BUCKET_BASE_NS << i` nanoseconds
+//! that no lower bucket counts; the last one counts everything longer.
+
+const std = @import("std");
+
+pub const Phase = enum(u8) {
+    /// `Aho.buildDfa`, and `Aho.build` when it falls back to it.
+    build,
+    /// `Aho.mask` pass 1: walking the input through the automaton.
+    search,
+    /// `Aho.mask` pass 2: writing the masked output.
+    reconstruct,
+    /// `Aho.mask` in streaming mode: holding back the new reminder.
+    reminder,
+};
+
+pub const BUCKET_BASE_NS: u64 = 1024;
+/// ~1 µs to ~34 s in powers of two, and one bucket for anything longer.
+pub const NUM_BUCKETS = 27;
+
+const Histogram = struct {
+    buckets: [NUM_BUCKETS]std.atomic.Value(u64) = @splat(.init(0)),
+    sum_ns: std.atomic.Value(u64) = .init(0),
+};
+
+/// The number of u64 words `snapshot` writes: per phase, in `Phase` order,
+/// the bucket counts and then the sum of the durations in nanoseconds.
+pub const SNAPSHOT_LEN = @typeInfo(Phase).@"enum".fields.len * (NUM_BUCKETS + 1);
+
+var enabled = std.atomic.Value(bool).init(false);
+var histograms = [_]Histogram{.{}} ** @typeInfo(Phase).@"enum".fields.len;
+
+pub fn setEnabled(on: bool) void {
+    enabled.store(on, .monotonic);
+}
+
+pub fn isEnabled() bool {
+    return enabled.load(.monotonic);
+}
+
+fn nowNs() i96 {
+    // Reading the clock keeps no state in the `Io` instance, so any thread may.
+    return std.Io.Clock.awake.now(std.Io.Threaded.global_single_threaded.io()).nanoseconds;
+}
+
+/// The start of a phase to pass to `record`, or null while tracing is off.
+pub inline fn start() ?i96 {
+    return if (enabled.load(.monotonic)) nowNs() else null;
+}
+
+/// Adds the time since `started` to the histogram of `phase`; does nothing
+/// for a phase started while tracing was off.
+pub inline fn record(phase: Phase, started: ?i96) void {
+    if (started) |t0| add(phase, @intCast(@max(nowNs() - t0, 0)));
+}
+
+fn bucketOf(ns: u64) usize {
+    const bits: usize = 64 - @clz(ns);
+    return @min(bits -| std.math.log2_int(u64, BUCKET_BASE_NS), NUM_BUCKETS - 1);
+}
+
+fn add(phase: Phase, ns: u64) void {
+    const histogram = &histograms[@intFromEnum(phase)];
+    _ = histogram.buckets[bucketOf(ns)].fetchAdd(1, .monotonic);
+    _ = histogram.sum_ns.fetchAdd(ns, .monotonic);
+}
+
+/// Copies every counter to `out`. Each counter is read atomically, but not
+/// all of them at once: a phase recorded meanwhile may be partly included.
+pub fn snapshot(out: *[SNAPSHOT_LEN]u64) void {
+    var i: usize = 0;
+    for (&histograms) |*histogram| {
+        for (&histogram.buckets) |*bucket| {
+            out[i] = bucket.load(.monotonic);
+            i += 1;
+        }
+        out[i] = histogram.sum_ns.load(.monotonic);
+        i += 1;
+    }
+}
+
+/// Zeroes every histogram.
+pub fn reset() void {
+    for (&histograms) |*histogram| {
+        for (&histogram.buckets) |*bucket| bucket.store(0, .monotonic);
+        histogram.sum_ns.store(0, .monotonic);
+    }
+}
+
+test "trace buckets" {
+    try std.testing.expectEqual(0, bucketOf(0));
+    try std.testing.expectEqual(0, bucketOf(BUCKET_BASE_NS - 1));
+    try std.testing.expectEqual(1, bucketOf(BUCKET_BASE_NS));
+    try std.testing.expectEqual(2, bucketOf(BUCKET_BASE_NS * 2));
+    try std.testing.expectEqual(NUM_BUCKETS - 1, bucketOf(std.math.maxInt(u64)));
+
+    setEnabled(true);
+    defer setEnabled(false);
+    defer reset();
+    add(.search, 5000);
+    record(.build, start());
+    var out: [SNAPSHOT_LEN]u64 = undefined;
+    snapshot(&out);
+    const search = out[(NUM_BUCKETS + 1) * @intFromEnum(Phase.search) ..][0 .. NUM_BUCKETS + 1];
+    try std.testing.expectEqual(1, search[bucketOf(5000)]);
+    try std.testing.expectEqual(5000, search[NUM_BUCKETS]);
+    var builds: u64 = 0;
+    for (out[0..NUM_BUCKETS]) |count| builds += count;
+    try std.testing.expectEqual(1, builds);
+}
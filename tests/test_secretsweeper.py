@@ -1,7 +1,11 @@
+import base64
+import gc
 import io
+import json
+import os
 import pathlib
+import subprocess
 import sys
-import sysconfig
 import threading
 import typing
 import unittest
@@ -9,6 +13,8 @@ import unittest
 import pytest
 
 import secretsweeper
+from secretsweeper import Masker
+from secretsweeper._sweep import SWEEP_BLOCK_SIZE
 
 FIXTURES_DIR = pathlib.Path(__file__).parent / "fixtures"
 # Git may check fixtures out with CRLF line endings (e.g. on Windows with core.autocrlf),
@@ -102,6 +108,51 @@ def test_mask_utf8(input: str, patterns: typing.Iterable[str], expected: str) ->
     assert secretsweeper.mask(input.encode(), (w.encode() for w in patterns)) == expected.encode()
 
 
+@pytest.mark.parametrize(
+    ("input", "encodings", "expected"),
+    [
+        (b"token=c2VjcmV0LXZhbHVl", ("base64",), b"token=***************"),
+        # Embedded at a byte offset inside a longer base64 blob.
+        (base64.b64encode(b"xx:secret-value:yy"), ("base64",), b"eHg6" + b"*" * 15 + b"Onl5"),
+        (b"jwt.c2VjcmV0LXZhbHVl.sig", ("base64url",), b"jwt.***************.sig"),
+        (b"?q=p%40ss%2Fword&x=1", ("url",), b"?q=*************&x=1"),
+        (b"?q=p%40ss%2fword&x=1", ("url",), b"?q=*************&x=1"),
+        (b'{"v": "multi\\nline"}', ("json",), b'{"v": "***********"}'),
+        (b"secret-value c2VjcmV0LXZhbHVl", ("base64", "json"), b"************ ***************"),
+        (b"c2VjcmV0LXZhbHVl", (), b"c2VjcmV0LXZhbHVl"),
+    ],
+)
+def test_mask_encodings(input: bytes, encodings: tuple[str, ...], expected: bytes) -> None:
+    patterns = (b"secret-value", b"multi\nline", b"p@ss/word")
+    assert secretsweeper.mask(input, patterns, encodings=encodings) == expected
+
+
+def test_stream_wrapper_encodings() -> None:
+    stream = secretsweeper.StreamWrapper(
+        io.BytesIO(b"raw: s3cret\nb64: czNjcmV0\n"), (b"s3cret",), encodings=("base64",)
+    )
+    assert stream.readall() == b"raw: ******\nb64: ********\n"
+
+
+def test_search_encodings() -> None:
+    patterns = (b"a-secret", b"uuid-123")
+    data = b"dXVpZC0xMjM= uuid-123"
+    assert not secretsweeper.contains_secret(data[:12], patterns)
+    assert secretsweeper.contains_secret(data[:12], patterns, encodings=("base64",))
+    assert secretsweeper.first_match(data, patterns, encodings=("base64",)) == (0, 10, 1)
+    spans = secretsweeper.find_spans(data, patterns, encodings=("base64",))
+    assert spans == Masker(patterns, encodings=("base64",)).find_spans(data)
+    assert spans.tolist() == [0, 10, 1, 0, 12, 1, 13, 21, 1]
+
+
+def test_mask_match_dense_input() -> None:
+    # Thousands of overlapping matches in one call switch the native masking to
+    # writing its output directly; a single unit never does.
+    unit = b"id=ab abc bcd abcd;"
+    patterns = (b"ab", b"abc", b"bcd", b"abcd;")
+    assert secretsweeper.mask(unit * 5000, patterns, limit=2) == secretsweeper.mask(unit, patterns, limit=2) * 5000
+
+
 @pytest.mark.parametrize(
     ("patterns_factory"),
     [
@@ -122,6 +173,38 @@ def test_mask_pattern_type(patterns_factory: typing.Callable[[], typing.Iterable
     assert secretsweeper.mask(b"a", patterns_factory()) == b"*"
 
 
+@pytest.mark.parametrize(
+    "text,patterns,expected",
+    [
+        ("user=admin password=hunter2", ("hunter2",), "user=admin password=*******"),
+        ("пароль: секрет, ключ", ("секрет", "ключ"), "пароль: ************, ********"),
+        ("🔑 key=s3cr3t 🔑", ("s3cr3t",), "🔑 key=****** 🔑"),
+        ("a\udcffhunter2", ("hunter2",), "a\udcff*******"),
+        ("", ("a",), ""),
+    ],
+    ids=["ascii", "cyrillic", "emoji", "lone surrogate", "empty"],
+)
+def test_mask_text(text: str, patterns: tuple[str, ...], expected: str) -> None:
+    assert secretsweeper.mask_text(text, patterns) == expected
+    masker = Masker(p.encode() for p in patterns)
+    assert masker.mask_text(text) == expected
+
+
+def test_mask_text_returns_the_input_when_nothing_is_masked() -> None:
+    text = "no secrets in this line"
+    assert secretsweeper.mask_text(text, ("hunter2",)) is text
+    assert secretsweeper.mask_text(text, ("secret",)) == "no ******s in this line"
+
+
+def test_mask_text_ctypes_fallback_matches_native(monkeypatch: pytest.MonkeyPatch) -> None:
+    text = "ключ=hunter2 токен=aGVsbG8=" * 3
+    outputs = []
+    for native in (secretsweeper._core._native, None):
+        monkeypatch.setattr(secretsweeper._core, "_native", native)
+        outputs.append(secretsweeper.mask_text(text, ("hunter2", "hello"), limit=4, encodings=("base64",)))
+    assert outputs[0] == outputs[1] == "ключ=**** токен=****" * 3
+
+
 def test_mask_max_number_of_stars_default() -> None:
     inp = b"a" * (secretsweeper.MAX_NUMBER_OF_STARS + 1)
     assert secretsweeper.mask(inp, (inp,)) == b"*" * secretsweeper.MAX_NUMBER_OF_STARS
@@ -135,6 +218,117 @@ def test_can_mask_memory_view() -> None:
     assert secretsweeper.mask(memoryview(b"funny"), (b"fun",)) == b"***ny"
 
 
+@pytest.mark.parametrize(
+    ("input", "patterns", "expected"),
+    [
+        (b"nothing here", (b"secret",), []),
+        (b"a secret, another secret", (b"secret",), [(2, 8, 0), (18, 24, 0)]),
+        # Overlapping matches are reported individually, in the order of their ends.
+        (b"asher", (b"ash", b"her"), [(0, 3, 0), (2, 5, 1)]),
+        # One match per end position: a shorter pattern ending at the same byte, or inside a longer pattern's
+        # prefix that the scan is still following, is not reported.
+        (b"xabc", (b"abc", b"bc"), [(1, 4, 0)]),
+        (b"abcx abcd", (b"abcd", b"bc"), [(5, 9, 0)]),
+        # Duplicate and empty patterns don't take an id.
+        (b"ballsong", (b"ball", b"", b"ball", b"on"), [(0, 4, 0), (5, 7, 1)]),
+        (b"line\nsecond line\n", (b"ne\nsec", b"second"), [(2, 8, 0), (5, 11, 1)]),
+    ],
+)
+def test_find_spans(input: bytes, patterns: tuple[bytes, ...], expected: list[tuple[int, int, int]]) -> None:
+    for spans in (secretsweeper.find_spans(input, patterns), secretsweeper.find_spans(input, Masker(patterns))):
+        assert spans.typecode == "Q"
+        assert list(zip(spans[::3], spans[1::3], spans[2::3])) == expected
+        for start, end, pattern_id in zip(spans[::3], spans[1::3], spans[2::3]):
+            assert input[start:end] == [p for p in dict.fromkeys(patterns) if p][pattern_id]
+
+
+def test_find_spans_accepts_buffers() -> None:
+    expected = secretsweeper.find_spans(b"xx secret", (b"secret",))
+    assert secretsweeper.find_spans(bytearray(b"xx secret"), (b"secret",)) == expected
+    assert secretsweeper.find_spans(memoryview(b"..xx secret")[2:], (b"secret",)) == expected
+
+
+def test_find_spans_ctypes_fallback_matches_native(monkeypatch: pytest.MonkeyPatch) -> None:
+    masker = Masker((b"multi\nline", b"uuid-123", b"id"), encodings=("base64",))
+    data = b"say uuid-123 loud\na multi\nline and dXVpZC0xMjM=\n" * 3
+    outputs = []
+    for native in (secretsweeper._core._native, None):
+        monkeypatch.setattr(secretsweeper._core, "_native", native)
+        outputs.append(masker.find_spans(data))
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0]) == 3 * 3 * 4
+
+
+@pytest.mark.parametrize(
+    ("input", "expected"),
+    [
+        (b"", None),
+        (b"nothing to see", None),
+        (b"one secret", (4, 10, 0)),
+        (b"asher", (0, 3, 1)),
+        (b"multi\nline and a secret", (0, 10, 2)),
+        # The bigram gate never skips the last byte of the input.
+        (b"xxxxxxx", None),
+        (b"xxxxxxs", None),
+    ],
+)
+def test_first_match(input: bytes, expected: tuple[int, int, int] | None) -> None:
+    patterns = (b"secret", b"ash", b"multi\nline", b"her")
+    for patterns_or_masker in (patterns, Masker(patterns)):
+        assert secretsweeper.first_match(input, patterns_or_masker) == expected
+        assert secretsweeper.contains_secret(input, patterns_or_masker) is (expected is not None)
+    if expected is not None:
+        assert expected == tuple(secretsweeper.find_spans(input, patterns)[:3])
+
+
+def test_first_match_ctypes_fallback_matches_native(monkeypatch: pytest.MonkeyPatch) -> None:
+    masker = Masker((b"uuid-123", b"x"))
+    outputs = []
+    for native in (secretsweeper._core._native, None):
+        monkeypatch.setattr(secretsweeper._core, "_native", native)
+        outputs.append([masker.first_match(d) for d in (b"", b"abc", b"say uuid-123", memoryview(b"ax"))])
+    assert outputs[0] == outputs[1] == [None, None, (4, 12, 0), (1, 2, 1)]
+
+
+def test_masker() -> None:
+    masker = Masker((b"secret", b"multi\nline"), limit=3)
+    for data in (b"a secret", b"a multi\nline secret", b"", b"nothing"):
+        assert masker.mask(data) == secretsweeper.mask(data, (b"secret", b"multi\nline"), limit=3)
+
+
+@pytest.mark.parametrize("no_dfa", [False, True])
+def test_masker_shards(monkeypatch: pytest.MonkeyPatch, no_dfa: bool) -> None:
+    if no_dfa:
+        monkeypatch.setenv(secretsweeper._core._FORCE_NO_DFA_AUTOMATON_ENV, "1")
+    # `bc` inside `abcd` must stay hidden there: the two always share a shard.
+    patterns = [b"abcd", b"bc", b"p@ss", b"multi\nline"] + [b"key-%d-" % i + b"x" * (i % 7) for i in range(200)]
+    data = b"abce bc abcd p@ss cEBzcw== multi\nline " + b"".join(b"key-%d-xxx " % i for i in range(0, 300, 3)) * 100
+    assert len(data) > 64 * 1024  # scanned on threads
+    whole = Masker(patterns, limit=4, encodings=("base64",))
+    outputs = []
+    for native in (secretsweeper._core._native, None):
+        monkeypatch.setattr(secretsweeper._core, "_native", native)
+        masker = Masker(patterns, limit=4, encodings=("base64",), shards=8)
+        wrapper = secretsweeper.StreamWrapper(io.BytesIO(data[:5000]), masker)
+        outputs.append(
+            (
+                masker.mask(data),
+                masker.mask_text(data.decode()),
+                masker.find_spans(data),
+                masker.first_match(data[5:]),
+                b"".join(wrapper.read(7) or b"" for _ in range(1000)),
+            )
+        )
+    assert outputs[0] == outputs[1]
+    masked, masked_text, spans, first, streamed = outputs[0]
+    assert masked == masked_text.encode() == whole.mask(data)
+    assert masked.startswith(b"abce ** **** **** **** **** ")
+    assert spans == whole.find_spans(data)
+    assert first == whole.first_match(data[5:])
+    whole_wrapper = secretsweeper.StreamWrapper(io.BytesIO(data[:5000]), whole)
+    assert streamed == b"".join(whole_wrapper.read(7) or b"" for _ in range(1000))
+
+
 def test_stream_wrapper_init_and_del() -> None:
     wrapper = secretsweeper._core._StreamWrapper((b"a", b"b"))
     wrapper2 = secretsweeper._core._StreamWrapper((b"a", b"b"))
@@ -186,6 +380,79 @@ def test_stream_wrapper_concurrent_use_is_safe() -> None:
     assert not errors
 
 
+def test_stream_wrappers_in_parallel_threads() -> None:
+    # One wrapper per thread: on free-threaded CPython these run truly in parallel.
+    chunks = [b"a multi", b"x", b"say uuid-123 loud\n", b"multi\nline tail"] * 50
+    patterns = (b"multi\nline", b"uuid-123")
+    expected = secretsweeper.StreamWrapper(io.BytesIO(b"".join(chunks)), patterns).readall()
+    results = []
+
+    def worker() -> None:
+        results.append(secretsweeper.StreamWrapper(io.BytesIO(b"".join(chunks)), patterns).readall())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [expected] * 8
+
+
+def test_stream_wrappers_share_a_masker() -> None:
+    patterns = (b"multi\nline", b"uuid-123")
+    masker = Masker(patterns, limit=3)
+    streams = [b"a multi\nline %d uuid-123\n" % i * 20 for i in range(50)]
+    wrappers = [secretsweeper.StreamWrapper(io.BytesIO(data), masker) for data in streams]
+    # Interleave the streams line by line: every cursor keeps its own partial matches.
+    outputs = [b""] * len(wrappers)
+    while any(lines := [w.readline() for w in wrappers]):
+        outputs = [out + line for out, line in zip(outputs, lines)]
+    for data, out in zip(streams, outputs):
+        # The Masker's limit applies unless the wrapper sets its own.
+        assert out == secretsweeper.StreamWrapper(io.BytesIO(data), patterns, limit=3).readall()
+    assert secretsweeper.StreamWrapper(io.BytesIO(b"uuid-123"), masker, limit=1).readall() == b"*"
+
+
+def test_masker_is_shared_across_threads() -> None:
+    masker = Masker((b"secret",))
+    results = []
+
+    def worker(i: int) -> None:
+        results.append(masker.mask(b"%d secret " % i * 1000) == b"%d ****** " % i * 1000)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [True] * 8
+
+
+def test_native_masking_read_serializes_calls() -> None:
+    # Without the wrapper lock, the extension itself must keep concurrent calls on one
+    # cursor memory-safe with its per-cursor lock, also while long chunks release the GIL.
+    if secretsweeper._core._native is None:
+        pytest.skip("the extension is not built on this platform")
+    wrapper = secretsweeper._core._StreamWrapper((b"ab", b"line\nsecond"))
+    outputs = []
+
+    def worker() -> None:
+        for i in range(200):
+            outputs.append(
+                secretsweeper._core._native.masking_read(
+                    wrapper._masker._automaton, wrapper._cursor, b"a" * (64 + 8192 * (i % 2)) + b"b line\n", 15
+                )
+            )
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(outputs) == 800
+    assert all(set(out) <= set(b"a*b line\n") for out in outputs)
+
+
 def test_stream_wrapper_gevent_safe() -> None:
     # The wrapper lock is only held around native calls that contain no greenlet
     # switch points, so sharing a wrapper between greenlets must neither deadlock
@@ -221,11 +488,105 @@ def test_stream_wrapper_reminder_is_bounded() -> None:
 def test_native_extension_is_used() -> None:
     if sys.platform in ("win32", "cygwin"):
         pytest.skip("the extension is not built on Windows")
-    if sysconfig.get_config_var("Py_GIL_DISABLED"):
-        pytest.skip("the extension is not supported on free-threaded CPython")
     assert secretsweeper._core._native is not None
 
 
+def test_import_does_not_load_ctypes() -> None:
+    # With the extension available, the ctypes library is only a lazily loaded fallback.
+    if secretsweeper._core._native is None:
+        pytest.skip("the extension is not built on this platform")
+    code = (
+        "import io, sys, secretsweeper; "
+        "secretsweeper.mask(b'a secret', [b'secret']); "
+        "s = secretsweeper.StreamWrapper(io.BytesIO(b'a secret'), [b'secret']); s.readall(); "
+        "s._wrapper.get_reminder(); s._wrapper.consume_reminder(); "
+        "print('ctypes' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_import_does_not_load_feature_modules() -> None:
+    # Only some features need these; they are imported on first use. `typing` imports `re` itself before 3.13.
+    heavy = {"json", "mmap", "multiprocessing", "queue", "select", "tempfile", "threading"}
+    if sys.version_info >= (3, 13):
+        heavy.add("re")
+    code = (
+        "import sys; before = set(sys.modules); import secretsweeper; "
+        "print(' '.join(sorted(set(sys.modules) - before)))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    loaded = {name.partition(".")[0] for name in out.stdout.split()}
+    assert "secretsweeper" in loaded
+    assert not loaded & heavy
+
+
+def test_automaton_api_ctypes_fallback_matches_native() -> None:
+    from secretsweeper import _ctypes_lib
+
+    native = secretsweeper._core._native
+    if native is None:
+        pytest.skip("the extension is not built on this platform")
+    outputs = []
+    for api in (native, _ctypes_lib):
+        automaton = api.new()
+        cursor = api.cursor_new()
+        try:
+            api.insert(automaton, b"multi\nline", 0)
+            api.insert(automaton, b"p@ss", 1 << 0)
+            api.build(automaton, False)
+            outputs.append(
+                [
+                    api.uses_dfa(automaton),
+                    api.mask(automaton, bytearray(b"a multi\nline cEBzcw=="), 15),
+                    api.masking_read(automaton, cursor, b"say multi", 15),
+                    api.get_reminder(cursor),
+                    api.consume_reminder(cursor),
+                    api.get_reminder(cursor),
+                ]
+            )
+        finally:
+            api.cursor_destroy(cursor)
+            api.destroy(automaton)
+    assert outputs[0] == outputs[1] == [True, b"a ********** ********", b"say ", b"multi", b"multi", b""]
+
+
+def test_native_imports_in_isolated_subinterpreters() -> None:
+    # A per-interpreter GIL (3.12+) only admits multi-phase modules that declare support for it.
+    interpreters = pytest.importorskip("_interpreters" if sys.version_info >= (3, 13) else "_xxsubinterpreters")
+    if secretsweeper._core._native is None:
+        pytest.skip("the extension is not built on this platform")
+    code = f"""
+import sys
+sys.path.insert(0, {str(pathlib.Path(secretsweeper.__file__).parent.parent)!r})
+import secretsweeper
+assert secretsweeper._core._native is not None
+assert secretsweeper.Masker([b"secret", b"token"], shards=2).mask(b"a secret token") == b"a ****** *****"
+"""
+    interpreter = interpreters.create()
+    try:
+        # 3.12 raises on a failure in the interpreter, 3.13 returns it.
+        assert interpreters.run_string(interpreter, code) is None
+    finally:
+        interpreters.destroy(interpreter)
+
+
+def test_native_rejects_bad_arguments() -> None:
+    native = secretsweeper._core._native
+    if native is None:
+        pytest.skip("the extension is not built on this platform")
+    with pytest.raises(TypeError, match="expects 3 arguments"):
+        native.mask(1, b"")  # ty: ignore[missing-argument]
+    automaton = native.new()
+    try:
+        with pytest.raises(TypeError):
+            native.insert(automaton, "str", 0)  # ty: ignore[invalid-argument-type]
+        with pytest.raises(OverflowError):
+            native.mask(automaton, b"", -1)
+    finally:
+        native.destroy(automaton)
+
+
 def test_masking_read_ctypes_fallback_matches_native(
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
@@ -238,6 +599,144 @@ def test_masking_read_ctypes_fallback_matches_native(
     assert outputs[0] == outputs[1]
 
 
+def test_stream_wrapper_match_count(monkeypatch: pytest.MonkeyPatch) -> None:
+    patterns = (b"ash", b"her", b"multi\nline")
+    data = b"asher, a multi\nline and ash"
+    for native in (secretsweeper._core._native, None):
+        monkeypatch.setattr(secretsweeper._core, "_native", native)
+        wrapper = secretsweeper._core._StreamWrapper(patterns)
+        counts = []
+        for start in range(0, len(data), 5):
+            wrapper.masking_read(data[start : start + 5])
+            counts.append(wrapper.match_count())
+        assert counts == [2, 2, 2, 3, 3, 4]
+        assert wrapper.match_count() == len(secretsweeper.find_spans(data, patterns)) // 3
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 7, 64, 1 << 16])
+def test_stream_wrapper_iter_lines(block_size: int) -> None:
+    data = b"a multi\nline here\n\nuuid-123 and uuid-123\nshort\nlast multi"
+    patterns = (b"multi\nline", b"uuid-123")
+    expected = secretsweeper.StreamWrapper(io.BytesIO(data), patterns).readall()
+    lines = list(secretsweeper.StreamWrapper(io.BytesIO(data), patterns).iter_lines(block_size))
+    assert b"".join(lines) == expected
+    # Unlike line-by-line reads, a held-back partial match stays within its line.
+    assert lines == expected.splitlines(keepends=True)
+
+
+def test_stream_wrapper_iter_lines_ctypes_fallback_matches_native(monkeypatch: pytest.MonkeyPatch) -> None:
+    data = b"a multi\nline here\nuuid-123\n" * 50
+    outputs = []
+    for native in (secretsweeper._core._native, None):
+        monkeypatch.setattr(secretsweeper._core, "_native", native)
+        stream = secretsweeper.StreamWrapper(io.BytesIO(data), (b"multi\nline", b"uuid-123"))
+        outputs.append(list(stream.iter_lines(100)))
+    assert outputs[0] == outputs[1]
+
+
+PEM_PATTERN = b"-----BEGIN KEY-----\nc2VjcmV0\n-----END KEY-----"
+
+
+def test_stream_wrapper_max_hold_flushes_held_prefix() -> None:
+    read_fd, write_fd = os.pipe()
+    with open(read_fd, "rb", buffering=0) as src, open(write_fd, "wb", buffering=0) as dst:
+        stream = secretsweeper.StreamWrapper(src, (PEM_PATTERN,), max_hold=0.05)
+        dst.write(b"key: -----BEGIN KEY-----\n")
+        assert stream.readline() == b"key: "
+        # Nothing more arrives: the held prefix is emitted masked instead of stalling the reader.
+        assert stream.readline() == b"*" * secretsweeper.MAX_NUMBER_OF_STARS
+        # The rest of the secret is still recognized and never emitted.
+        dst.write(b"c2VjcmV0\n-----END KEY----- done\n")
+        dst.close()
+        assert stream.readall() == b" done\n"
+
+
+def test_stream_wrapper_max_hold_bytes() -> None:
+    data = b"key: -----BEGIN KEY-----\nnot a key\n"
+    stream = secretsweeper.StreamWrapper(io.BytesIO(data), (PEM_PATTERN,), limit=3, max_hold_bytes=8)
+    assert list(stream) == [b"key: ***", b"not a key\n"]
+    # Holding is unbounded by default, and what never completes a secret is emitted as is.
+    assert list(secretsweeper.StreamWrapper(io.BytesIO(data), (PEM_PATTERN,), limit=3)) == [b"key: ", data[5:]]
+
+
+@pytest.mark.parametrize(
+    "read",
+    [
+        lambda stream: stream.readall(),
+        lambda stream: b"".join(stream),
+        lambda stream: b"".join(iter(lambda: stream.read(5000), b"")),
+        lambda stream: b"".join(stream.iter_lines(4096)),
+    ],
+    ids=["readall", "readline", "read", "iter_lines"],
+)
+def test_stream_wrapper_prefetch(read: typing.Callable[[secretsweeper.StreamWrapper], bytes]) -> None:
+    data = b"user=admin password=hunter2\n" * 5000 + b"key: " + PEM_PATTERN + b" done\n"
+    patterns = (b"hunter2", PEM_PATTERN)
+    expected = secretsweeper.StreamWrapper(io.BytesIO(data), patterns).readall()
+    assert read(secretsweeper.StreamWrapper(io.BytesIO(data), patterns, prefetch=2)) == expected
+
+
+def test_stream_wrapper_prefetch_max_hold_without_file_descriptor() -> None:
+    # The read-ahead is what max_hold waits on, so it works for streams that cannot be selected.
+    resume = threading.Event()
+
+    class Stream(io.BytesIO):
+        chunks = [b"key: -----BEGIN KEY-----\n", b"c2VjcmV0\n-----END KEY----- done\n", b""]
+
+        def readline(self, size: int | None = -1, /) -> bytes:
+            if len(self.chunks) < 3:
+                resume.wait()
+            return self.chunks.pop(0)
+
+    stream = secretsweeper.StreamWrapper(Stream(), (PEM_PATTERN,), max_hold=0.05, prefetch=1)
+    assert stream.readline() == b"key: "
+    assert stream.readline() == b"*" * secretsweeper.MAX_NUMBER_OF_STARS
+    resume.set()
+    assert stream.readall() == b" done\n"
+
+
+def test_stream_wrapper_prefetch_errors_and_close() -> None:
+    class Broken(io.BytesIO):
+        def read(self, size: int | None = -1, /) -> bytes:
+            raise OSError("connection reset")
+
+    with pytest.raises(OSError, match="connection reset"):
+        secretsweeper.StreamWrapper(Broken(), (b"a",), prefetch=1).read(10)
+
+    stream = secretsweeper.StreamWrapper(io.BytesIO(b"x" * 100_000), (b"a",), prefetch=1)
+    assert stream.read(10) == b"x" * 10
+    stream.close()
+    for thread in threading.enumerate():
+        if thread.name == "secretsweeper-prefetch":
+            thread.join(1)
+            assert not thread.is_alive()
+
+
+@pytest.mark.parametrize("fallback", [False, True], ids=["native", "ctypes"])
+def test_stream_wrapper_checkpoint_and_restore(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch, fallback: bool
+) -> None:
+    # A log shipper stops after the first lines, one of them ending with the start of a key.
+    log = tmp_path / "app.log"
+    log.write_bytes(b"user=admin token=hunter2\nkey: -----BEGIN KEY-----\nc2VjcmV0\n-----END KEY----- hunter2\n")
+    patterns = (b"hunter2", PEM_PATTERN)
+    with log.open("rb") as f:
+        expected = secretsweeper.StreamWrapper(f, patterns, limit=4).readall()
+    with log.open("rb") as f:
+        stream = secretsweeper.StreamWrapper(f, patterns, limit=4)
+        head = stream.readline() + stream.readline()
+        checkpoint, offset = stream.checkpoint(), f.tell()
+    assert head == b"user=admin token=****\nkey: "
+
+    if fallback:
+        monkeypatch.setattr(secretsweeper._core, "_native", None)
+    with log.open("rb") as f:
+        f.seek(offset)
+        resumed = secretsweeper.StreamWrapper(f, patterns, limit=4)
+        resumed.restore(checkpoint)
+        assert head + resumed.readall() == expected
+
+
 def test_masking_read_output_larger_than_input() -> None:
     # A flushed reminder is prepended to the output, so a call's output can exceed
     # its input; the output buffer headroom must absorb it.
@@ -310,6 +809,235 @@ def test_stream_wrapper(
     assert b"".join(chunk) == expected
 
 
+def _make_tree(root: pathlib.Path) -> None:
+    (root / "logs" / "nested").mkdir(parents=True)
+    (root / "logs" / "job.log").write_bytes(b"token=hunter2\n" * 3 + b"-----BEGIN\nKEY\n")
+    (root / "logs" / "nested" / "clean.txt").write_bytes(b"nothing to see\n")
+    (root / "logs" / "empty").write_bytes(b"")
+    (root / "blob.bin").write_bytes(b"\0hunter2")
+    (root / "link.log").symlink_to(root / "logs" / "job.log")
+
+
+SWEPT_TREE = {
+    os.path.join("blob.bin"): None,
+    os.path.join("logs", "empty"): 0,
+    os.path.join("logs", "job.log"): 4,
+    os.path.join("logs", "nested", "clean.txt"): 0,
+}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sweep_tree_out_dir(tmp_path: pathlib.Path, workers: int) -> None:
+    root, out = tmp_path / "root", tmp_path / "out"
+    root.mkdir()
+    _make_tree(root)
+    patterns = (b"hunter2", b"-----BEGIN\nKEY")
+    assert secretsweeper.sweep_tree(root, patterns, workers=workers, out_dir=out) == SWEPT_TREE
+    assert (out / "logs" / "job.log").read_bytes() == b"token=*******\n" * 3 + b"**************\n"
+    assert (out / "logs" / "nested" / "clean.txt").read_bytes() == b"nothing to see\n"
+    assert (out / "logs" / "empty").read_bytes() == b""
+    assert not (out / "blob.bin").exists()
+    assert not (out / "link.log").exists()
+    assert (root / "logs" / "job.log").read_bytes().startswith(b"token=hunter2")
+
+
+def test_sweep_tree_inplace(tmp_path: pathlib.Path) -> None:
+    _make_tree(tmp_path)
+    clean = tmp_path / "logs" / "nested" / "clean.txt"
+    mtime = clean.stat().st_mtime_ns
+    assert secretsweeper.sweep_tree(tmp_path, (b"hunter2",), workers=2, inplace=True, limit=3) == {
+        **SWEPT_TREE,
+        os.path.join("logs", "job.log"): 3,
+    }
+    assert (tmp_path / "logs" / "job.log").read_bytes() == b"token=***\n" * 3 + b"-----BEGIN\nKEY\n"
+    assert (tmp_path / "blob.bin").read_bytes() == b"\0hunter2"
+    assert clean.stat().st_mtime_ns == mtime
+    assert sorted(p.name for p in tmp_path.rglob("*")) == [
+        "blob.bin",
+        "clean.txt",
+        "empty",
+        "job.log",
+        "link.log",
+        "logs",
+        "nested",
+    ]
+
+
+def test_sweep_tree_report_only(tmp_path: pathlib.Path) -> None:
+    _make_tree(tmp_path)
+    assert secretsweeper.sweep_tree(tmp_path, (b"hunter2",), skip_binary=False) == {
+        **SWEPT_TREE,
+        "blob.bin": 1,
+        os.path.join("logs", "job.log"): 3,
+    }
+    assert (tmp_path / "logs" / "job.log").read_bytes().startswith(b"token=hunter2")
+
+
+@pytest.mark.parametrize("inplace", [True, False], ids=["inplace", "report-only"])
+def test_sweep_tree_match_across_blocks(tmp_path: pathlib.Path, inplace: bool) -> None:
+    # The second secret straddles the first `SWEEP_BLOCK_SIZE` block boundary.
+    data = b"hunter2 " + b"x" * (SWEEP_BLOCK_SIZE - 12) + b"hunter2 hunter2"
+    (tmp_path / "big.log").write_bytes(data)
+    assert secretsweeper.sweep_tree(tmp_path, (b"hunter2",), inplace=inplace) == {"big.log": 3}
+    assert (tmp_path / "big.log").read_bytes() == (secretsweeper.mask(data, (b"hunter2",)) if inplace else data)
+
+
+@pytest.mark.parametrize("use_inotify", [True, False], ids=["inotify", "polling"])
+def test_follow(tmp_path: pathlib.Path, use_inotify: bool) -> None:
+    log = tmp_path / "app.log"
+    log.write_bytes(b"old line\ntoken=hun")
+    follow = secretsweeper.follow(
+        log, (b"hunter2", PEM_PATTERN), idle_timeout=0.2, use_inotify=use_inotify, poll_interval=0.01
+    )
+    with open(log, "ab", buffering=0) as writer:
+        assert next(follow) == b"old line\ntoken="
+        # The cursor carries the partial match over to the next append.
+        writer.write(b"ter2\nkey: -----BEGIN KEY-----\n")
+        assert next(follow) == b"*******\nkey: "
+        # Rotation: the held prefix never completed in the old file, and the new one is followed from its start.
+        log.rename(tmp_path / "app.log.1")
+        log.write_bytes(b"hunter2 again\n")
+        assert next(follow) == b"-----BEGIN KEY-----\n"
+        assert next(follow) == b"******* again\n"
+    # Truncation: the file is followed from its start again.
+    log.write_bytes(b"x\n")
+    assert next(follow) == b"x\n"
+    with open(log, "ab", buffering=0) as writer:
+        writer.write(b"y hunter")
+        assert list(follow) == [b"y ", b"hunter"]
+
+
+def test_follow_max_hold(tmp_path: pathlib.Path) -> None:
+    log = tmp_path / "app.log"
+    log.write_bytes(b"key: -----BEGIN KEY-----\n")
+    follow = secretsweeper.follow(log, (PEM_PATTERN,), max_hold=0.05, idle_timeout=0.2, poll_interval=0.01)
+    assert next(follow) == b"key: "
+    assert next(follow) == b"*" * secretsweeper.MAX_NUMBER_OF_STARS
+    with open(log, "ab") as writer:
+        writer.write(b"c2VjcmV0\n-----END KEY----- done\n")
+    assert b"".join(follow) == b" done\n"
+    assert list(secretsweeper.follow(log, (PEM_PATTERN,), from_end=True, idle_timeout=0.05)) == []
+
+
+@pytest.fixture
+def tracing(monkeypatch: pytest.MonkeyPatch, request: pytest.FixtureRequest) -> typing.Iterator[None]:
+    if request.param == "ctypes":
+        monkeypatch.setattr(secretsweeper._core, "_native", None)
+    secretsweeper.reset_tracing()
+    secretsweeper.enable_tracing()
+    yield
+    secretsweeper.enable_tracing(False)
+    secretsweeper.reset_tracing()
+
+
+@pytest.mark.parametrize("tracing", ["native", "ctypes"], indirect=True)
+@pytest.mark.usefixtures("tracing")
+def test_trace_histograms() -> None:
+    masker = Masker((b"hunter2",))
+    assert masker.mask(b"token=hunter2") == b"token=*******"
+    stream = secretsweeper.StreamWrapper(io.BytesIO(b"token=hunt" + b"er2\n"), masker)
+    assert stream.readall() == b"token=*******\n"
+    histograms = secretsweeper.trace_histograms()
+    assert list(histograms) == ["build", "search", "reconstruct", "reminder"]
+    assert histograms["build"]["count"] == 1
+    assert histograms["search"]["count"] == histograms["reconstruct"]["count"] > histograms["reminder"]["count"] > 0
+    for histogram in histograms.values():
+        bounds, counts = zip(*histogram["buckets"])
+        assert bounds[0] == 1.024e-6 and bounds[-1] == float("inf") and list(bounds) == sorted(bounds)
+        assert list(counts) == sorted(counts) and counts[-1] == histogram["count"]
+        assert histogram["sum"] >= 0
+
+    secretsweeper.enable_tracing(False)
+    masker.mask(b"token=hunter2")
+    assert secretsweeper.trace_histograms() == histograms
+    secretsweeper.reset_tracing()
+    assert all(h["count"] == 0 and h["sum"] == 0 for h in secretsweeper.trace_histograms().values())
+
+
+def test_trace_env() -> None:
+    code = "import secretsweeper; secretsweeper.mask(b'x', (b'x',)); print(secretsweeper.trace_histograms()['build'])"
+    env = {**os.environ, "SECRET_SWEEPER_TRACE": "1"}
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env).stdout
+    assert "'count': 1" in out
+
+
+PLAN = {
+    "format_version": "1.2",
+    "variables": {"db_password": {"value": "hunter2"}, "region": {"value": "eu-west-1"}},
+    "planned_values": {"root_module": {"resources": [{"values": {"password": "hunter2", "note": 'x"]}[{\\'}}]}},
+    "resource_changes": [
+        {
+            "address": "aws_db.main",
+            "change": {
+                "actions": ["update"],
+                "before": {"password": "old-pw", "port": 5432, "tags": {"env": "prod"}},
+                "after": {"password": "new-pw", "port": 5433, "users": [{"name": "app", "key": "k-ЖЖ"}], "ok": True},
+                "before_sensitive": {"password": True, "port": True},
+                "after_sensitive": {"password": True, "users": [{"key": True}], "ok": True},
+            },
+        },
+        {"address": "null_resource.x", "change": {"actions": ["create"], "after": None, "after_sensitive": False}},
+    ],
+    "output_changes": {
+        "conn": {"actions": ["create"], "after": "postgres://new-pw@db", "after_sensitive": True},
+        "public": {"actions": ["create"], "after": "eu-west-1", "after_sensitive": False},
+    },
+    "prior_state": {"values": {"outputs": {"conn": {"value": "prior-secret", "sensitive": True}}}},
+    "configuration": {
+        "provider_config": {"aws": {"name": "aws", "expressions": {"region": {"constant_value": "{["}}}},
+        "root_module": {"outputs": {}, "variables": {"db_password": {"sensitive": True}, "region": {}}},
+    },
+}
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("block_size", [1, 7, secretsweeper.PLAN_BLOCK_SIZE])
+def test_patterns_from_plan(block_size: int, indent: int | None) -> None:
+    plan = io.BytesIO(json.dumps(PLAN, indent=indent, ensure_ascii=indent is None).encode())
+    assert list(secretsweeper.patterns_from_plan(plan, block_size=block_size)) == [
+        b"old-pw",
+        b"5432",
+        b"new-pw",
+        "k-ЖЖ".encode(),
+        b"postgres://new-pw@db",
+        b"hunter2",
+    ]
+
+
+def test_patterns_from_plan_value_larger_than_block() -> None:
+    # A value that stays incomplete is read in growing blocks, not rescanned from its start after each small one.
+    blob = "v" * (1 << 20)
+    plan = {
+        "resource_changes": [{"change": {"after": {"blob": blob, "pw": "s3cret"}, "after_sensitive": {"pw": True}}}],
+        "prior_state": {"values": {"blob": blob}},
+    }
+    reads = []
+
+    class Stream(io.BytesIO):
+        def read(self, size: int | None = -1, /) -> bytes:
+            reads.append(size)
+            return super().read(size)
+
+    stream = Stream(json.dumps(plan).encode())
+    assert list(secretsweeper.patterns_from_plan(stream, block_size=1024)) == [b"s3cret"]
+    assert len(reads) < 50
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+def test_stream_wrapper_invalid_options_collected_cleanly() -> None:
+    # A wrapper whose constructor raised is still closed by `IOBase.__del__`.
+    options: tuple[dict[str, typing.Any], ...] = (
+        {"max_hold": -1.0},
+        {"max_hold_bytes": -1},
+        {"prefetch": -1},
+        {"encodings": ("json",)},
+    )
+    for kwargs in options:
+        with pytest.raises(ValueError):
+            secretsweeper.StreamWrapper(io.BytesIO(b""), Masker((b"a",)), **kwargs)
+        gc.collect()
+
+
 class InvalidInputTest(unittest.TestCase):
     def test_mask_error_input(self) -> None:
         with self.assertRaises(TypeError) as ex:
@@ -321,6 +1049,98 @@ class InvalidInputTest(unittest.TestCase):
             secretsweeper.mask(b"", -1)  # type: ignore
         self.assertIn("'int' object is not iterable", str(ex.exception))
 
+    def test_mask_unknown_encoding(self) -> None:
+        with self.assertRaises(ValueError) as ex:
+            secretsweeper.mask(b"", (b"a",), encodings=("rot13",))
+        self.assertIn("unknown encoding 'rot13', expected one of: base64, base64url, url, json", str(ex.exception))
+
+    def test_mask_encodings_str(self) -> None:
+        with self.assertRaises(TypeError):
+            secretsweeper.mask(b"", (b"a",), encodings="base64")
+
+    def test_mask_text_error_input(self) -> None:
+        with self.assertRaisesRegex(TypeError, "expected str, found <class 'bytes'>. You can use mask"):
+            secretsweeper.mask_text(b"a", ("a",))  # type: ignore
+        with self.assertRaisesRegex(TypeError, "expected str, found <class 'bytes'>"):
+            secretsweeper.mask_text("a", (b"a",))  # type: ignore
+
+    def test_find_spans_error_input(self) -> None:
+        with self.assertRaises(TypeError) as ex:
+            secretsweeper.find_spans("text", (b"a",))  # type: ignore
+        self.assertIn("expected bytes, memoryview or bytearray, found <class 'str'>", str(ex.exception))
+
+    def test_search_masker_with_encodings(self) -> None:
+        for search in (secretsweeper.find_spans, secretsweeper.first_match, secretsweeper.contains_secret):
+            with self.assertRaisesRegex(ValueError, "encodings are compiled into the Masker"):
+                search(b"", Masker((b"a",)), encodings=("json",))
+
+    def test_stream_wrapper_masker_with_encodings(self) -> None:
+        with self.assertRaisesRegex(ValueError, "encodings are compiled into the Masker"):
+            secretsweeper.StreamWrapper(io.BytesIO(b""), Masker((b"a",)), encodings=("json",))
+
+    def test_stream_wrapper_iter_lines_block_size(self) -> None:
+        stream = secretsweeper.StreamWrapper(io.BytesIO(b"a\n"), (b"a",))
+        with self.assertRaisesRegex(ValueError, "block_size must be positive"):
+            next(stream.iter_lines(0))
+
+    def test_stream_wrapper_negative_max_hold(self) -> None:
+        with self.assertRaisesRegex(ValueError, "max_hold must be non-negative"):
+            secretsweeper.StreamWrapper(io.BytesIO(b""), (b"a",), max_hold=-1.0)
+        with self.assertRaisesRegex(ValueError, "max_hold_bytes must be non-negative"):
+            secretsweeper.StreamWrapper(io.BytesIO(b""), (b"a",), max_hold_bytes=-1)
+
+    def test_sweep_tree_options(self) -> None:
+        with self.assertRaisesRegex(ValueError, "inplace and out_dir are mutually exclusive"):
+            secretsweeper.sweep_tree(".", (b"a",), inplace=True, out_dir="out")
+        with self.assertRaisesRegex(ValueError, "workers must be positive"):
+            secretsweeper.sweep_tree(".", (b"a",), workers=0)
+        with self.assertRaises(NotADirectoryError):
+            secretsweeper.sweep_tree(__file__, (b"a",))
+
+    def test_follow_options(self) -> None:
+        options: tuple[tuple[dict[str, typing.Any], str], ...] = (
+            ({"block_size": 0}, "block_size must be positive"),
+            ({"poll_interval": 0}, "poll_interval must be positive"),
+            ({"max_hold": -1.0}, "max_hold must be non-negative"),
+            ({"idle_timeout": -1.0}, "idle_timeout must be non-negative"),
+        )
+        for option, message in options:
+            with self.subTest(option=option), self.assertRaisesRegex(ValueError, message):
+                next(secretsweeper.follow(__file__, (b"a",), **option))
+        with self.assertRaises(FileNotFoundError):
+            next(secretsweeper.follow(os.path.join(os.path.dirname(__file__), "missing.log"), (b"a",)))
+
+    def test_stream_wrapper_negative_prefetch(self) -> None:
+        with self.assertRaisesRegex(ValueError, "prefetch must be non-negative"):
+            secretsweeper.StreamWrapper(io.BytesIO(b""), (b"a",), prefetch=-1)
+
+    def test_stream_wrapper_restore_mismatch(self) -> None:
+        checkpoint = secretsweeper.StreamWrapper(io.BytesIO(b""), (b"a", b"b")).checkpoint()
+        with self.assertRaisesRegex(ValueError, "the checkpoint was taken over different patterns"):
+            secretsweeper.StreamWrapper(io.BytesIO(b""), (b"b", b"a")).restore(checkpoint)
+        with self.assertRaisesRegex(ValueError, "invalid checkpoint"):
+            secretsweeper.StreamWrapper(io.BytesIO(b""), (b"a", b"b")).restore(checkpoint[:-1])
+        stream = secretsweeper.StreamWrapper(io.BytesIO(b"abc"), (b"a",), prefetch=1)
+        stream.read(1)
+        with self.assertRaisesRegex(ValueError, "read ahead with prefetch"):
+            stream.checkpoint()
+
+    def test_masker_negative_limit(self) -> None:
+        with self.assertRaises(ValueError):
+            Masker((b"a",), limit=-1)
+
+    def test_masker_shards_out_of_range(self) -> None:
+        for shards in (0, secretsweeper.MAX_SHARDS + 1):
+            with self.subTest(shards=shards), self.assertRaisesRegex(ValueError, "shards must be between"):
+                Masker((b"a",), shards=shards)
+
+    def test_patterns_from_plan_invalid(self) -> None:
+        with self.assertRaisesRegex(ValueError, "block_size must be positive"):
+            next(secretsweeper.patterns_from_plan(io.BytesIO(b"{}"), block_size=0))
+        for plan in (b'{"variables": {"a": {"value": "x"', b'{"prior_state": {"values": [1, {}', b"[]", b'{"a" 1}'):
+            with self.subTest(plan=plan), self.assertRaisesRegex(ValueError, "invalid plan JSON"):
+                list(secretsweeper.patterns_from_plan(io.BytesIO(plan)))
+
     def test_mask_bytes_io_input(self) -> None:
         with self.assertRaises(TypeError) as ex:
             secretsweeper.mask(io.BytesIO(initial_bytes=b""), ())  # type: ignore